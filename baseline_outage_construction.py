@@ -1,79 +1,177 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
 import numpy as np
 import pandas as pd
 
+from eaglei_ingest import OutageCache
+from storm_schema import FIPS_KEY, storm_fips_key, to_fips_key
+from window_kernels import in_intervals, interval_union
+
+
+def _county_series(outage_df):
+    # (CZ_FIPS, times, values) per county, from a raw frame or the EAGLE-I cache
+    if isinstance(outage_df, OutageCache):
+        yield from outage_df.items()
+        return
 
-def baseline_outage_construction(storms_data, outage_df):
-    storms = storms_data[["CZ_FIPS", "BEGIN_DATE_TIME", "END_DATE_TIME"]].copy()
-    storms["BEGIN_DATE_TIME"] = pd.to_datetime(storms["BEGIN_DATE_TIME"])
-    storms["END_DATE_TIME"] = pd.to_datetime(storms["END_DATE_TIME"])
-    storms["CZ_FIPS"] = storms["CZ_FIPS"].astype(int)
-    
     outage = outage_df[["fips_code", "run_start_time", "sum"]].copy()
     outage = outage.rename(columns={"fips_code": "CZ_FIPS"})
     outage["CZ_FIPS"] = outage["CZ_FIPS"].astype(int)
     outage["run_start_time"] = pd.to_datetime(outage["run_start_time"])
-    
-    
-    def compute_baseline_for_county(df_out, df_storm):
-        if df_storm.empty:
-            return df_out["sum"].median()
-    
-        t = df_out["run_start_time"].values
-        is_storm = np.zeros(len(df_out), dtype=bool)
-    
-        for _, r in df_storm.iterrows():
-            is_storm |= (t >= r["BEGIN_DATE_TIME"]) & (t <= r["END_DATE_TIME"])
-    
-        baseline_vals = df_out.loc[~is_storm, "sum"]
-    
-        if baseline_vals.empty:
-            return np.nan
-    
-        return baseline_vals.median()
-    
-    baseline_records = []
-    
     for cz, df_out_c in outage.groupby("CZ_FIPS"):
-        df_storm_c = storms.loc[storms["CZ_FIPS"] == cz]
-        baseline = compute_baseline_for_county(df_out_c, df_storm_c)
-    
-        baseline_records.append(
-            {
-                "CZ_FIPS": cz,
-                "baseline_outage_median": baseline,
-            }
-        )
-    baseline_df = pd.DataFrame(baseline_records)
+        yield cz, df_out_c["run_start_time"].values, df_out_c["sum"].values
+
+
+def _storm_intervals(storms_data):
+    # keyed by the 5-digit fips_key, the same code as the EAGLE-I fips_code
+    storms = pd.DataFrame({
+        FIPS_KEY: storm_fips_key(storms_data),
+        "BEGIN_DATE_TIME": pd.to_datetime(storms_data["BEGIN_DATE_TIME"]).to_numpy(),
+        "END_DATE_TIME": pd.to_datetime(storms_data["END_DATE_TIME"]).to_numpy(),
+    })
+    return {
+        int(cz): interval_union(g["BEGIN_DATE_TIME"].values, g["END_DATE_TIME"].values)
+        for cz, g in storms.groupby(FIPS_KEY)
+    }
+
+
+def _baseline_chunk(series, intervals):
+    # label every county's rows against its merged storm intervals, then take
+    # all medians in one grouped reduction over the non-storm rows
+    empty = (np.empty(0, np.int64), np.empty(0, np.int64))
+    fips, codes, kept = [], [], []
+    for i, (cz, t, vals) in enumerate(series):
+        fips.append(int(cz))
+        starts, ends = intervals.get(int(cz), empty)
+        quiet = ~in_intervals(t, starts, ends)
+        kept.append(np.asarray(vals, dtype=float)[quiet])
+        codes.append(np.full(int(quiet.sum()), i, dtype=np.int64))
+
+    if not fips:
+        return pd.Series(dtype=float)
+    med = pd.Series(np.concatenate(kept)).groupby(np.concatenate(codes)).median()
+    return pd.Series(med.reindex(np.arange(len(fips))).to_numpy(), index=fips)
+
+
+def _baseline_cached_chunk(cache_dir, fips, intervals):
+    cache = OutageCache(cache_dir)
+    return _baseline_chunk(((f, *cache.series(f)) for f in fips), intervals)
+
+
+def _streaming_medians(chunks, intervals):
+    # exact streaming median: per-county value counts are merged chunk by chunk,
+    # so memory grows with distinct outage values rather than with rows
+    counts = None
+    for chunk in chunks:
+        cz = pd.to_numeric(chunk["fips_code"], errors="coerce")
+        t = pd.to_datetime(chunk["run_start_time"], errors="coerce")
+        v = pd.to_numeric(chunk["sum"], errors="coerce")
+        ok = (cz.notna() & t.notna() & v.notna()).to_numpy()
+        cz, t, v = cz.to_numpy()[ok].astype(np.int64), t.to_numpy()[ok], v.to_numpy()[ok]
+
+        quiet = np.ones(len(cz), dtype=bool)
+        for c in np.unique(cz):
+            if int(c) in intervals:
+                sel = cz == c
+                quiet[sel] = ~in_intervals(t[sel], *intervals[int(c)])
+
+        part = pd.DataFrame({"CZ_FIPS": cz[quiet], "v": v[quiet]}).groupby(["CZ_FIPS", "v"]).size()
+        counts = part if counts is None else counts.add(part, fill_value=0)
+
+    if counts is None:
+        return pd.Series(dtype=float)
+
+    out = {}
+    for cz, c in counts.groupby(level=0):
+        vals = c.index.get_level_values(1).to_numpy(dtype=float)
+        cum = np.cumsum(c.to_numpy())
+        n = cum[-1]
+        lo = vals[np.searchsorted(cum, (n - 1) // 2, side="right")]
+        hi = vals[np.searchsorted(cum, n // 2, side="right")]
+        out[int(cz)] = (lo + hi) / 2
+    return pd.Series(out, dtype=float)
+
+
+def compute_baseline_medians(storms_data, outage_df, n_workers=1, median="exact", chunksize=2_000_000):
+    """Per-county median outage outside storm windows -> (CZ_FIPS, baseline_outage_median).
+
+    outage_df is the raw EAGLE-I frame or an eaglei_ingest.OutageCache. Storm
+    windows are merged per county and the outage rows labeled with one sorted
+    sweep; n_workers > 1 splits the counties over a process pool.
+
+    median="streaming" reads outage_df (a CSV path or an iterable of frames)
+    chunk by chunk and keeps only per-county value counts, for histories that
+    do not fit in memory. It gives the same medians as the exact mode.
+    """
+    intervals = _storm_intervals(storms_data)
+
+    if median == "streaming":
+        if isinstance(outage_df, (str, Path)):
+            outage_df = pd.read_csv(
+                outage_df, usecols=["fips_code", "run_start_time", "sum"], chunksize=chunksize,
+            )
+        elif isinstance(outage_df, pd.DataFrame):
+            outage_df = [outage_df]
+        med = _streaming_medians(outage_df, intervals)
+    elif median != "exact":
+        raise ValueError(f"unknown median mode: {median}")
+    elif n_workers == 1:
+        med = _baseline_chunk(_county_series(outage_df), intervals)
+    else:
+        n_workers = n_workers or os.cpu_count()
+        with ProcessPoolExecutor(max_workers=n_workers) as pool:
+            if isinstance(outage_df, OutageCache):
+                # workers re-open the memory map instead of receiving copies
+                parts = np.array_split(outage_df.fips, n_workers)
+                futures = [
+                    pool.submit(_baseline_cached_chunk, outage_df.cache_dir, p.tolist(),
+                                {int(f): intervals[int(f)] for f in p if int(f) in intervals})
+                    for p in parts if len(p)
+                ]
+            else:
+                series = list(_county_series(outage_df))
+                futures = [
+                    pool.submit(_baseline_chunk, part,
+                                {int(c): intervals[int(c)] for c, _, _ in part if int(c) in intervals})
+                    for part in (series[i::n_workers] for i in range(n_workers)) if part
+                ]
+            med = pd.concat([f.result() for f in futures]).sort_index()
+
+    return pd.DataFrame({
+        "CZ_FIPS": med.index.to_numpy(),
+        "baseline_outage_median": med.to_numpy(dtype=float),
+    })
+
+
+def baseline_outage_construction(storms_data, outage_df, n_workers=1, median="exact"):
+    baseline_df = compute_baseline_medians(storms_data, outage_df, n_workers=n_workers, median=median)
     baseline_df = baseline_df.copy()
     baseline_df.columns = baseline_df.columns.str.strip()
     
     storms_data = storms_data.copy()
     storms_data.columns = storms_data.columns.str.strip()
     
-    baseline_df["fips5"] = baseline_df["CZ_FIPS"].astype(str).str.zfill(5)
-    
-    candidate_cols = [c for c in baseline_df.columns if c not in {"CZ_FIPS", "fips5"}]
+    candidate_cols = [c for c in baseline_df.columns if c != "CZ_FIPS"]
 
     
     preferred = [c for c in candidate_cols if "baseline" in c.lower() or "median" in c.lower()]
     baseline_col = preferred[0] if preferred else candidate_cols[0]
 
-    
-    if "full_fips" in storms_data.columns:
-        storms_data["fips5"] = pd.to_numeric(storms_data["full_fips"], errors="coerce").astype("Int64").astype(str).str.zfill(5)
-    elif "fips_str" in storms_data.columns:
-        storms_data["fips5"] = storms_data["fips_str"].astype(str).str.extract(r"(\d+)")[0].str.zfill(5)
-    else:
-        raise KeyError("no full_fips or fips_str")
-
-    tmp = baseline_df[["fips5", baseline_col]].rename(columns={baseline_col: "baseline_outage_median"})
+    # matched on the int32 fips_key, no zero-padded strings
+    storms_data[FIPS_KEY] = storm_fips_key(storms_data)
+    tmp = pd.DataFrame({
+        FIPS_KEY: to_fips_key(baseline_df["CZ_FIPS"]),
+        "baseline_outage_median": baseline_df[baseline_col].to_numpy(),
+    })
 
     if "baseline_outage_median" in storms_data.columns:
         storms_data = storms_data.drop(columns=["baseline_outage_median"])
     
     storms_data = storms_data.merge(
         tmp,
-        on="fips5",
+        on=FIPS_KEY,
         how="left",
         validate="many_to_one",
     )
@@ -0,0 +1,173 @@
+# Time every feature-engineering stage on synthetic inputs at several multiples
+# of the NE coastal footprint, and compare against a saved baseline.
+#
+#   python -m benchmarks.bench_features --scales 1 10 100 --days 60
+#   python -m benchmarks.bench_features --save-baseline           # record this machine
+#   python -m benchmarks.bench_features --check --tolerance 0.25  # exit 1 on a regression
+#
+# Throughput is in each stage's driving rows: EAGLE-I snapshots for the
+# outage matching and the baseline, ERA5 CSV rows for the two ERA5 stages,
+# storm rows for the circuit join. Memory is the stage's peak RSS above the
+# RSS it started at, sampled by stage_metrics.
+
+import argparse
+import gc
+import json
+import sys
+from pathlib import Path
+
+import pandas as pd
+
+from stage_metrics import StageMetrics
+from benchmarks.synthetic import BENCH_DATA_DIR, make_footprint
+
+
+BASELINE_PATH = Path(__file__).resolve().parent / "baseline.json"
+
+# a stage only counts as regressed past these absolute margins too, so
+# millisecond stages and allocator noise do not fail the check
+MIN_WALL_S = 0.05
+MIN_RSS_MB = 32.0
+
+
+def _outage_after24h(inp):
+    from storm_outage_after24h import match_max_outage_after24h
+    return match_max_outage_after24h, (inp["storm_events"], inp["outage_df"]), {}, len(inp["outage_df"])
+
+
+def _baseline(inp):
+    from baseline_outage_construction import baseline_outage_construction
+    # storms carry STATE_FIPS + CZ_FIPS, keyed like the EAGLE-I fips_code, so
+    # each storm's window is masked out of its county's rows
+    return baseline_outage_construction, (inp["storm_events"], inp["outage_df"]), {}, len(inp["outage_df"])
+
+
+def _era5_features(inp):
+    from era5_storm_features_max48h import build_storm_weather_features_max_total_48h_stream
+    return (build_storm_weather_features_max_total_48h_stream,
+            (inp["storm_events"], inp["grid_map"]), {"era5_dir": inp["era5_dir"]}, inp["era5_rows"])
+
+
+def _small_county_era5(inp):
+    from small_county_ERA5_overlap import small_county_ERA5_overlap
+    return (small_county_ERA5_overlap,
+            (inp["era5_dir"], inp["storm_events"].copy()), {"fips": inp["small_fips"]}, inp["era5_rows"])
+
+
+def _circuits(inp):
+    from circuits_distribution_process import circuits_distribution_process
+    args = (inp["dist_sys"], inp["serv_terr"], inp["road_density"], inp["storm_events"])
+    return circuits_distribution_process, args, {}, len(inp["storm_events"])
+
+
+CASES = {
+    "outage_after24h": _outage_after24h,
+    "baseline": _baseline,
+    "era5_features": _era5_features,
+    "small_county_era5": _small_county_era5,
+    "circuits": _circuits,
+}
+
+
+def run_suite(scales=(1, 10), days=60, seed=0, repeat=1, cases=None, data_dir=BENCH_DATA_DIR) -> pd.DataFrame:
+    """One row per (case, scale): best-of-repeat wall / CPU time, rows per second and memory."""
+    cases = list(CASES) if cases is None else list(cases)
+    rows = []
+    for scale in scales:
+        inp = make_footprint(scale, days=days, seed=seed, data_dir=data_dir)
+        print(f"scale {scale:g}: {len(inp['counties'])} counties, {len(inp['storm_events'])} storms, "
+              f"{len(inp['outage_df'])} outage rows, {inp['era5_rows']} ERA5 rows")
+        for case in cases:
+            func, args, kwargs, n = CASES[case](inp)
+            best = None
+            for _ in range(repeat):
+                gc.collect()
+                metrics = StageMetrics(verbose=False)
+                metrics.measure(case, func, args, kwargs, rows_in=n)
+                rec = metrics.records[-1]
+                if best is None or rec.wall_s < best.wall_s:
+                    best = rec
+            rows.append({
+                "case": case,
+                "scale": scale,
+                "rows": n,
+                "wall_s": best.wall_s,
+                "cpu_s": best.cpu_s,
+                "rows_per_s": n / best.wall_s if best.wall_s > 0 else float("nan"),
+                "peak_rss_mb": best.peak_rss_mb,
+                "rss_delta_mb": best.rss_delta_mb,
+            })
+            print(f"  {case:>18}: {best.wall_s:8.3f} s  {rows[-1]['rows_per_s']:12.0f} rows/s  "
+                  f"+{best.rss_delta_mb or 0:.0f} MB")
+        del inp
+    return pd.DataFrame(rows)
+
+
+def _key(row) -> str:
+    return f"{row['case']}@{row['scale']:g}"
+
+
+def save_baseline(results: pd.DataFrame, settings: dict, path: Path = BASELINE_PATH) -> Path:
+    path = Path(path)
+    entries = {_key(r): {"wall_s": r["wall_s"], "rss_delta_mb": r["rss_delta_mb"]}
+               for r in results.to_dict("records")}
+    tmp = path.with_suffix(".tmp")
+    tmp.write_text(json.dumps({"settings": settings, "results": entries}, indent=1))
+    tmp.replace(path)
+    return path
+
+
+def check_regressions(results: pd.DataFrame, settings: dict, tolerance: float = 0.25,
+                      mem_tolerance: float = 0.5, path: Path = BASELINE_PATH) -> list:
+    """Stages slower (or hungrier) than the baseline beyond the tolerances, as messages."""
+    base = json.loads(Path(path).read_text())
+    if base["settings"] != settings:
+        raise ValueError(f"baseline was recorded with {base['settings']}, this run uses {settings}")
+    failures = []
+    for r in results.to_dict("records"):
+        b = base["results"].get(_key(r))
+        if b is None:
+            continue
+        limit = max(b["wall_s"] * (1 + tolerance), b["wall_s"] + MIN_WALL_S)
+        if r["wall_s"] > limit:
+            failures.append(f"{_key(r)}: {r['wall_s']:.3f} s vs baseline {b['wall_s']:.3f} s")
+        if r["rss_delta_mb"] is not None and b["rss_delta_mb"] is not None:
+            limit = max(b["rss_delta_mb"] * (1 + mem_tolerance), b["rss_delta_mb"] + MIN_RSS_MB)
+            if r["rss_delta_mb"] > limit:
+                failures.append(f"{_key(r)}: +{r['rss_delta_mb']:.0f} MB vs baseline +{b['rss_delta_mb']:.0f} MB")
+    return failures
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Benchmark the feature stages on synthetic footprints.")
+    ap.add_argument("--scales", type=float, nargs="+", default=[1, 10])
+    ap.add_argument("--days", type=int, default=60)
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--repeat", type=int, default=1)
+    ap.add_argument("--cases", nargs="+", choices=list(CASES), default=None)
+    ap.add_argument("--data-dir", type=Path, default=BENCH_DATA_DIR)
+    ap.add_argument("--out", type=Path, default=None, help="results table (.csv)")
+    ap.add_argument("--baseline", type=Path, default=BASELINE_PATH)
+    ap.add_argument("--save-baseline", action="store_true")
+    ap.add_argument("--check", action="store_true", help="exit 1 when a stage regresses past the tolerance")
+    ap.add_argument("--tolerance", type=float, default=0.25, help="allowed relative slowdown")
+    ap.add_argument("--mem-tolerance", type=float, default=0.5, help="allowed relative memory growth")
+    args = ap.parse_args()
+
+    settings = {"days": args.days, "seed": args.seed}
+    results = run_suite(args.scales, args.days, args.seed, args.repeat, args.cases, args.data_dir)
+    if args.out is not None:
+        results.to_csv(args.out, index=False)
+    if args.save_baseline:
+        print(f"baseline: {save_baseline(results, settings, args.baseline)}")
+    if args.check:
+        failures = check_regressions(results, settings, args.tolerance, args.mem_tolerance, args.baseline)
+        for msg in failures:
+            print(f"REGRESSION {msg}")
+        if failures:
+            sys.exit(1)
+        print("no regressions")
+
+
+if __name__ == "__main__":
+    main()
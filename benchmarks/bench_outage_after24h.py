@@ -0,0 +1,75 @@
+# Compare the loop and sorted engines of match_max_outage_after24h on synthetic data.
+#
+#   python -m benchmarks.bench_outage_after24h --counties 40 --years 2 --storms 3000
+
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from storm_outage_after24h import match_max_outage_after24h
+from window_kernels import BACKEND, window_max
+
+
+def make_synthetic(n_counties=20, n_years=1, n_storms=1000, seed=0):
+    rng = np.random.default_rng(seed)
+    states = np.array(["MAINE", "MASSACHUSETTS", "NEW JERSEY", "NEW YORK"])
+    counties = [(states[i % len(states)], f"COUNTY {i}") for i in range(n_counties)]
+
+    t_start = pd.Timestamp("2014-01-01")
+    steps = int(n_years * 365 * 24 * 4)
+    times = t_start + pd.to_timedelta(np.arange(steps) * 15, unit="min")
+
+    frames = []
+    for state, county in counties:
+        keep = rng.random(steps) < 0.8          # EAGLE-I drops snapshots
+        n = int(keep.sum())
+        frames.append(pd.DataFrame({
+            "state": state.title(),
+            "county": county.title(),
+            "run_start_time": times[keep],
+            "sum": rng.poisson(20, n) * (rng.random(n) < 0.3),
+        }))
+    outage_df = pd.concat(frames, ignore_index=True)
+
+    pick = rng.integers(0, n_counties, n_storms)
+    storm_df = pd.DataFrame({
+        "STATE": [counties[i][0] for i in pick],
+        "CZ_NAME": [counties[i][1] for i in pick],
+        "BEGIN_DATE_TIME": t_start + pd.to_timedelta(rng.integers(0, steps * 15, n_storms), unit="min"),
+    })
+    return storm_df, outage_df
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--counties", type=int, default=20)
+    ap.add_argument("--years", type=float, default=1)
+    ap.add_argument("--storms", type=int, default=1000)
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args()
+
+    storm_df, outage_df = make_synthetic(args.counties, args.years, args.storms, args.seed)
+    print(f"storms={len(storm_df)} outage_rows={len(outage_df)}")
+
+    # the first window_max call loads (or compiles) the numba kernels; that is
+    # paid once per process, so it is timed apart from the engines
+    t0 = time.perf_counter()
+    window_max(np.zeros(1, dtype=np.int64), np.zeros(1), np.zeros(1, dtype=np.int64), np.zeros(1, dtype=np.int64))
+    print(f"kernel load: {time.perf_counter() - t0:8.3f} s ({BACKEND})")
+
+    timings = {}
+    out = {}
+    for engine in ("loop", "sorted"):
+        t0 = time.perf_counter()
+        out[engine] = match_max_outage_after24h(storm_df, outage_df, engine=engine)
+        timings[engine] = time.perf_counter() - t0
+        print(f"{engine:>7}: {timings[engine]:8.3f} s")
+
+    pd.testing.assert_frame_equal(out["loop"], out["sorted"])
+    print(f"identical output, speedup x{timings['loop'] / timings['sorted']:.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,298 @@
+# Synthetic stand-ins for the raw inputs of the master-dataset build, sized as a
+# multiple of the NE coastal footprint (44 counties, ~25 storm rows per county
+# and year, 15-minute EAGLE-I snapshots, hourly ERA5 on the 0.25 deg grid).
+#
+#   inputs = make_footprint(scale=10, days=60)
+#
+# returns a dict shaped like pipeline_runner.load_raw_inputs: storm events,
+# EAGLE-I outages, a directory of "data YYYY.csv" ERA5 files, county shapes
+# (with their grid_to_fips mapping) and the EIA utility tables plus a road
+# density table for the circuit allocation.
+#
+# Counties are laid out as 0.5 deg boxes on a lattice, each holding four ERA5
+# cell centres. About one county in six is a "small" county whose box holds
+# no cell centre, like small_county_ERA5_overlap.BAD_FIPS.
+
+import json
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from circuits_distribution_process import state_fips_to_abbr
+
+
+BASE_DIR = Path().resolve()
+
+BENCH_DATA_DIR = (
+    BASE_DIR
+    / "data" / "interim" / "bench_synthetic"
+)
+
+NE_COUNTIES = 44
+STORMS_PER_COUNTY_YEAR = 25
+SMALL_COUNTY_EVERY = 6
+UTILITY_PER_COUNTIES = 3
+
+CELL = 0.25
+BOX = 0.5
+LAT0, LON0 = 38.0, -80.0
+MONTH_NAMES = ["January", "February", "March", "April", "May", "June", "July",
+               "August", "September", "October", "November", "December"]
+
+GENERATOR_VERSION = 1
+
+
+def make_counties(scale: float = 1, seed: int = 0) -> pd.DataFrame:
+    """One row per county: fips parts, names, lattice box and the small flag."""
+    n = max(int(round(NE_COUNTIES * scale)), 2)
+    rng = np.random.default_rng(seed)
+    states = np.array(sorted(state_fips_to_abbr))
+    state = states[np.arange(n) % len(states)]
+    county = 2 * (np.arange(n) // len(states)) + 1
+
+    n_cols = int(np.ceil(np.sqrt(n)))
+    r, c = np.divmod(np.arange(n), n_cols)
+    # box corners sit half a cell off the lattice, so a full box holds 2 x 2 centres
+    lat_lo = LAT0 + BOX * r - CELL / 2
+    lon_lo = LON0 + BOX * c - CELL / 2
+    small = (np.arange(n) % SMALL_COUNTY_EVERY) == SMALL_COUNTY_EVERY - 1
+    out = pd.DataFrame({
+        "STATEFP": [f"{s:02d}" for s in state],
+        "COUNTYFP": [f"{x:03d}" for x in county],
+        "STATE_FIPS": state,
+        "CZ_FIPS": county,
+        "STATE": [f"STATE {s:02d}" for s in state],
+        "NAME": [f"County {x}" for x in np.arange(n)],
+        "small": small,
+        "lat_lo": lat_lo,
+        "lat_hi": lat_lo + BOX,
+        "lon_lo": lon_lo,
+        "lon_hi": lon_lo + BOX,
+    })
+    # small counties: a 0.1 deg box between the cell centres
+    mid_lat = LAT0 + BOX * r + CELL / 2
+    mid_lon = LON0 + BOX * c + CELL / 2
+    out.loc[small, "lat_lo"] = mid_lat[small] - 0.05
+    out.loc[small, "lat_hi"] = mid_lat[small] + 0.05
+    out.loc[small, "lon_lo"] = mid_lon[small] - 0.05
+    out.loc[small, "lon_hi"] = mid_lon[small] + 0.05
+    out["full_fips"] = out["STATEFP"] + out["COUNTYFP"]
+    out["lattice"] = np.arange(n)
+    out["road_density_km_per_km2"] = rng.gamma(2.0, 0.8, n)
+    return out
+
+
+def county_shapes(counties: pd.DataFrame):
+    """counties as a cb_2018-style GeoDataFrame (STATEFP, COUNTYFP, GEOID, NAME)."""
+    import geopandas as gpd
+    import shapely
+
+    geom = shapely.box(counties["lon_lo"], counties["lat_lo"], counties["lon_hi"], counties["lat_hi"])
+    return gpd.GeoDataFrame({
+        "STATEFP": counties["STATEFP"].to_numpy(),
+        "COUNTYFP": counties["COUNTYFP"].to_numpy(),
+        "GEOID": counties["full_fips"].to_numpy(),
+        "NAME": counties["NAME"].to_numpy(),
+    }, geometry=geom, crs="EPSG:4326")
+
+
+def era5_grid(counties: pd.DataFrame) -> pd.DataFrame:
+    """latitude, longitude of every cell centre in the lattice blocks (small counties' blocks too)."""
+    n_cols = int(np.ceil(np.sqrt(len(counties))))
+    r, c = np.divmod(counties["lattice"].to_numpy(), n_cols)
+    di, dj = np.array([0, 0, 1, 1]), np.array([0, 1, 0, 1])
+    lat = LAT0 + BOX * r[:, None] + CELL * di
+    lon = LON0 + BOX * c[:, None] + CELL * dj
+    return pd.DataFrame({"latitude": lat.ravel(), "longitude": lon.ravel()})
+
+
+def grid_to_fips(counties: pd.DataFrame) -> pd.DataFrame:
+    """Same sjoin as era5_storm_features_max48h.build_grid_to_fips_mapping, on the synthetic shapes."""
+    import geopandas as gpd
+
+    grid = era5_grid(counties)
+    gdf_grid = gpd.GeoDataFrame(
+        grid, geometry=gpd.points_from_xy(grid["longitude"], grid["latitude"]), crs="EPSG:4326",
+    )
+    shapes = county_shapes(counties).rename(columns={"GEOID": "full_fips"})
+    joined = gpd.sjoin(gdf_grid, shapes[["full_fips", "geometry"]], how="inner", predicate="within")
+    return joined[["latitude", "longitude", "full_fips"]].drop_duplicates().reset_index(drop=True)
+
+
+def storm_events(counties: pd.DataFrame, start, days: int, rng) -> pd.DataFrame:
+    """NOAA storm-event rows: episodes that hit a run of neighbouring counties within hours."""
+    start = pd.Timestamp(start)
+    n_rows = max(int(round(len(counties) * STORMS_PER_COUNTY_YEAR * days / 365)), 1)
+    n_episodes = max(n_rows // 3, 1)
+    size = rng.integers(1, 6, n_episodes)
+    ep = np.repeat(np.arange(n_episodes), size)
+    first = rng.integers(0, len(counties), n_episodes)
+    offset = np.arange(len(ep)) - np.repeat(np.cumsum(size) - size, size)
+    k = (first[ep] + offset) % len(counties)
+
+    ep_begin = start + pd.to_timedelta(rng.integers(0, days * 24 * 60, n_episodes), unit="min")
+    begin = ep_begin[ep] + pd.to_timedelta(rng.integers(-360, 360, len(ep)), unit="min")
+    end = begin + pd.to_timedelta(rng.exponential(6 * 60, len(ep)).astype(int) + 15, unit="min")
+
+    cty = counties.iloc[k]
+    out = pd.DataFrame({
+        "EVENT_ID": 500_000 + np.arange(len(ep)),
+        "EPISODE_ID_LOC": 100_000 + ep,
+        "STATE": cty["STATE"].to_numpy(),
+        "STATE_FIPS": cty["STATE_FIPS"].to_numpy(),
+        "CZ_FIPS": cty["CZ_FIPS"].to_numpy(),
+        "CZ_NAME": cty["NAME"].str.upper().to_numpy(),
+        "full_fips": cty["full_fips"].to_numpy(),
+        "BEGIN_DATE_TIME": begin,
+        "END_DATE_TIME": end,
+        "LATITUDE": rng.uniform(cty["lat_lo"], cty["lat_hi"]),
+        "LONGITUDE": rng.uniform(cty["lon_lo"], cty["lon_hi"]),
+    })
+    out = out[(out["BEGIN_DATE_TIME"] >= start) &
+              (out["BEGIN_DATE_TIME"] < start + pd.Timedelta(days=days))].reset_index(drop=True)
+    out["YEAR"] = out["BEGIN_DATE_TIME"].dt.year
+    out["YEARMONTH"] = out["YEAR"] * 100 + out["BEGIN_DATE_TIME"].dt.month
+    out["MONTH_NAME"] = np.array(MONTH_NAMES)[out["BEGIN_DATE_TIME"].dt.month.to_numpy() - 1]
+    return out
+
+
+def eaglei_outages(counties: pd.DataFrame, storms: pd.DataFrame, start, days: int, rng) -> pd.DataFrame:
+    """15-minute EAGLE-I customer-out series with dropped snapshots and a decaying surge after each storm."""
+    start = pd.Timestamp(start)
+    steps = days * 24 * 4
+    t = start.to_datetime64() + np.arange(steps) * np.timedelta64(15, "m")
+    t_ns = t.astype("datetime64[ns]").astype(np.int64)
+    storm_t = storms["BEGIN_DATE_TIME"].to_numpy().astype("datetime64[ns]").astype(np.int64)
+    storm_k = storms["full_fips"].map(dict(zip(counties["full_fips"], range(len(counties))))).to_numpy()
+    hour = 3_600_000_000_000
+
+    frames = []
+    for k, row in enumerate(counties.itertuples(index=False)):
+        keep = rng.random(steps) < 0.8
+        vals = rng.poisson(20, steps) * (rng.random(steps) < 0.6)
+        surge = np.zeros(steps)
+        for t0 in storm_t[storm_k == k]:
+            lag = (t_ns - t0) / hour
+            on = (lag >= 0) & (lag <= 48)
+            surge[on] += rng.lognormal(6, 1.5) * np.exp(-lag[on] / 8)
+        frames.append(pd.DataFrame({
+            "fips_code": int(row.full_fips),
+            "county": row.NAME,
+            "state": row.STATE.title(),
+            "sum": (vals + surge.astype(np.int64))[keep],
+            "run_start_time": t[keep],
+        }))
+    return pd.concat(frames, ignore_index=True)
+
+
+def write_era5_csvs(counties: pd.DataFrame, storms: pd.DataFrame, start, days: int,
+                    era5_dir: Path, rng) -> dict:
+    """Hourly ERA5 "data YYYY.csv" files covering the storm windows; returns {year: rows}."""
+    grid = era5_grid(counties)
+    start = pd.Timestamp(start).floor("D") - pd.Timedelta(days=1)
+    hours = pd.date_range(start, periods=(days + 2) * 24, freq="h")
+    n_cells, n_hours = len(grid), len(hours)
+
+    i10fg = rng.gamma(3.0, 2.0, (n_cells, n_hours)).astype(np.float32)
+    tp = (rng.exponential(2e-4, (n_cells, n_hours)) * (rng.random((n_cells, n_hours)) < 0.2)).astype(np.float32)
+    crr = (tp * rng.uniform(0.5, 1.5, (n_cells, n_hours))).astype(np.float32)
+    # storms: wind and rain bumps on the county's cells around the begin hour
+    cell_k = np.repeat(counties["lattice"].to_numpy(), 4)
+    k_of = dict(zip(counties["full_fips"], counties["lattice"]))
+    h = ((storms["BEGIN_DATE_TIME"] - start) // pd.Timedelta(hours=1)).to_numpy()
+    for k, h0 in zip(storms["full_fips"].map(k_of).to_numpy(), h):
+        cells = np.flatnonzero(cell_k == k)
+        lo, hi = max(h0 - 6, 0), min(h0 + 6, n_hours)
+        i10fg[cells, lo:hi] += rng.gamma(4.0, 3.0)
+        tp[cells, lo:hi] += rng.exponential(3e-3)
+
+    era5_dir = Path(era5_dir)
+    era5_dir.mkdir(parents=True, exist_ok=True)
+    rows = {}
+    years = hours.year.to_numpy()
+    for y in np.unique(years):
+        sel = np.flatnonzero(years == y)
+        df = pd.DataFrame({
+            "valid_time": np.tile(hours[sel].to_numpy(), n_cells),
+            "latitude": np.repeat(grid["latitude"].to_numpy(), len(sel)),
+            "longitude": np.repeat(grid["longitude"].to_numpy(), len(sel)),
+            "tp": tp[:, sel].ravel(),
+            "i10fg": i10fg[:, sel].ravel(),
+            "crr": crr[:, sel].ravel(),
+        })
+        path = era5_dir / f"data {int(y)}.csv"
+        tmp = path.with_suffix(".tmp")
+        df.to_csv(tmp, index=False)
+        tmp.replace(path)
+        rows[int(y)] = len(df)
+    return rows
+
+
+def utility_tables(counties: pd.DataFrame, rng):
+    """EIA-861 Distribution_Systems / Service_Territory rows and the road density table.
+
+    Each utility serves a run of counties in one state, about one utility per
+    UTILITY_PER_COUNTIES counties, with every county served at least once.
+    """
+    abbr = counties["STATE_FIPS"].map(state_fips_to_abbr)
+    serv, dist = [], []
+    u = 10_000
+    for st, idx in counties.groupby(abbr).indices.items():
+        n_util = max(len(idx) // UTILITY_PER_COUNTIES, 1)
+        owner = np.arange(len(idx)) % n_util
+        for j in range(n_util):
+            served = idx[owner == j]
+            # a few utilities also reach into a county of another owner
+            extra = idx[rng.integers(0, len(idx), rng.integers(0, 2))]
+            for k in np.unique(np.concatenate([served, extra])):
+                serv.append((u + j, st, counties["NAME"].iloc[k]))
+            circuits = int(rng.integers(20, 2000))
+            for year in (2021, 2022, 2023):
+                dist.append((u + j, year, st, f"{circuits:,}"))
+        u += n_util
+    serv_terr = pd.DataFrame(serv, columns=["Utility Number", "State", "County"])
+    dist_sys = pd.DataFrame(dist, columns=["Utility Number", "Data Year", "State", "Distribution Circuits"])
+    road_density = pd.DataFrame({
+        "county_fips": counties["full_fips"].to_numpy(),
+        "NAME": counties["NAME"].to_numpy(),
+        "STATEFP": counties["STATEFP"].to_numpy(),
+        "road_density_km_per_km2": counties["road_density_km_per_km2"].to_numpy(),
+    })
+    return dist_sys, serv_terr, road_density
+
+
+def make_footprint(scale: float = 1, days: int = 60, start="2017-12-01", seed: int = 0,
+                   data_dir: Path = BENCH_DATA_DIR) -> dict:
+    """All synthetic inputs for one scale. The ERA5 CSVs are written under
+    data_dir once per (scale, days, start, seed) and reused afterwards."""
+    rng = np.random.default_rng(seed)
+    counties = make_counties(scale, seed)
+    storms = storm_events(counties, start, days, rng)
+    outage_df = eaglei_outages(counties, storms, start, days, rng)
+    dist_sys, serv_terr, road_density = utility_tables(counties, rng)
+
+    tag = f"s{scale:g}_d{days}_{pd.Timestamp(start):%Y%m%d}_r{seed}"
+    era5_dir = Path(data_dir) / tag / "era5"
+    stamp = era5_dir / "rows.json"
+    meta = {"version": GENERATOR_VERSION}
+    if stamp.exists() and json.loads(stamp.read_text()).get("version") == GENERATOR_VERSION:
+        era5_rows = json.loads(stamp.read_text())["rows"]
+    else:
+        era5_rows = write_era5_csvs(counties, storms, start, days, era5_dir, np.random.default_rng(seed + 1))
+        stamp.write_text(json.dumps({**meta, "rows": era5_rows}))
+
+    return {
+        "scale": scale,
+        "counties": counties,
+        "storm_events": storms,
+        "outage_df": outage_df,
+        "era5_dir": era5_dir,
+        "era5_rows": int(sum(era5_rows.values())),
+        "counties_shape": county_shapes(counties),
+        "grid_map": grid_to_fips(counties),
+        "small_fips": counties.loc[counties["small"], "full_fips"].tolist(),
+        "dist_sys": dist_sys,
+        "serv_terr": serv_terr,
+        "road_density": road_density,
+    }
@@ -0,0 +1,151 @@
+import json
+import os
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from scipy.special import logsumexp
+
+
+BASE_DIR = Path().resolve()
+
+BN_DIR = (
+    BASE_DIR
+    / "models" / "bayesian_nb"
+)
+
+
+# ---------------------------------------------------------------------------
+# discretization (Bayesian.ipynb)
+# ---------------------------------------------------------------------------
+
+def make_quantile_edges(s: pd.Series, n_bins: int):
+    """Return bin edges based on train quantiles, robust to ties."""
+    s = s.replace([np.inf, -np.inf], np.nan).dropna()
+    if s.empty:
+        return None
+    qs = np.linspace(0, 1, n_bins + 1)
+    edges = np.quantile(s.values, qs)
+    edges = np.unique(edges)
+    if len(edges) < 3:
+        # fallback: use min/max with small epsilon
+        mn, mx = float(s.min()), float(s.max())
+        if mn == mx:
+            return np.array([mn - 1e-9, mn + 1e-9])
+        return np.array([mn - 1e-9, mx + 1e-9])
+    edges[0] = edges[0] - 1e-9
+    edges[-1] = edges[-1] + 1e-9
+    return edges
+
+
+def discretize_with_edges(df_in: pd.DataFrame, edges_map: dict):
+    df_out = df_in.copy()
+    for col, edges in edges_map.items():
+        if edges is None:
+            df_out[col] = 0
+        else:
+            df_out[col] = pd.cut(df_out[col], bins=edges, labels=False, include_lowest=True)
+            df_out[col] = df_out[col].astype("float").fillna(0).astype(int)
+    return df_out
+
+
+# ---------------------------------------------------------------------------
+# compiled inference
+# ---------------------------------------------------------------------------
+
+class CompiledBN:
+    """Posterior of one target node given every other node, from dense log-CPD tables.
+
+    With all non-target nodes observed, P(target | e) is proportional to the
+    product of the CPDs that mention the target, so each row's log posterior
+    is a sum of entries gathered from those tables (target axis last) and one
+    logsumexp. CPDs without the target are constant over it and drop out.
+    This is what VariableElimination computes for that evidence.
+    """
+
+    def __init__(self, target: str, states: dict, factors: list, edges_map: dict = None):
+        self.target = target
+        self.states = {v: list(s) for v, s in states.items()}
+        # factors: (evidence vars, log table with axes evidence vars..., target)
+        self.factors = [(list(ev), np.asarray(t, dtype=np.float64)) for ev, t in factors]
+        self.edges_map = edges_map
+        self.evidence_vars = sorted({v for ev, _ in self.factors for v in ev})
+
+    @classmethod
+    def from_model(cls, model, target: str = "y", edges_map: dict = None):
+        """Compile a fitted pgmpy DiscreteBayesianNetwork."""
+        states = {v: list(s) for v, s in model.states.items()}
+        factors = []
+        for cpd in model.get_cpds():
+            cols = list(cpd.variables)
+            if target not in cols:
+                continue
+            table = cpd.values
+            # align each axis to the model's state order
+            for ax, v in enumerate(cols):
+                own = list(cpd.state_names[v])
+                table = np.take(table, [own.index(s) for s in states[v]], axis=ax)
+            ev = [v for v in cols if v != target]
+            table = np.moveaxis(table, cols.index(target), -1)
+            with np.errstate(divide="ignore"):
+                factors.append((ev, np.log(table)))
+        return cls(target, states, factors, edges_map)
+
+    @property
+    def target_states(self) -> list:
+        return self.states[self.target]
+
+    def _codes(self, df_disc: pd.DataFrame, var: str) -> np.ndarray:
+        st = self.states[var]
+        values = df_disc[var].to_numpy()
+        lookup = pd.Index(st)
+        codes = lookup.get_indexer(values)
+        if (codes < 0).any():
+            bad = sorted(set(values[codes < 0].tolist()))
+            raise ValueError(f"{var}: states {bad} not in the fitted model {st}")
+        return codes
+
+    def log_posterior(self, df_disc: pd.DataFrame) -> np.ndarray:
+        """(n, n_target_states) normalized log P(target | evidence row)."""
+        codes = {v: self._codes(df_disc, v) for v in self.evidence_vars}
+        logp = np.zeros((len(df_disc), len(self.target_states)))
+        for ev, table in self.factors:
+            logp += table[tuple(codes[v] for v in ev)]
+        return logp - logsumexp(logp, axis=1, keepdims=True)
+
+    def predict_proba_disc(self, df_disc: pd.DataFrame) -> np.ndarray:
+        return np.exp(self.log_posterior(df_disc))
+
+    def predict_proba(self, df: pd.DataFrame) -> np.ndarray:
+        """Raw feature rows -> posterior, through the saved bin edges."""
+        if self.edges_map is None:
+            raise ValueError("no bin edges; use predict_proba_disc on discretized rows")
+        return self.predict_proba_disc(discretize_with_edges(df[list(self.edges_map)], self.edges_map))
+
+    def save(self, bn_dir: Path = BN_DIR) -> None:
+        bn_dir = Path(bn_dir)
+        bn_dir.mkdir(parents=True, exist_ok=True)
+        np.savez(bn_dir / "tables.npz", **{f"f{i}": t for i, (_, t) in enumerate(self.factors)})
+        meta = {
+            "target": self.target,
+            "states": {v: [s.item() if hasattr(s, "item") else s for s in st] for v, st in self.states.items()},
+            "factors": [ev for ev, _ in self.factors],
+            "edges": None if self.edges_map is None else
+                     {c: None if e is None else [float(x) for x in e] for c, e in self.edges_map.items()},
+        }
+        tmp = bn_dir / "model.json.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(meta, f, indent=1)
+        os.replace(tmp, bn_dir / "model.json")
+
+    @classmethod
+    def load(cls, bn_dir: Path = BN_DIR):
+        bn_dir = Path(bn_dir)
+        with open(bn_dir / "model.json", encoding="utf-8") as f:
+            meta = json.load(f)
+        with np.load(bn_dir / "tables.npz") as z:
+            factors = [(ev, z[f"f{i}"]) for i, ev in enumerate(meta["factors"])]
+        edges = meta["edges"]
+        if edges is not None:
+            edges = {c: None if e is None else np.asarray(e) for c, e in edges.items()}
+        return cls(meta["target"], meta["states"], factors, edges)
@@ -1,11 +1,40 @@
+import hashlib
+import os
+from pathlib import Path
+
 import pandas as pd
 import numpy as np
+from scipy import sparse
 
-def circuits_distribution_process(dist_sys, serv_terr, road_density, master_data):
-    dist_sys = dist_sys.copy()
-    serv_terr = serv_terr.copy()
-    road_density = road_density.copy()
+from storm_schema import FIPS_KEY, with_fips_key
+
+BASE_DIR = Path().resolve()
+
+CIRCUITS_CACHE_DIR = (
+    BASE_DIR
+    / "data" / "interim" / "circuits_cache"
+)
+
+CACHE_VERSION = 1
+
+state_fips_to_abbr = {
+    1: "AL", 2: "AK", 4: "AZ", 5: "AR", 6: "CA",
+    8: "CO", 9: "CT", 10: "DE", 11: "DC", 12: "FL",
+    13: "GA", 15: "HI", 16: "ID", 17: "IL", 18: "IN",
+    19: "IA", 20: "KS", 21: "KY", 22: "LA", 23: "ME",
+    24: "MD", 25: "MA", 26: "MI", 27: "MN", 28: "MS",
+    29: "MO", 30: "MT", 31: "NE", 32: "NV", 33: "NH",
+    34: "NJ", 35: "NM", 36: "NY", 37: "NC", 38: "ND",
+    39: "OH", 40: "OK", 41: "OR", 42: "PA", 44: "RI",
+    45: "SC", 46: "SD", 47: "TN", 48: "TX", 49: "UT",
+    50: "VT", 51: "VA", 53: "WA", 54: "WV", 55: "WI",
+    56: "WY"
+}
 
+
+def _utility_counties(dist_sys, serv_terr, road_density, weight_col, weights):
+    # one row per (utility, state, county) served, with its circuits and weight value
+    dist_sys = dist_sys.copy()
     dist_sys['Distribution Circuits'] = (
         dist_sys['Distribution Circuits']
           .astype(str)
@@ -13,46 +42,30 @@ def circuits_distribution_process(dist_sys, serv_terr, road_density, master_data
           .replace('.', np.nan)
           .astype(float)
     )
-    
-
     dist_sys = (
         dist_sys.sort_values(['Utility Number', 'Data Year'])
                 .drop_duplicates(subset=['Utility Number', 'State'], keep='last')
     )
-    
-
     dist_sys_small = dist_sys[['Utility Number', 'State', 'Distribution Circuits']]
-    
 
     serv_small = (
         serv_terr[['Utility Number', 'State', 'County']]
           .drop_duplicates()
     )
-
-    state_fips_to_abbr = {
-        1: "AL", 2: "AK", 4: "AZ", 5: "AR", 6: "CA",
-        8: "CO", 9: "CT", 10: "DE", 11: "DC", 12: "FL",
-        13: "GA", 15: "HI", 16: "ID", 17: "IL", 18: "IN",
-        19: "IA", 20: "KS", 21: "KY", 22: "LA", 23: "ME",
-        24: "MD", 25: "MA", 26: "MI", 27: "MN", 28: "MS",
-        29: "MO", 30: "MT", 31: "NE", 32: "NV", 33: "NH",
-        34: "NJ", 35: "NM", 36: "NY", 37: "NC", 38: "ND",
-        39: "OH", 40: "OK", 41: "OR", 42: "PA", 44: "RI",
-        45: "SC", 46: "SD", 47: "TN", 48: "TX", 49: "UT",
-        50: "VT", 51: "VA", 53: "WA", 54: "WV", 55: "WI",
-        56: "WY"
-    }
-    
-    road_density['STATEFP'] = road_density['STATEFP'].astype(int)
-    road_density['State'] = road_density['STATEFP'].map(state_fips_to_abbr)
-    
-    road_small = road_density[[
-        'county_fips', 'NAME', 'State', 'road_density_km_per_km2'
-    ]].rename(columns={'NAME': 'County'})
-
-    road_small['County'] = road_small['County'].str.strip()
     serv_small['County'] = serv_small['County'].str.strip()
 
+    road_small = pd.DataFrame({
+        'county_fips': road_density['county_fips'],
+        'County': road_density['NAME'].str.strip(),
+        'State': road_density['STATEFP'].astype(int).map(state_fips_to_abbr),
+    })
+    if weights is None:
+        road_small['w'] = road_density[weight_col].to_numpy()
+    else:
+        w = weights.set_index(weights['county_fips'].astype(str).str.zfill(5))[weight_col]
+        road_small['w'] = road_small['county_fips'].astype(str).str.zfill(5).map(w).to_numpy()
+    road_small['w'] = pd.to_numeric(road_small['w'], errors='coerce')
+
     util_cnty = serv_small.merge(
         road_small,
         on=['State', 'County'],
@@ -60,13 +73,10 @@ def circuits_distribution_process(dist_sys, serv_terr, road_density, master_data
         validate='m:1'
     )
 
-    mask_na = util_cnty['road_density_km_per_km2'].isna()
-    if mask_na.any():
-        util_cnty['road_density_km_per_km2'] = util_cnty.groupby('State')['road_density_km_per_km2']\
-            .transform(lambda x: x.fillna(x.mean()))
-        util_cnty['road_density_km_per_km2'] = util_cnty['road_density_km_per_km2'].fillna(
-            util_cnty['road_density_km_per_km2'].mean()
-        )
+    # counties missing from the road table take their state's mean, then the overall mean
+    w = util_cnty['w']
+    w = w.fillna(w.groupby(util_cnty['State']).transform('mean'))
+    util_cnty['w'] = w.fillna(w.mean())
 
     util_cnty = util_cnty.merge(
         dist_sys_small,
@@ -74,46 +84,93 @@ def circuits_distribution_process(dist_sys, serv_terr, road_density, master_data
         how='left',
         validate='m:1'
     )
-
-    util_cnty = util_cnty.dropna(subset=['Distribution Circuits'])
-    grp = util_cnty.groupby('Utility Number')['road_density_km_per_km2']
-    sum_density = grp.transform('sum')
-    zero_sum = (sum_density == 0) | sum_density.isna()
-    util_cnty.loc[~zero_sum, 'weight'] = \
-        util_cnty.loc[~zero_sum, 'road_density_km_per_km2'] / sum_density[~zero_sum]
-    util_cnty.loc[zero_sum, 'weight'] = \
-        1.0 / util_cnty.loc[zero_sum].groupby('Utility Number')['Utility Number'].transform('count')
-    util_cnty['circuits_county_weighted'] = \
-        util_cnty['Distribution Circuits'] * util_cnty['weight']
-
-    county_circuits = (
-        util_cnty
-          .groupby(['county_fips', 'State', 'County'], as_index=False)['circuits_county_weighted']
-          .sum()
-          .rename(columns={'circuits_county_weighted': 'circuits_total'})
-    )
-
-    print(county_circuits.head())
-    print(county_circuits.shape)
-
-    county_circuits_clean = county_circuits.copy()
-    county_circuits_clean['County_up'] = (
-        county_circuits_clean['County']
-        .str.upper()
-        .str.strip()
-    )
-
-    master_data['CZ_NAME'] = master_data['CZ_NAME'].str.upper().str.strip()
-
-    master_data = master_data.merge(
-        county_circuits_clean[['County_up', 'circuits_total']],
-        left_on='CZ_NAME',
-        right_on='County_up',
-        how='left'
-    )
-
-    master_data = master_data.drop(columns=['County_up'])
-    master_data = master_data.rename(
+    return util_cnty.dropna(subset=['Distribution Circuits']).reset_index(drop=True)
+
+
+def allocation_matrix(util_cnty):
+    """Sparse (utility, state) x county weight matrix of util_cnty.
+
+    A utility's weights sum to 1 over every county it serves, in all states,
+    proportional to `w` (equal shares when its total is zero). Rows are
+    (utility, state) because circuits are reported per state.
+    Returns W (csr), the row labels and the county labels.
+    """
+    u = pd.factorize(util_cnty['Utility Number'])[0]
+    w = util_cnty['w'].to_numpy(dtype=float)
+    total = np.bincount(u, weights=np.nan_to_num(w))
+    n = np.bincount(u)
+    weight = np.where(total[u] == 0, 1.0 / n[u], w / np.where(total[u] == 0, 1.0, total[u]))
+    # a NaN weight adds nothing, as the skipped NaN of a groupby sum did
+    weight = np.nan_to_num(weight)
+
+    # labels come from the same groupbys as the codes, so they line up
+    by_row = util_cnty.groupby(['Utility Number', 'State'], sort=True)
+    by_col = util_cnty.groupby(['county_fips', 'State', 'County'], sort=True, dropna=False)
+    r, c = by_row.ngroup().to_numpy(), by_col.ngroup().to_numpy()
+    rows = by_row['Distribution Circuits'].first().reset_index()
+    cols = by_col.size().index.to_frame(index=False)
+
+    W = sparse.csr_matrix((weight, (r, c)), shape=(len(rows), len(cols)))
+    return W, rows, cols
+
+
+def _digest(*frames) -> str:
+    h = hashlib.sha1(f"v{CACHE_VERSION}".encode())
+    for f in frames:
+        if f is None:
+            h.update(b"none")
+            continue
+        if isinstance(f, str):
+            h.update(f.encode())
+            continue
+        h.update(repr(list(f.columns)).encode())
+        h.update(pd.util.hash_pandas_object(f.astype(str), index=False).to_numpy().tobytes())
+    return h.hexdigest()
+
+
+def county_circuits(dist_sys, serv_terr, road_density, weight_col='road_density_km_per_km2',
+                    weights=None, cache_dir=None):
+    """county_fips, State, County, circuits_total: utility circuits spread over
+    the counties they serve, in proportion to weight_col.
+
+    weight_col is read from road_density, or from `weights` (county_fips +
+    weight_col, e.g. housing units) when given. With cache_dir the result is
+    kept per input content and weighting, so master rebuilds and switching
+    between weightings reuse it.
+    """
+    road_cols = ['county_fips', 'NAME', 'STATEFP'] + ([weight_col] if weights is None else [])
+    path = None
+    if cache_dir is not None:
+        key = _digest(
+            dist_sys[['Utility Number', 'Data Year', 'State', 'Distribution Circuits']],
+            serv_terr[['Utility Number', 'State', 'County']],
+            road_density[road_cols], weights, weight_col,
+        )
+        path = Path(cache_dir) / f"county_circuits_{key}.parquet"
+        if path.exists():
+            return pd.read_parquet(path)
+
+    util_cnty = _utility_counties(dist_sys, serv_terr, road_density, weight_col, weights)
+    W, rows, cols = allocation_matrix(util_cnty)
+    cols['circuits_total'] = W.T @ rows['Distribution Circuits'].to_numpy(dtype=float)
+    county_circuits = cols.dropna(subset=['county_fips']).reset_index(drop=True)
+
+    if path is not None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(".tmp")
+        county_circuits.to_parquet(tmp)
+        os.replace(tmp, path)
+    return county_circuits
+
+
+def circuits_distribution_process(dist_sys, serv_terr, road_density, master_data,
+                                  weight_col='road_density_km_per_km2', weights=None, cache_dir=None):
+    circuits = county_circuits(dist_sys, serv_terr, road_density, weight_col, weights, cache_dir)
+    circuits = with_fips_key(circuits, 'county_fips')[[FIPS_KEY, 'circuits_total']]
+
+    # state + county FIPS, so same-named counties in other states stay apart
+    master_data = with_fips_key(master_data).drop(columns=['weighted_number_of_circuits'], errors='ignore')
+    master_data = master_data.merge(circuits, on=FIPS_KEY, how='left', validate='m:1')
+    return master_data.rename(
         columns={'circuits_total': 'weighted_number_of_circuits'}
     )
-    return master_data
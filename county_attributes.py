@@ -0,0 +1,189 @@
+import numpy as np
+import pandas as pd
+
+from storm_schema import FIPS_KEY, fips_key_from_parts, storm_fips_key, to_fips_key, with_fips_key
+
+
+# Static and annual county covariates, kept apart from storms_data until the
+# final gather:
+#   values[county_idx, year_idx, attr_idx]   float64, NaN where unknown
+#   fips   sorted int32 fips_key of each county row
+#   years  contiguous years of the year axis
+# A static attribute is broadcast over the year axis and is also returned for
+# storms whose YEAR is missing or outside `years`.
+
+HU_YEARS = range(2010, 2025)
+
+
+class CountyAttributeStore:
+    """Dense county x year x attribute array, attached to storms in one indexed gather."""
+
+    def __init__(self, fips, years=HU_YEARS):
+        fips = to_fips_key(fips)
+        years = np.asarray(list(years), dtype=np.int64)
+        self.fips = np.unique(fips[fips >= 0])
+        self.years = np.arange(years.min(), years.max() + 1)
+        self.names = []
+        self.annual = np.empty(0, dtype=bool)
+        self.values = np.full((len(self.fips), len(self.years), 0), np.nan)
+
+    def __repr__(self):
+        return f"CountyAttributeStore({len(self.fips)} counties, {self.years[0]}-{self.years[-1]}, {self.names})"
+
+    def county_index(self, key) -> np.ndarray:
+        """Row of each fips_key in the store, -1 where the county is not in it."""
+        key = to_fips_key(key)
+        if len(self.fips) == 0:
+            return np.full(len(key), -1, dtype=np.int64)
+        idx = np.minimum(np.searchsorted(self.fips, key), len(self.fips) - 1)
+        return np.where(self.fips[idx] == key, idx, -1)
+
+    def year_index(self, year) -> np.ndarray:
+        """Position of each year on the year axis, -1 when missing or out of range."""
+        y = pd.to_numeric(pd.Series(np.asarray(year)), errors="coerce").to_numpy(dtype=float)
+        idx = y - self.years[0]
+        ok = np.isfinite(idx) & (idx >= 0) & (idx < len(self.years))
+        return np.where(ok, idx, -1).astype(np.int64)
+
+    def add(self, name: str, fips, values, year=None) -> None:
+        """Set attribute `name` for the given counties (and years; None = static).
+
+        Counties outside the store are ignored; an existing attribute of the
+        same name is overwritten. Repeated (county, year) pairs keep the last value.
+        """
+        key = to_fips_key(fips)
+        values = pd.to_numeric(pd.Series(np.asarray(values)), errors="coerce").to_numpy(dtype=float)
+
+        if name in self.names:
+            a = self.names.index(name)
+            self.values[:, :, a] = np.nan
+        else:
+            a = len(self.names)
+            self.names.append(name)
+            self.annual = np.append(self.annual, False)
+            self.values = np.concatenate(
+                [self.values, np.full(self.values.shape[:2] + (1,), np.nan)], axis=2
+            )
+        self.annual[a] = year is not None
+
+        ci = self.county_index(key)
+        if year is None:
+            ok = ci >= 0
+            self.values[ci[ok], :, a] = values[ok, None]
+        else:
+            yi = self.year_index(year)
+            ok = (ci >= 0) & (yi >= 0)
+            self.values[ci[ok], yi[ok], a] = values[ok]
+
+    def add_frame(self, df: pd.DataFrame, columns, fips_col: str = None, year_col: str = None) -> None:
+        """add() every column of df in `columns`, keyed by fips_col (default: fips_key / storm FIPS columns)."""
+        key = storm_fips_key(df) if fips_col is None else to_fips_key(df[fips_col])
+        year = df[year_col] if year_col is not None else None
+        for c in [columns] if isinstance(columns, str) else columns:
+            self.add(c, key, df[c], year=year)
+
+    def gather(self, fips, year=None, names=None) -> np.ndarray:
+        """(n, len(names)) attribute values for each (county, year) pair."""
+        names = self.names if names is None else list(names)
+        a = np.array([self.names.index(n) for n in names], dtype=np.int64)
+        ci = self.county_index(fips)
+        yi = self.year_index(year) if year is not None else np.full(len(ci), -1)
+        out = self.values[np.maximum(ci, 0), np.maximum(yi, 0)][:, a]
+        out[ci < 0] = np.nan
+        out[np.ix_(yi < 0, self.annual[a])] = np.nan
+        return out
+
+    def attach(self, storms_data: pd.DataFrame, names=None, year_col: str = "YEAR") -> pd.DataFrame:
+        """storms_data with the store's attributes as columns, from one gather by fips_key / YEAR.
+
+        Rows, order and index of storms_data are unchanged; attribute columns
+        already present are replaced.
+        """
+        names = self.names if names is None else list(names)
+        year = storms_data[year_col] if year_col in storms_data.columns else None
+        block = pd.DataFrame(
+            self.gather(storm_fips_key(storms_data), year, names),
+            index=storms_data.index, columns=names,
+        )
+        return pd.concat([storms_data.drop(columns=names, errors="ignore"), block], axis=1)
+
+
+# ---------------------------------------------------------------------------
+# source tables -> (fips_key[, year], value) frames
+# ---------------------------------------------------------------------------
+
+def housing_units_long(hu: pd.DataFrame) -> pd.DataFrame:
+    """housing_units_process output -> fips_key, year, housing_units."""
+    hu = with_fips_key(hu, "fips_str")
+    year_cols = [c for c in hu.columns if str(c).isdigit() and 2010 <= int(c) <= 2024]
+    hu_long = hu.melt(id_vars=[FIPS_KEY], value_vars=year_cols, var_name="year", value_name="housing_units")
+    hu_long["year"] = hu_long["year"].astype(int)
+    hu_long["housing_units"] = pd.to_numeric(hu_long["housing_units"], errors="coerce")
+    return hu_long
+
+
+def rucc_table(rucc: pd.DataFrame) -> pd.DataFrame:
+    rucc = with_fips_key(rucc, "FIPS")
+    out = (
+        rucc.loc[rucc["Attribute"] == "RUCC_2023", [FIPS_KEY, "Value"]]
+        .rename(columns={"Value": "rucc_2023"})
+    )
+    out["rucc_2023"] = pd.to_numeric(out["rucc_2023"], errors="coerce")
+    return out
+
+
+def cbp_table(cbp: pd.DataFrame) -> pd.DataFrame:
+    # Connecticut is left out, as in primary.ipynb
+    cbp = cbp.assign(**{FIPS_KEY: fips_key_from_parts(cbp["fipstate"], cbp["fipscty"])})
+    cbp = cbp[cbp[FIPS_KEY] // 1000 != 9].copy()
+    cbp["emp"] = pd.to_numeric(cbp["emp"], errors="coerce").fillna(0)
+    return (
+        cbp.groupby(FIPS_KEY, as_index=False)["emp"].sum()
+        .rename(columns={"emp": "cbp_emp_total"})
+    )
+
+
+# urban_score and rd_norm feed UG_ratio_proxy in primary.ipynb, which uses them
+# without building them; they are read from a county table, never derived here
+UG_INPUT_COLS = ["urban_score", "rd_norm"]
+
+
+def ug_table(ug: pd.DataFrame) -> pd.DataFrame:
+    """fips_key, urban_score, rd_norm from a county table that carries both."""
+    missing = [c for c in UG_INPUT_COLS if c not in ug.columns]
+    if missing:
+        raise KeyError(f"UG proxy inputs lack {missing}: urban_score and rd_norm must be supplied per county")
+    return ug.assign(**{FIPS_KEY: storm_fips_key(ug)})[[FIPS_KEY, *UG_INPUT_COLS]]
+
+
+def county_areas(counties_shape) -> pd.DataFrame:
+    """fips_key, county_area_km2 from the county boundaries, in EPSG:5070 (equal area)."""
+    area = counties_shape.to_crs("EPSG:5070").geometry.area / 1e6
+    return pd.DataFrame({
+        FIPS_KEY: fips_key_from_parts(counties_shape["STATEFP"], counties_shape["COUNTYFP"]),
+        "county_area_km2": area.to_numpy(),
+    })
+
+
+def build_county_attributes(hu, road_density, county_circuits, rucc, cbp, ug, counties_shape=None,
+                            fips=None) -> CountyAttributeStore:
+    """Store with every county covariate of primary.ipynb.
+
+    hu: housing_units_process output; road_density: road_datasets_process output;
+    county_circuits: circuits_distribution_process.county_circuits output;
+    ug: county table with urban_score and rd_norm (see ug_table).
+    fips: counties of the store (default: those of hu); rows of the source
+    tables for other counties are ignored.
+    """
+    hu_long = housing_units_long(hu)
+    store = CountyAttributeStore(hu_long[FIPS_KEY] if fips is None else fips)
+    store.add_frame(hu_long, "housing_units", year_col="year")
+    store.add_frame(road_density, "road_density_km_per_km2", fips_col="county_fips")
+    store.add_frame(county_circuits.rename(columns={"circuits_total": "weighted_number_of_circuits"}),
+                    "weighted_number_of_circuits", fips_col="county_fips")
+    store.add_frame(rucc_table(rucc), "rucc_2023")
+    store.add_frame(ug_table(ug), UG_INPUT_COLS)
+    store.add_frame(cbp_table(cbp), "cbp_emp_total")
+    if counties_shape is not None:
+        store.add_frame(county_areas(counties_shape), "county_area_km2")
+    return store
@@ -0,0 +1,278 @@
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import product
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import xgboost as xgb
+from scipy.special import expit
+from scipy.stats import rankdata
+from sklearn.metrics import average_precision_score, log_loss, roc_auc_score
+from sklearn.model_selection import GroupKFold
+
+from master_dataset import MASTER_PATH, read_storms_data
+from outage_scoring import FEATURE_COLS, _inverse
+from storm_schema import ERA_COLS, FIPS_KEY, storm_fips_key
+
+
+BASE_DIR = Path().resolve()
+
+CV_RESULTS = (
+    BASE_DIR
+    / "data" / "interim" / "cv_results.csv"
+)
+
+MAX_BIN = 256
+
+# notebook settings, in xgb.train names (n_estimators -> num_boost_round)
+DEFAULT_PARAMS = {
+    "occurrence": dict(objective="binary:logistic", eval_metric="logloss", max_depth=4,
+                       learning_rate=0.05, subsample=0.8, colsample_bytree=0.8, seed=42),
+    "severity": dict(objective="reg:squarederror", eval_metric="rmse", max_depth=7,
+                     learning_rate=0.03, subsample=0.9, colsample_bytree=0.9, reg_lambda=1.0, seed=42),
+    "duration": dict(objective="reg:squarederror", eval_metric="rmse", max_depth=7,
+                     learning_rate=0.03, subsample=0.9, colsample_bytree=0.9, seed=42),
+}
+
+SPLITS = ("county", "year")
+
+
+# ---------------------------------------------------------------------------
+# datasets: X float32, y on the training scale, county / year groups
+# ---------------------------------------------------------------------------
+
+def _dataset(df: pd.DataFrame, y, fill=True) -> dict:
+    X = df[FEATURE_COLS].apply(pd.to_numeric, errors="coerce").replace([np.inf, -np.inf], np.nan)
+    if fill:
+        X = X.fillna(0.0)
+    year = pd.to_datetime(df["BEGIN_DATE_TIME"], errors="coerce").dt.year
+    return {
+        "X": np.ascontiguousarray(X.to_numpy(dtype=np.float32)),
+        "y": np.asarray(y, dtype=np.float64),
+        "county": storm_fips_key(df),
+        "year": year.fillna(-1).to_numpy(dtype=np.int32),
+    }
+
+
+def occurrence_dataset(storms_data: pd.DataFrame, threshold: float = 10) -> dict:
+    """XGBoost_3levels_&_binary_occurance.ipynb: outage above baseline + threshold."""
+    y = (storms_data["max_outage_after_24h"] > storms_data["baseline_outage_median"] + threshold).astype(int)
+    df = storms_data.assign(y_outage=y).dropna(subset=FEATURE_COLS + ["y_outage"])
+    return _dataset(df, df["y_outage"], fill=False)
+
+
+def severity_dataset(storms_data: pd.DataFrame) -> dict:
+    """XGBoost_severity.ipynb: log1p(100 * outage_ratio)."""
+    df = storms_data[pd.to_datetime(storms_data["BEGIN_DATE_TIME"], errors="coerce").notna()]
+    df = df[df["max_outage_after_24h"].notna() & df["housing_units"].notna() & (df["housing_units"] > 0)]
+    ratio = (df["max_outage_after_24h"] / df["housing_units"]).clip(0.0, 1.0)
+    return _dataset(df, np.log1p(100.0 * ratio))
+
+
+def duration_dataset(storms_data: pd.DataFrame) -> dict:
+    """XGBoost_duration.ipynb: log1p(max hours) per storm-county with an outage."""
+    df = storms_data[pd.to_datetime(storms_data["BEGIN_DATE_TIME"], errors="coerce").notna()]
+    df = df.assign(**{
+        FIPS_KEY: storm_fips_key(df),
+        "duration_hours": pd.to_numeric(df["duration_hours"], errors="coerce").fillna(0.0).clip(lower=0.0),
+    })
+    df = df[df[FIPS_KEY] >= 0]
+    feats = df[FEATURE_COLS].apply(pd.to_numeric, errors="coerce").replace([np.inf, -np.inf], np.nan)
+    df = pd.concat([df[["EVENT_ID", FIPS_KEY, "BEGIN_DATE_TIME", "duration_hours"]], feats], axis=1)
+    agg = {c: ("max" if c in ERA_COLS else "mean") for c in FEATURE_COLS}
+    agg.update(duration_hours="max", BEGIN_DATE_TIME="min")
+    g = df.groupby(["EVENT_ID", FIPS_KEY], as_index=False).agg(agg)
+    g = g[g["duration_hours"] > 0]
+    return _dataset(g, np.log1p(g["duration_hours"]))
+
+
+DATASETS = {
+    "occurrence": occurrence_dataset,
+    "severity": severity_dataset,
+    "duration": duration_dataset,
+}
+
+
+# ---------------------------------------------------------------------------
+# folds
+# ---------------------------------------------------------------------------
+
+def group_folds(groups, n_splits: int = 5, inner_splits: int = 4) -> list:
+    """(train, valid, test) row indices of a GroupKFold; valid is one inner group fold
+    of train, used only for early stopping, so the test groups never steer a model."""
+    groups = np.asarray(groups)
+    n_splits = min(n_splits, len(np.unique(groups)))
+    folds = []
+    for train, test in GroupKFold(n_splits=n_splits).split(groups, groups=groups):
+        g = groups[train]
+        k = min(inner_splits, len(np.unique(g)))
+        if k < 2:
+            folds.append((train, None, test))
+            continue
+        fit, valid = next(GroupKFold(n_splits=k).split(g, groups=g))
+        folds.append((train[fit], train[valid], test))
+    return folds
+
+
+def expand_grid(grid: dict) -> list:
+    """{"max_depth": [4, 6], "eta": [0.05]} -> list of param dicts."""
+    keys = list(grid)
+    return [dict(zip(keys, vals)) for vals in product(*(grid[k] for k in keys))]
+
+
+# ---------------------------------------------------------------------------
+# worker side: one QuantileDMatrix per process, shared by every fold it fits
+# ---------------------------------------------------------------------------
+
+_SHARED = {}
+
+
+def _init_worker(X, y, max_bin, nthread):
+    # bin cuts are sketched once on all rows; fold matrices reuse them via ref=
+    _SHARED.update(X=X, y=y, max_bin=max_bin, nthread=nthread,
+                   ref=xgb.QuantileDMatrix(X, y, max_bin=max_bin, nthread=nthread))
+
+
+def _metrics(task: str, y_t: np.ndarray, raw: np.ndarray) -> dict:
+    if task == "occurrence":
+        p = np.clip(raw, 1e-7, 1 - 1e-7)
+        both = len(np.unique(y_t)) == 2
+        return {
+            "auc": roc_auc_score(y_t, p) if both else np.nan,
+            "ap": average_precision_score(y_t, p) if both else np.nan,
+            "logloss": log_loss(y_t, p, labels=[0, 1]),
+        }
+    # reported on the original scale, as in the notebooks
+    y, pred = _inverse(task, y_t), _inverse(task, raw)
+    resid = y - pred
+    ss_tot = np.sum((y - y.mean()) ** 2)
+    return {
+        "rmse": float(np.sqrt(np.mean(resid ** 2))),
+        "mae": float(np.mean(np.abs(resid))),
+        "r2": float(1 - np.sum(resid ** 2) / ss_tot) if ss_tot > 0 else np.nan,
+    }
+
+
+def _fit_fold(task, params, num_boost_round, early_stopping_rounds, train, valid, test):
+    X, y, ref = _SHARED["X"], _SHARED["y"], _SHARED["ref"]
+    params = {**params, "tree_method": "hist", "max_bin": _SHARED["max_bin"], "nthread": _SHARED["nthread"]}
+
+    dtrain = xgb.QuantileDMatrix(X[train], y[train], ref=ref)
+    evals, es = [], None
+    if valid is not None and early_stopping_rounds:
+        # xgboost wants the eval matrix to reference dtrain, which carries the shared cuts
+        evals, es = [(xgb.QuantileDMatrix(X[valid], y[valid], ref=dtrain), "valid")], early_stopping_rounds
+
+    t0 = time.perf_counter()
+    booster = xgb.train(params, dtrain, num_boost_round, evals=evals,
+                        early_stopping_rounds=es, verbose_eval=False)
+    fit_s = time.perf_counter() - t0
+    n_trees = booster.best_iteration + 1 if es else num_boost_round
+    raw = booster.inplace_predict(X[test], iteration_range=(0, n_trees), validate_features=False)
+
+    return {"n_train": len(train), "n_valid": 0 if valid is None else len(valid), "n_test": len(test),
+            "n_trees": n_trees, "fit_s": round(fit_s, 3), **_metrics(task, y[test], np.asarray(raw))}
+
+
+# ---------------------------------------------------------------------------
+# driver
+# ---------------------------------------------------------------------------
+
+def run_cv(data: dict, task: str, param_grid: dict = None, split=SPLITS, n_splits: int = 5,
+           num_boost_round: int = 2000, early_stopping_rounds: int = 50, n_workers: int = 1,
+           max_bin: int = MAX_BIN, results_path: Path = None) -> pd.DataFrame:
+    """Grouped K-fold CV of `task` over every param combination, one row per fold.
+
+    data: output of one of DATASETS. split: "county" and/or "year" grouping,
+    so no county (or year) is in both train and test of a fold.
+    param_grid: {param: [values]} on top of DEFAULT_PARAMS[task].
+    n_workers > 1 fans (params, fold) jobs out to a process pool (None = all
+    cores); each worker sketches the quantile bins once. Rows are appended to
+    results_path (CSV) when given.
+    """
+    if task not in DEFAULT_PARAMS:
+        raise ValueError(f"unknown task: {task}")
+    splits = [split] if isinstance(split, str) else list(split)
+    for s in splits:
+        if s not in SPLITS:
+            raise ValueError(f"unknown split: {s}")
+
+    grid = expand_grid(param_grid or {})
+    jobs = []
+    for s in splits:
+        for fold, (train, valid, test) in enumerate(group_folds(data[s], n_splits)):
+            for i, extra in enumerate(grid):
+                jobs.append(({"split": s, "fold": fold, "params_id": i, "params": json.dumps(extra, sort_keys=True)},
+                             (task, {**DEFAULT_PARAMS[task], **extra}, num_boost_round,
+                              early_stopping_rounds, train, valid, test)))
+
+    n_workers = os.cpu_count() if n_workers is None else n_workers
+    nthread = max(1, (os.cpu_count() or 1) // max(1, n_workers))
+    if n_workers == 1 or len(jobs) <= 1:
+        _init_worker(data["X"], data["y"], max_bin, nthread)
+        out = [_fit_fold(*args) for _, args in jobs]
+    else:
+        with ProcessPoolExecutor(max_workers=n_workers, initializer=_init_worker,
+                                 initargs=(data["X"], data["y"], max_bin, nthread)) as pool:
+            out = list(pool.map(_fit_fold, *zip(*[args for _, args in jobs])))
+
+    res = pd.DataFrame([{"task": task, **meta, **r} for (meta, _), r in zip(jobs, out)])
+    if results_path is not None:
+        results_path = Path(results_path)
+        results_path.parent.mkdir(parents=True, exist_ok=True)
+        res.to_csv(results_path, mode="a", header=not results_path.exists(), index=False)
+    return res
+
+
+# ---------------------------------------------------------------------------
+# UG_ratio_proxy grid (primary.ipynb)
+# ---------------------------------------------------------------------------
+
+def ug_proxy_grid(u, r, C, y, a_values=range(5), b_values=range(5)) -> pd.DataFrame:
+    """Spearman rho between y and (1 - expit(a*u + b*r)) * C for every (a, b).
+
+    All candidates are ranked in one rankdata call over a (n_ab, n) matrix;
+    rows with a constant prediction give NaN, as spearmanr does.
+    """
+    u, r, C, y = (np.asarray(v, dtype=float) for v in (u, r, C, y))
+    m = np.isfinite(u) & np.isfinite(r) & np.isfinite(C) & np.isfinite(y)
+    u, r, C, y = u[m], r[m], C[m], y[m]
+
+    ab = np.array(list(product(a_values, b_values)), dtype=float)
+    pred = (1 - expit(ab[:, :1] * u + ab[:, 1:] * r)) * C
+    rp = rankdata(pred, axis=1)
+    ry = rankdata(y)
+    rp -= rp.mean(axis=1, keepdims=True)
+    ry -= ry.mean()
+    with np.errstate(invalid="ignore", divide="ignore"):
+        rho = (rp @ ry) / np.sqrt((rp ** 2).sum(axis=1) * (ry ** 2).sum())
+    return pd.DataFrame({"a": ab[:, 0].astype(int), "b": ab[:, 1].astype(int), "rho": rho})
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Grouped K-fold CV sweep for the outage models.")
+    ap.add_argument("task", choices=list(DATASETS))
+    ap.add_argument("--data", type=Path, default=MASTER_PATH, help="Parquet master dataset or storms_data.csv")
+    ap.add_argument("--split", nargs="+", default=list(SPLITS), choices=list(SPLITS))
+    ap.add_argument("--folds", type=int, default=5)
+    ap.add_argument("--grid", type=json.loads, default={}, help='e.g. \'{"max_depth": [4, 6, 8]}\'')
+    ap.add_argument("--rounds", type=int, default=2000)
+    ap.add_argument("--early-stopping", type=int, default=50)
+    ap.add_argument("--workers", type=int, default=None)
+    ap.add_argument("--out", type=Path, default=CV_RESULTS)
+    args = ap.parse_args()
+
+    data = DATASETS[args.task](read_storms_data(args.data))
+    res = run_cv(data, args.task, args.grid, split=args.split, n_splits=args.folds,
+                 num_boost_round=args.rounds, early_stopping_rounds=args.early_stopping,
+                 n_workers=args.workers, results_path=args.out)
+    metrics = [c for c in ("auc", "ap", "logloss", "rmse", "mae", "r2") if c in res.columns]
+    print(res.groupby(["split", "params"])[metrics + ["n_trees"]].mean().to_string())
+
+
+if __name__ == "__main__":
+    main()
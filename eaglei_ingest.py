@@ -0,0 +1,217 @@
+import json
+import os
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+
+BASE_DIR = Path().resolve()
+
+OUTAGE_CSV = (
+    BASE_DIR
+    / "data" / "raw" / "power_outages"
+    / "eaglei_outages_2014_2022_NE_coastal_raw.csv"
+)
+
+OUTAGE_CACHE_DIR = (
+    BASE_DIR
+    / "data" / "interim" / "eaglei_cache"
+)
+
+CACHE_VERSION = 2
+
+# Layout of the cache:
+#   cache_dir/index.json   source (mtime, size), per-county [start, stop) row ranges,
+#                          the county / state names seen for that fips and the
+#                          number of its rows with a missing sum
+#   cache_dir/times.npy    datetime64[ns], sorted by (fips, time)
+#   cache_dir/values.npy   float32 customers out ("sum"), NaN where missing
+# Rows with a missing fips or time are dropped at ingest. A missing sum is
+# kept as NaN, as in the raw frame: it still breaks an outage-duration run and
+# a window with only missing sums still has no max.
+
+
+class OutageCache:
+    """Memory-mapped, county-partitioned EAGLE-I outage series."""
+
+    def __init__(self, cache_dir: Path = OUTAGE_CACHE_DIR, mmap: bool = True, fips=None):
+        self.cache_dir = Path(cache_dir)
+        self.mmap = mmap
+        with open(self.cache_dir / "index.json", encoding="utf-8") as f:
+            self.index = json.load(f)
+        mode = "r" if mmap else None
+        self.times = np.load(self.cache_dir / "times.npy", mmap_mode=mode)
+        self.values = np.load(self.cache_dir / "values.npy", mmap_mode=mode)
+
+        counties = self.index["counties"]
+        if fips is not None:
+            keep = set(int(f) for f in fips)
+            counties = [c for c in counties if c["fips"] in keep]
+        self.fips = np.array([c["fips"] for c in counties], dtype=np.int32)
+        self.starts = np.array([c["start"] for c in counties], dtype=np.int64)
+        self.stops = np.array([c["stop"] for c in counties], dtype=np.int64)
+        self.states = [c["state"] for c in counties]
+        self.counties = [c["county"] for c in counties]
+        self.missing = np.array([c["missing"] for c in counties], dtype=np.int64)
+        self._pos = {int(f): i for i, f in enumerate(self.fips)}
+        self._subset = fips is not None
+
+    def __len__(self) -> int:
+        return int((self.stops - self.starts).sum())
+
+    def __repr__(self):
+        return f"OutageCache({self.cache_dir}, {len(self.fips)} counties, {len(self):,} rows)"
+
+    def __reduce__(self):
+        # pickled as its directory and county selection; the receiving process
+        # maps the files again instead of getting a copy of the arrays
+        return OutageCache, (self.cache_dir, self.mmap, self.fips.tolist() if self._subset else None)
+
+    def select(self, fips) -> "OutageCache":
+        """The same memory-mapped cache restricted to the given counties."""
+        return OutageCache(self.cache_dir, self.mmap, fips=[f for f in fips if int(f) in self._pos])
+
+    def __contains__(self, fips) -> bool:
+        return int(fips) in self._pos
+
+    def missing_counties(self) -> np.ndarray:
+        """fips of the counties with at least one missing sum."""
+        return self.fips[self.missing > 0]
+
+    def series(self, fips):
+        """(times, values) views for one county; empty arrays if the county is absent."""
+        i = self._pos.get(int(fips))
+        if i is None:
+            return self.times[:0], self.values[:0]
+        a, b = self.starts[i], self.stops[i]
+        return self.times[a:b], self.values[a:b]
+
+    def items(self):
+        for i, f in enumerate(self.fips):
+            a, b = self.starts[i], self.stops[i]
+            yield int(f), self.times[a:b], self.values[a:b]
+
+    def to_frame(self, fips=None) -> pd.DataFrame:
+        """Materialize the raw-file layout (fips_code, county, state, sum, run_start_time)."""
+        sel = range(len(self.fips)) if fips is None else [self._pos[int(f)] for f in fips if int(f) in self._pos]
+        frames = []
+        for i in sel:
+            a, b = self.starts[i], self.stops[i]
+            frames.append(pd.DataFrame({
+                "fips_code": np.full(b - a, self.fips[i], dtype=np.int32),
+                "county": self.counties[i],
+                "state": self.states[i],
+                "sum": np.asarray(self.values[a:b]),
+                "run_start_time": np.asarray(self.times[a:b]),
+            }))
+        if not frames:
+            return pd.DataFrame(columns=["fips_code", "county", "state", "sum", "run_start_time"])
+        return pd.concat(frames, ignore_index=True)
+
+
+def _source_stamp(csv_path: Path) -> dict:
+    st = Path(csv_path).stat()
+    return {"path": str(csv_path), "mtime": st.st_mtime, "size": st.st_size}
+
+
+def _cache_is_current(csv_path: Path, cache_dir: Path) -> bool:
+    path = cache_dir / "index.json"
+    if not path.exists():
+        return False
+    with open(path, encoding="utf-8") as f:
+        index = json.load(f)
+    src = _source_stamp(csv_path)
+    return (
+        index.get("version") == CACHE_VERSION
+        and index["source"]["mtime"] == src["mtime"]
+        and index["source"]["size"] == src["size"]
+        and (cache_dir / "times.npy").exists()
+        and (cache_dir / "values.npy").exists()
+    )
+
+
+def build_outage_cache(
+    csv_path: Path = OUTAGE_CSV,
+    cache_dir: Path = OUTAGE_CACHE_DIR,
+    chunksize: int = 2_000_000,
+    rebuild: bool = False,
+    verbose: bool = True,
+) -> OutageCache:
+    """Read the EAGLE-I CSV in chunks into the binary cache (once) and memory-map it.
+
+    Timestamps are parsed a single time per chunk; only fips (int32), time
+    (int64) and sum (float32) stay in memory, plus one county/state name per fips.
+    """
+    csv_path, cache_dir = Path(csv_path), Path(cache_dir)
+    if not rebuild and _cache_is_current(csv_path, cache_dir):
+        return OutageCache(cache_dir)
+
+    fips_parts, time_parts, value_parts = [], [], []
+    names = {}
+    for chunk in pd.read_csv(
+        csv_path,
+        usecols=["fips_code", "county", "state", "sum", "run_start_time"],
+        dtype={"county": "category", "state": "category"},
+        chunksize=chunksize,
+    ):
+        fips = pd.to_numeric(chunk["fips_code"], errors="coerce")
+        t = pd.to_datetime(chunk["run_start_time"], errors="coerce")
+        v = pd.to_numeric(chunk["sum"], errors="coerce")
+        ok = (fips.notna() & t.notna()).to_numpy()
+
+        fips = fips.to_numpy()[ok].astype(np.int32)
+        fips_parts.append(fips)
+        time_parts.append(t.to_numpy()[ok].astype("datetime64[ns]").view(np.int64))
+        value_parts.append(v.to_numpy()[ok].astype(np.float32))
+
+        firsts = chunk.loc[ok, ["county", "state"]].assign(_f=fips).drop_duplicates("_f")
+        for f, county, state in firsts[["_f", "county", "state"]].itertuples(index=False):
+            names.setdefault(int(f), (str(county), str(state)))
+
+        if verbose:
+            print(f"[eaglei_ingest] {sum(len(p) for p in fips_parts):,} rows")
+
+    fips = np.concatenate(fips_parts) if fips_parts else np.empty(0, np.int32)
+    times = np.concatenate(time_parts) if time_parts else np.empty(0, np.int64)
+    values = np.concatenate(value_parts) if value_parts else np.empty(0, np.float32)
+    del fips_parts, time_parts, value_parts
+
+    order = np.lexsort((times, fips))
+    fips, times, values = fips[order], times[order], values[order]
+    del order
+
+    uniq, starts = np.unique(fips, return_index=True)
+    stops = np.append(starts[1:], len(fips))
+    missing = np.add.reduceat(np.isnan(values).astype(np.int64), starts) if len(starts) else np.empty(0, np.int64)
+
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    np.save(cache_dir / "times.npy", times.view("datetime64[ns]"))
+    np.save(cache_dir / "values.npy", values)
+    index = {
+        "version": CACHE_VERSION,
+        "source": _source_stamp(csv_path),
+        "rows": int(len(fips)),
+        "counties": [
+            {
+                "fips": int(f),
+                "start": int(a),
+                "stop": int(b),
+                "county": names[int(f)][0],
+                "state": names[int(f)][1],
+                "missing": int(m),
+            }
+            for f, a, b, m in zip(uniq, starts, stops, missing)
+        ],
+    }
+    # index last: a half-written cache is never considered current
+    tmp = cache_dir / "index.json.tmp"
+    with open(tmp, "w", encoding="utf-8") as fh:
+        json.dump(index, fh, indent=1)
+    os.replace(tmp, cache_dir / "index.json")
+
+    cache = OutageCache(cache_dir)
+    if verbose and cache.missing.any():
+        print(f"[eaglei_ingest] {int(cache.missing.sum()):,} rows without a sum kept as NaN, "
+              f"in {len(cache.missing_counties())} counties")
+    return cache
@@ -0,0 +1,322 @@
+import json
+import os
+import re
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from stage_metrics import count_rows
+
+
+BASE_DIR = Path().resolve()
+
+ERA5_DIR = (
+    BASE_DIR
+    / "data" / "raw" / "storm_intensity"
+    / "era5_NE_coastal_county_hourly"
+)
+
+STORE_DIR = (
+    BASE_DIR
+    / "data" / "interim" / "era5_store"
+)
+
+ERA_VARS = ["tp", "i10fg", "crr"]
+STORE_VERSION = 1
+CELLS_PER_ROW_GROUP = 64
+
+YEAR_RE = re.compile(r"data\s*(\d{4}).*\.csv$", re.IGNORECASE)
+
+# Layout of the store:
+#   store_dir/manifest.json            source file -> (mtime, size, rows, hour range)
+#   store_dir/grid.parquet             grid_id (int32) -> latitude, longitude
+#   store_dir/year=YYYY/part.parquet   grid_id int32, hour int64, tp/i10fg/crr float32
+# Each year partition is sorted by (grid_id, hour) and written in row groups of
+# CELLS_PER_ROW_GROUP cells, so grid_id / hour filters prune whole row groups.
+
+
+def find_year_files(era5_dir: Path = ERA5_DIR) -> dict:
+    out = {}
+    for p in sorted(Path(era5_dir).glob("data*.csv")):
+        m = YEAR_RE.search(p.name)
+        if m:
+            out[int(m.group(1))] = p
+    return out
+
+
+def _grid_key(lat, lon):
+    # ERA5 cells sit on a 0.25 deg lattice; rounding makes CSV floats join exactly
+    return np.round(np.asarray(lat, dtype=float) * 4).astype(np.int64) * 100_000 + \
+        np.round(np.asarray(lon, dtype=float) * 4).astype(np.int64)
+
+
+_MONTH_LEN = np.array([0, 31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31], dtype=np.int32)
+
+
+def _days_from_civil(y, m, d):
+    # proleptic Gregorian date -> days since 1970-01-01 (H. Hinnant's algorithm)
+    y = y - (m <= 2)
+    era = np.floor_divide(y, 400)
+    yoe = y - era * 400
+    doy = (153 * (m + np.where(m > 2, -3, 9)) + 2) // 5 + d - 1
+    doe = yoe * 365 + yoe // 4 - yoe // 100 + doy
+    return era * 146097 + doe - 719468
+
+
+def parse_hours(values):
+    """Floor "YYYY-MM-DD HH:MM:SS" timestamps to int64 hours since the epoch.
+
+    The ERA5 exports use this fixed layout, so the digits are read straight
+    from a byte view. Anything that does not match goes through pd.to_datetime.
+    Returns (hours, ok); hours is undefined where ok is False.
+    """
+    values = np.asarray(values)
+    n = len(values)
+    hours = np.zeros(n, dtype=np.int64)
+    ok = np.zeros(n, dtype=bool)
+    if n == 0:
+        return hours, ok
+
+    try:
+        b = values.astype("S20").view(np.uint8).reshape(n, 20)
+    except (UnicodeEncodeError, ValueError):
+        b = None
+    if b is not None:
+        # digits wrap to >= 10 after subtracting "0" in uint8 unless in 0-9
+        dig = b[:, [0, 1, 2, 3, 5, 6, 8, 9, 11, 12]] - np.uint8(48)
+        fixed = (
+            (b[:, 19] == 0) & (b[:, 4] == 45) & (b[:, 7] == 45)
+            & ((b[:, 10] == 32) | (b[:, 10] == 84)) & (b[:, 13] == 58) & (b[:, 16] == 58)
+            & (dig < 10).all(axis=1)
+        )
+        dig = dig.astype(np.int32)
+        y = dig[:, 0] * 1000 + dig[:, 1] * 100 + dig[:, 2] * 10 + dig[:, 3]
+        m = dig[:, 4] * 10 + dig[:, 5]
+        d = dig[:, 6] * 10 + dig[:, 7]
+        h = dig[:, 8] * 10 + dig[:, 9]
+        # minutes / seconds only need to be digits: hours are floored
+        mm_ss = b[:, [14, 15, 17, 18]] - np.uint8(48)
+        leap = (y % 4 == 0) & ((y % 100 != 0) | (y % 400 == 0))
+        month_len = _MONTH_LEN[np.clip(m, 0, 12)] + ((m == 2) & leap)
+        fixed &= (mm_ss < 10).all(axis=1) & (m >= 1) & (m <= 12) & (d >= 1) & (d <= month_len) & (h <= 23)
+        hours[fixed] = _days_from_civil(y[fixed], m[fixed], d[fixed]).astype(np.int64) * 24 + h[fixed]
+        ok |= fixed
+
+    rest = np.flatnonzero(~ok)
+    if len(rest):
+        # format="mixed" infers the layout per element, so one odd row does not
+        # fix the format for the others; utc=True lets offsets differ by row
+        t = pd.to_datetime(pd.Series(values[rest], dtype=object), errors="coerce", format="mixed", utc=True)
+        good = t.notna().to_numpy()
+        ns = t.dt.tz_localize(None).to_numpy(dtype="datetime64[ns]").view(np.int64)
+        hours[rest[good]] = ns[good] // 3_600_000_000_000
+        ok[rest[good]] = True
+    return hours, ok
+
+
+def _read_manifest(store_dir: Path) -> dict:
+    path = store_dir / "manifest.json"
+    if not path.exists():
+        return {"version": STORE_VERSION, "files": {}}
+    with open(path, encoding="utf-8") as f:
+        manifest = json.load(f)
+    if manifest.get("version") != STORE_VERSION:
+        return {"version": STORE_VERSION, "files": {}}
+    return manifest
+
+
+def _write_manifest(store_dir: Path, manifest: dict) -> None:
+    tmp = store_dir / "manifest.json.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp, store_dir / "manifest.json")
+
+
+def load_grid(store_dir: Path = STORE_DIR) -> pd.DataFrame:
+    path = Path(store_dir) / "grid.parquet"
+    if not path.exists():
+        return pd.DataFrame({
+            "grid_id": pd.Series(dtype="int32"),
+            "latitude": pd.Series(dtype=float),
+            "longitude": pd.Series(dtype=float),
+        })
+    return pd.read_parquet(path)
+
+
+def _assign_grid_ids(lat, lon, grid: pd.DataFrame):
+    """Map lat/lon to grid_id, appending unseen cells to grid. Returns (ids, grid)."""
+    lat = np.asarray(lat, dtype=float)
+    lon = np.asarray(lon, dtype=float)
+    keys = _grid_key(lat, lon)
+    uniq, first = np.unique(keys, return_index=True)
+    new = ~np.isin(uniq, _grid_key(grid["latitude"], grid["longitude"]))
+    if new.any():
+        start = int(grid["grid_id"].max()) + 1 if len(grid) else 0
+        grid = pd.concat([grid, pd.DataFrame({
+            "grid_id": np.arange(start, start + int(new.sum()), dtype=np.int32),
+            "latitude": lat[first[new]],
+            "longitude": lon[first[new]],
+        })], ignore_index=True)
+
+    known = _grid_key(grid["latitude"], grid["longitude"])
+    order = np.argsort(known)
+    pos = np.searchsorted(known[order], keys)
+    ids = grid["grid_id"].to_numpy(dtype=np.int32)[order][pos]
+    return ids, grid
+
+
+def _ingest_year(csv_path: Path, grid: pd.DataFrame, chunksize: int):
+    parts = []
+    for chunk in pd.read_csv(
+        csv_path,
+        usecols=["valid_time", "latitude", "longitude"] + ERA_VARS,
+        chunksize=chunksize,
+    ):
+        ids, grid = _assign_grid_ids(chunk["latitude"].to_numpy(), chunk["longitude"].to_numpy(), grid)
+        hours = (
+            pd.to_datetime(chunk["valid_time"]).to_numpy()
+            .astype("datetime64[h]").astype(np.int64)
+        )
+        part = {"grid_id": ids, "hour": hours}
+        for c in ERA_VARS:
+            part[c] = pd.to_numeric(chunk[c], errors="coerce").to_numpy(dtype=np.float32)
+        parts.append(part)
+
+    cols = {k: np.concatenate([p[k] for p in parts]) for k in parts[0]} if parts else \
+        {"grid_id": np.empty(0, np.int32), "hour": np.empty(0, np.int64),
+         **{c: np.empty(0, np.float32) for c in ERA_VARS}}
+    order = np.lexsort((cols["hour"], cols["grid_id"]))
+    cols = {k: v[order] for k, v in cols.items()}
+    return cols, grid
+
+
+def _write_partition(path: Path, cols: dict) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    table = pa.table({
+        "grid_id": pa.array(cols["grid_id"], pa.int32()),
+        "hour": pa.array(cols["hour"], pa.int64()),
+        **{c: pa.array(cols[c], pa.float32()) for c in ERA_VARS},
+    })
+    gid = cols["grid_id"]
+    # cut row groups on grid_id boundaries so each group holds whole cells
+    cuts = np.searchsorted(gid, np.arange(0, int(gid.max()) + 1 if len(gid) else 0, CELLS_PER_ROW_GROUP)[1:])
+    bounds = np.concatenate([[0], cuts, [len(gid)]]).astype(int)
+
+    tmp = path.with_suffix(".parquet.tmp")
+    with pq.ParquetWriter(tmp, table.schema, compression="zstd") as writer:
+        for a, b in zip(bounds[:-1], bounds[1:]):
+            if b > a:
+                writer.write_table(table.slice(a, b - a))
+    os.replace(tmp, path)
+
+
+def ingest_era5_store(
+    era5_dir: Path = ERA5_DIR,
+    store_dir: Path = STORE_DIR,
+    chunksize: int = 2_000_000,
+    verbose: bool = True,
+) -> dict:
+    """Convert the yearly ERA5 CSVs into the columnar store.
+
+    Only year files that are new or whose mtime/size changed are re-ingested.
+    Returns the manifest.
+    """
+    store_dir = Path(store_dir)
+    store_dir.mkdir(parents=True, exist_ok=True)
+    manifest = _read_manifest(store_dir)
+    grid = load_grid(store_dir)
+
+    for year, csv_path in find_year_files(era5_dir).items():
+        st = csv_path.stat()
+        part_path = store_dir / f"year={year}" / "part.parquet"
+        entry = manifest["files"].get(csv_path.name)
+        if (
+            entry is not None
+            and entry["mtime"] == st.st_mtime
+            and entry["size"] == st.st_size
+            and part_path.exists()
+        ):
+            continue
+
+        if verbose:
+            print(f"[era5_store] ingest {csv_path.name}")
+        cols, grid = _ingest_year(csv_path, grid, chunksize)
+        # grid first: a partition must never reference an id missing from grid.parquet
+        grid.to_parquet(store_dir / "grid.parquet", index=False)
+        _write_partition(part_path, cols)
+
+        manifest["files"][csv_path.name] = {
+            "year": year,
+            "mtime": st.st_mtime,
+            "size": st.st_size,
+            "rows": int(len(cols["hour"])),
+            "hour_min": int(cols["hour"].min()) if len(cols["hour"]) else None,
+            "hour_max": int(cols["hour"].max()) if len(cols["hour"]) else None,
+        }
+        _write_manifest(store_dir, manifest)
+
+    return manifest
+
+
+def store_years(store_dir: Path = STORE_DIR) -> list:
+    manifest = _read_manifest(Path(store_dir))
+    return sorted(int(e["year"]) for e in manifest["files"].values())
+
+
+def read_era5_store(
+    store_dir: Path = STORE_DIR,
+    years=None,
+    grid_ids=None,
+    hour_range=None,
+    columns=None,
+) -> pd.DataFrame:
+    """Read (grid_id, hour, vars) rows, touching only the row groups that can match.
+
+    hour_range is an inclusive (first, last) pair of hours since the epoch.
+    """
+    store_dir = Path(store_dir)
+    if years is None:
+        years = store_years(store_dir)
+    columns = ["grid_id", "hour"] + list(ERA_VARS if columns is None else columns)
+
+    filters = []
+    if grid_ids is not None:
+        grid_ids = np.unique(np.asarray(grid_ids, dtype=np.int64))
+        if len(grid_ids) == 0:
+            years = []
+        else:
+            filters += [
+                ("grid_id", ">=", int(grid_ids[0])),
+                ("grid_id", "<=", int(grid_ids[-1])),
+                ("grid_id", "in", grid_ids.tolist()),
+            ]
+    if hour_range is not None:
+        filters += [("hour", ">=", int(hour_range[0])), ("hour", "<=", int(hour_range[1]))]
+
+    tables = []
+    for y in years:
+        path = store_dir / f"year={int(y)}" / "part.parquet"
+        if not path.exists():
+            continue
+        table = pq.read_table(path, columns=columns, filters=filters or None)
+        count_rows(f"era5_store/year={int(y)}", table.num_rows)
+        tables.append(table)
+
+    if not tables:
+        return pd.DataFrame({
+            "grid_id": pd.Series(dtype="int32"),
+            "hour": pd.Series(dtype="int64"),
+            **{c: pd.Series(dtype="float32") for c in columns[2:]},
+        })
+    return pa.concat_tables(tables).to_pandas()
+
+
+def hours_to_datetime(hours) -> np.ndarray:
+    return np.asarray(hours, dtype=np.int64).astype("datetime64[h]").astype("datetime64[ns]")
+
+
+if __name__ == "__main__":
+    ingest_era5_store()
@@ -1,9 +1,16 @@
+import json
 import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from pathlib import Path
 from datetime import timedelta
+import numpy as np
 import pandas as pd
 import geopandas as gpd
 
+from era5_store import load_grid, read_era5_store, store_years, hours_to_datetime
+from stage_metrics import count_rows
+from storm_schema import FIPS_KEY, storm_fips_key, to_fips_key
+
 
 from pathlib import Path
 BASE_DIR = Path().resolve()
@@ -26,6 +33,14 @@ ERA5_DIR = (
     / "era5_NE_coastal_county_hourly"
 )
 
+GRID_LOOKUP_NPZ = (
+    BASE_DIR
+    / "data" / "interim"
+    / "era5_grid_lookup.npz"
+)
+
+LOOKUP_VERSION = 1
+
 
 def build_grid_to_fips_mapping(
     counties_shp: str = COUNTIES_SHP,
@@ -75,110 +90,360 @@ def build_grid_to_fips_mapping(
 
     return grid_to_fips
 
-def era5_file_to_county_hourly_max_df(
-    csv_path: Path,
-    grid_map: pd.DataFrame,
-) -> pd.DataFrame:
-    df = pd.read_csv(
-        csv_path,
-        usecols=["valid_time", "latitude", "longitude", "tp", "i10fg", "crr"],
-    )
-    df = df.merge(
-        grid_map[["latitude", "longitude", "full_fips"]],
-        on=["latitude", "longitude"],
-        how="inner",
-    )
-    df["valid_time"] = pd.to_datetime(df["valid_time"])
-    df["full_fips"] = df["full_fips"].astype(str).str.zfill(5)
 
+class GridLookup:
+    """Dense county index over the 0.25 deg ERA5 lattice.
+
+    table[i, j] is the position in `fips` (sorted) of the county containing the
+    cell at quarter-degree (lat_q0 + i, lon_q0 + j), or -1 outside every county.
+    """
+
+    def __init__(self, fips: np.ndarray, table: np.ndarray, lat_q0: int, lon_q0: int):
+        self.fips = np.asarray(fips, dtype=object)
+        self.table = table
+        self.lat_q0 = int(lat_q0)
+        self.lon_q0 = int(lon_q0)
+
+    @classmethod
+    def from_grid_map(cls, grid_map: pd.DataFrame) -> "GridLookup":
+        fips_str = grid_map["full_fips"].astype(str).str.zfill(5).to_numpy()
+        fips, c_idx = np.unique(fips_str, return_inverse=True)
+        lat_q = np.round(grid_map["latitude"].to_numpy(dtype=float) * 4).astype(np.int64)
+        lon_q = np.round(grid_map["longitude"].to_numpy(dtype=float) * 4).astype(np.int64)
+        if len(lat_q) == 0:
+            return cls(fips, np.full((0, 0), -1, dtype=np.int16), 0, 0)
+        lat_q0, lon_q0 = lat_q.min(), lon_q.min()
+        table = np.full((lat_q.max() - lat_q0 + 1, lon_q.max() - lon_q0 + 1), -1, dtype=np.int16)
+        # a cell inside two polygons (overlapping shapes) keeps the lowest fips
+        order = np.argsort(c_idx, kind="stable")[::-1]
+        table[lat_q[order] - lat_q0, lon_q[order] - lon_q0] = c_idx[order]
+        return cls(fips, table, lat_q0, lon_q0)
+
+    def county_index(self, lat, lon) -> np.ndarray:
+        """Position in self.fips for every (lat, lon), -1 when outside the mapped counties."""
+        i = np.round(np.asarray(lat, dtype=float) * 4).astype(np.int64) - self.lat_q0
+        j = np.round(np.asarray(lon, dtype=float) * 4).astype(np.int64) - self.lon_q0
+        n_i, n_j = self.table.shape
+        inside = (i >= 0) & (i < n_i) & (j >= 0) & (j < n_j)
+        out = np.full(len(i), -1, dtype=np.int64)
+        out[inside] = self.table[i[inside], j[inside]]
+        return out
+
+    def save(self, path: Path, meta: dict) -> None:
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(path.name + ".tmp")
+        with open(tmp, "wb") as f:
+            np.savez(
+                f,
+                table=self.table,
+                fips=self.fips.astype("U5"),
+                origin=np.array([self.lat_q0, self.lon_q0], dtype=np.int64),
+                meta=np.array(json.dumps({"version": LOOKUP_VERSION, **meta})),
+            )
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: Path) -> "GridLookup":
+        with np.load(path, allow_pickle=False) as z:
+            return cls(z["fips"], z["table"], *z["origin"])
+
+
+def _shapefile_stamp(counties_shp) -> dict:
+    # geometry (.shp) and attributes (.dbf) both feed the mapping
+    stamp = {}
+    for ext in (".shp", ".dbf"):
+        p = Path(counties_shp).with_suffix(ext)
+        if p.exists():
+            st = p.stat()
+            stamp[ext] = {"mtime": st.st_mtime, "size": st.st_size}
+    return stamp
+
+
+def _grid_source_stamp(era5_dir) -> dict:
+    # build_grid_to_fips_mapping takes the cell lattice from the first year file
+    sample_files = sorted(Path(era5_dir).glob("data *.csv"))
+    if not sample_files:
+        return {}
+    st = sample_files[0].stat()
+    return {"name": sample_files[0].name, "mtime": st.st_mtime, "size": st.st_size}
+
+
+def build_grid_lookup(
+    counties_shp: str = COUNTIES_SHP,
+    cache_path: Path = GRID_LOOKUP_NPZ,
+    era5_dir: Path = ERA5_DIR,
+    rebuild: bool = False,
+) -> GridLookup:
+    """Compiled ERA5 cell -> county lookup, rebuilt when the counties shapefile or the
+    ERA5 file its cell lattice is read from changes."""
+    cache_path = Path(cache_path)
+    stamp = {"shapefile": _shapefile_stamp(counties_shp), "grid_source": _grid_source_stamp(era5_dir)}
+    if not rebuild and cache_path.exists():
+        with np.load(cache_path, allow_pickle=False) as z:
+            meta = json.loads(str(z["meta"]))
+        if meta.get("version") == LOOKUP_VERSION and all(meta.get(k) == v for k, v in stamp.items()):
+            return GridLookup.load(cache_path)
+
+    grid_map = build_grid_to_fips_mapping(counties_shp, era5_dir=era5_dir, cache_to_disk=False)
+    lookup = GridLookup.from_grid_map(grid_map)
+    lookup.save(cache_path, stamp)
+    return lookup
+
+
+def _as_lookup(grid_map) -> GridLookup:
+    return grid_map if isinstance(grid_map, GridLookup) else GridLookup.from_grid_map(grid_map)
+
+
+def _county_hourly_max(df: pd.DataFrame, by: str = "full_fips") -> pd.DataFrame:
     # county × hour 只保留 max
-    df_group = (
-        df.groupby(["full_fips", "valid_time"], as_index=False)
+    return (
+        df.groupby([by, "valid_time"], as_index=False)
           .agg(
               i10fg_max=("i10fg", "max"),
               tp_max=("tp", "max"),
               crr_max=("crr", "max"),
           )
     )
-    return df_group
-
-def build_storm_weather_features_max_total_48h_stream(
-    df_storm: pd.DataFrame,
-    grid_map: pd.DataFrame,
-    era5_dir: Path = ERA5_DIR,
-) -> pd.DataFrame:
-
-    df_storm = df_storm.copy()
-    need_cols = {"BEGIN_DATE_TIME", "STATE_FIPS", "CZ_FIPS", "EVENT_ID", "EPISODE_ID_LOC"}
 
-    df_storm["BEGIN_DATE_TIME"] = pd.to_datetime(df_storm["BEGIN_DATE_TIME"], errors="coerce")
-
-    df_storm["STATE_FIPS"] = df_storm["STATE_FIPS"].astype(float).astype(int).astype(str).str.zfill(2)
-    df_storm["CZ_FIPS"]    = df_storm["CZ_FIPS"].astype(float).astype(int).astype(str).str.zfill(3)
-    df_storm["full_fips"]  = (df_storm["STATE_FIPS"] + df_storm["CZ_FIPS"]).astype(str).str.zfill(5)
 
-    df_storm["t0"] = df_storm["BEGIN_DATE_TIME"] - timedelta(hours=24)
-    df_storm["t1"] = df_storm["BEGIN_DATE_TIME"] + timedelta(hours=24)
+def era5_file_to_county_hourly_max_df(
+    csv_path: Path,
+    grid_map,
+    chunksize: int = None,
+) -> pd.DataFrame:
+    # grid_map: GridLookup (or a grid_to_fips frame, compiled on the fly);
+    #   rows get their county from the lookup table, no float join
+    # chunksize bounds peak memory: each chunk is reduced to county × hour maxima
+    # before the next one is read
+    lookup = _as_lookup(grid_map)
+    usecols = ["valid_time", "latitude", "longitude", "tp", "i10fg", "crr"]
+    chunks = [pd.read_csv(csv_path, usecols=usecols)] if chunksize is None else \
+        pd.read_csv(csv_path, usecols=usecols, chunksize=chunksize)
+
+    parts = []
+    for df in chunks:
+        count_rows(csv_path, len(df))
+        c_idx = lookup.county_index(df["latitude"].to_numpy(), df["longitude"].to_numpy())
+        df = df.loc[c_idx >= 0].assign(county_idx=c_idx[c_idx >= 0])
+        df["valid_time"] = pd.to_datetime(df["valid_time"])
+        parts.append(_county_hourly_max(df, by="county_idx"))
+
+    if len(parts) == 1:
+        df = parts[0]
+    else:
+        df = _county_hourly_max(pd.concat(parts, ignore_index=True).rename(
+            columns={"i10fg_max": "i10fg", "tp_max": "tp", "crr_max": "crr"}
+        ), by="county_idx")
+    # lookup.fips is sorted, so county_idx order is full_fips order
+    df.insert(0, "full_fips", lookup.fips[df.pop("county_idx").to_numpy()])
+    return df
+
+
+def _grid_ids_to_fips(store_dir: Path, grid_map) -> pd.DataFrame:
+    lookup = _as_lookup(grid_map)
+    grid = load_grid(store_dir)
+    c_idx = lookup.county_index(grid["latitude"].to_numpy(), grid["longitude"].to_numpy())
+    return pd.DataFrame({
+        "grid_id": grid["grid_id"].to_numpy()[c_idx >= 0],
+        "full_fips": lookup.fips[c_idx[c_idx >= 0]],
+    })
 
-    df_storm = df_storm.reset_index(drop=True)
-    df_storm["storm_idx"] = df_storm.index.astype(int)
 
-    feat = pd.DataFrame({
-        "storm_idx": df_storm["storm_idx"],
-        "era_i10fg_max_total_48h": pd.NA,
-        "era_tp_max_total_48h": pd.NA,
-        "era_crr_max_total_48h": pd.NA,
-    })
+def era5_store_to_county_hourly_max_df(
+    store_dir: Path,
+    year: int,
+    grid_map: pd.DataFrame,
+    hour_range=None,
+    fips=None,
+) -> pd.DataFrame:
+    """Same output as era5_file_to_county_hourly_max_df, read from the columnar store.
+
+    fips: county keys to read (default: every county of grid_map); only their
+    cells' row groups are loaded.
+    """
+    gid_fips = _grid_ids_to_fips(store_dir, grid_map)
+    if fips is not None:
+        gid_fips = gid_fips[np.isin(to_fips_key(gid_fips["full_fips"]), fips)]
+    df = read_era5_store(
+        store_dir,
+        years=[year],
+        grid_ids=gid_fips["grid_id"].to_numpy(),
+        hour_range=hour_range,
+    )
+    df = df.merge(gid_fips, on="grid_id", how="inner")
+    df["valid_time"] = hours_to_datetime(df["hour"].to_numpy())
+    return _county_hourly_max(df)
 
-    current_i10fg = [None] * len(df_storm)
-    current_tp    = [None] * len(df_storm)
-    current_crr   = [None] * len(df_storm)
 
-    all_files = sorted(era5_dir.glob("data *.csv"))
+def _load_county_hourly(source: tuple, grid_map: pd.DataFrame, chunksize: int = None) -> pd.DataFrame:
+    kind, *args = source
+    if kind == "store":
+        store_dir, year, hour_range, fips = args
+        return era5_store_to_county_hourly_max_df(store_dir, year, grid_map, hour_range, fips)
+    (csv_path,) = args
+    return era5_file_to_county_hourly_max_df(csv_path, grid_map, chunksize=chunksize)
 
-    for csv_path in all_files:
 
-        df_ch = era5_file_to_county_hourly_max_df(csv_path, grid_map)
+HOUR_NS = 3_600_000_000_000
 
 
-        t_min = df_ch["valid_time"].min()
-        t_max = df_ch["valid_time"].max()
+def _sliding_max(cube: np.ndarray, width: int) -> np.ndarray:
+    # NaN-skipping max over hours [h, h + width) along the last axis, by
+    # doubling; only the current level is kept, so peak memory stays at about
+    # two cubes whatever the width
+    level, w = cube, 1
+    while 2 * w <= width:
+        level = np.fmax(level[..., :-w], level[..., w:])
+        w *= 2
+    if w == width:
+        return level
+    return np.fmax(level[..., : level.shape[-1] - (width - w)], level[..., width - w:])
 
-        mask = (df_storm["t1"] >= t_min) & (df_storm["t0"] <= t_max)
-        sub = df_storm.loc[mask, ["storm_idx", "full_fips", "t0", "t1"]]
 
-        if sub.empty:
-            continue
+def _file_partial_maxima(
+    source: tuple,
+    grid_map: pd.DataFrame,
+    storms: pd.DataFrame,
+    chunksize: int = None,
+):
+    """Per-storm window maxima from a single ERA5 year.
+
+    County-hour maxima are laid out as a dense float32 (var, fips, hour) cube,
+    NaN-padded by one window on each side, and every storm window is one
+    gather from the sliding max of its length (49 or 48 hours for the +-24 h
+    windows), so the cost scales with the grid rather than with the number of
+    storms.
+
+    Returns (storm_idx, i10fg, tp, crr) arrays for the storms whose window
+    overlaps this file's hours in a county present in the file.
+    """
+    empty = (np.empty(0, dtype=np.int64),) + tuple(np.empty(0, dtype=np.float32) for _ in range(3))
+
+    df_ch = _load_county_hourly(source, grid_map, chunksize)
+    if df_ch.empty:
+        return empty
+
+    # zero-padded strings sort like their integer codes
+    fips_str, f_idx = np.unique(df_ch["full_fips"].to_numpy(dtype=str), return_inverse=True)
+    fips_codes = to_fips_key(fips_str)
+    hours = df_ch["valid_time"].to_numpy().astype("datetime64[h]").astype(np.int64)
+    h0 = hours.min()
+    n_hours = int(hours.max() - h0 + 1)
+
+    storm_fips = storms[FIPS_KEY].to_numpy(dtype=np.int32)
+    pos = np.searchsorted(fips_codes, storm_fips)
+    pos_c = np.minimum(pos, len(fips_codes) - 1)
+    known = fips_codes[pos_c] == storm_fips
+
+    # valid_time in [t0, t1]  <=>  hour in [ceil(t0), floor(t1)]
+    t0 = storms["t0"].to_numpy().astype("datetime64[ns]").astype(np.int64)
+    t1 = storms["t1"].to_numpy().astype("datetime64[ns]").astype(np.int64)
+    valid = storms["t0"].notna().to_numpy() & storms["t1"].notna().to_numpy()
+    lo = -(-t0 // HOUR_NS) - h0
+    hi = t1 // HOUR_NS - h0 + 1
+
+    hit = known & valid & (np.minimum(hi, n_hours) > np.maximum(lo, 0))
+    if not hit.any():
+        return empty
+
+    f, lo, length = pos_c[hit], lo[hit], (hi - lo)[hit]
+    # windows running past the file's first / last hour land in the NaN pad
+    # instead of being clipped, so every window keeps its full length
+    pad = int(length.max()) - 1
+    cube = np.full((3, len(fips_codes), n_hours + 2 * pad), np.nan, dtype=np.float32)
+    for v, col in enumerate(["i10fg_max", "tp_max", "crr_max"]):
+        cube[v, f_idx, hours - h0 + pad] = df_ch[col].to_numpy(dtype=np.float32)
+    del df_ch
+
+    out = np.empty((3, len(f)), dtype=np.float32)
+    for width in np.unique(length):
+        sel = length == width
+        out[:, sel] = _sliding_max(cube, int(width))[:, f[sel], lo[sel] + pad]
+
+    idx = storms["storm_idx"].to_numpy(dtype=np.int64)[hit]
+    return idx, out[0], out[1], out[2]
 
-        by_fips = {k: g for k, g in df_ch.groupby("full_fips", sort=False)}
 
-        for r in sub.itertuples(index=False):
-            w = by_fips.get(r.full_fips)
-            if w is None:
-                continue
+def build_storm_weather_features_max_total_48h_stream(
+    df_storm: pd.DataFrame,
+    grid_map,
+    era5_dir: Path = ERA5_DIR,
+    store_dir: Path = None,
+    n_workers: int = 1,
+    chunksize: int = None,
+) -> pd.DataFrame:
+    # store_dir: read the columnar store built by era5_store.ingest_era5_store
+    #   instead of re-parsing the yearly CSVs in era5_dir
+    # n_workers: >1 fans the year files out to a process pool (None = all cores);
+    #   each worker returns per-storm partial maxima, merged here with np.fmax
+    # chunksize: CSV rows per read inside a worker, bounds memory per process
+    # grid_map: GridLookup from build_grid_lookup, or a grid_to_fips frame
+
+    grid_map = _as_lookup(grid_map)
+    df_storm = df_storm.copy()
+    need_cols = {"BEGIN_DATE_TIME", "STATE_FIPS", "CZ_FIPS", "EVENT_ID", "EPISODE_ID_LOC"}
 
-            ww = w[(w["valid_time"] >= r.t0) & (w["valid_time"] <= r.t1)]
-            if ww.empty:
-                continue
+    df_storm["BEGIN_DATE_TIME"] = pd.to_datetime(df_storm["BEGIN_DATE_TIME"], errors="coerce")
 
-            i10 = float(ww["i10fg_max"].max())
-            tp  = float(ww["tp_max"].max())
-            crr = float(ww["crr_max"].max())
+    df_storm["t0"] = df_storm["BEGIN_DATE_TIME"] - timedelta(hours=24)
+    df_storm["t1"] = df_storm["BEGIN_DATE_TIME"] + timedelta(hours=24)
 
-            idx = int(r.storm_idx)
+    df_storm = df_storm.reset_index(drop=True)
+    df_storm["storm_idx"] = df_storm.index.astype(int)
 
-            if current_i10fg[idx] is None or i10 > current_i10fg[idx]:
-                current_i10fg[idx] = i10
-            if current_tp[idx] is None or tp > current_tp[idx]:
-                current_tp[idx] = tp
-            if current_crr[idx] is None or crr > current_crr[idx]:
-                current_crr[idx] = crr
+    n = len(df_storm)
+    current_i10fg = np.full(n, np.nan)
+    current_tp    = np.full(n, np.nan)
+    current_crr   = np.full(n, np.nan)
+
+    if store_dir is not None:
+        hour_range = (
+            int(df_storm["t0"].min().floor("h").value // 3_600_000_000_000),
+            int(df_storm["t1"].max().ceil("h").value // 3_600_000_000_000),
+        )
+        # only the storms' counties: a shard reads its own cells of the shared store
+        fips = np.unique(storm_fips_key(df_storm))
+        sources = [("store", store_dir, y, hour_range, fips) for y in store_years(store_dir)]
+    else:
+        sources = [("csv", p) for p in sorted(era5_dir.glob("data *.csv"))]
+
+    # workers match storms to the lookup's counties on the int32 fips_key;
+    # the storm columns themselves are left as they came
+    storms = pd.DataFrame({
+        "storm_idx": df_storm["storm_idx"].to_numpy(),
+        FIPS_KEY: storm_fips_key(df_storm),
+        "t0": df_storm["t0"].to_numpy(),
+        "t1": df_storm["t1"].to_numpy(),
+    })
 
-        del df_ch, by_fips
+    def merge(partial):
+        idx, i10, tp, crr = partial
+        current_i10fg[idx] = np.fmax(current_i10fg[idx], i10)
+        current_tp[idx]    = np.fmax(current_tp[idx], tp)
+        current_crr[idx]   = np.fmax(current_crr[idx], crr)
 
-    feat["era_i10fg_max_total_48h"] = current_i10fg
-    feat["era_tp_max_total_48h"]    = current_tp
-    feat["era_crr_max_total_48h"]   = current_crr
+    if n_workers == 1 or len(sources) <= 1:
+        for source in sources:
+            merge(_file_partial_maxima(source, grid_map, storms, chunksize))
+    else:
+        # one file per task and a fresh process per file, so a worker never
+        # holds more than one year's county-hour frame
+        with ProcessPoolExecutor(max_workers=n_workers, max_tasks_per_child=1) as pool:
+            futures = [
+                pool.submit(_file_partial_maxima, source, grid_map, storms, chunksize)
+                for source in sources
+            ]
+            for fut in as_completed(futures):
+                merge(fut.result())
+
+    # float32, the storm_schema dtype of the ERA columns
+    feat = pd.DataFrame({
+        "storm_idx": df_storm["storm_idx"],
+        "era_i10fg_max_total_48h": current_i10fg.astype(np.float32),
+        "era_tp_max_total_48h": current_tp.astype(np.float32),
+        "era_crr_max_total_48h": current_crr.astype(np.float32),
+    })
 
     df_final = (
         df_storm
@@ -188,9 +453,16 @@ def build_storm_weather_features_max_total_48h_stream(
     return df_final
 
 
-def run_all_stream(df_storm: pd.DataFrame) -> pd.DataFrame:
-    grid_map = build_grid_to_fips_mapping(cache_to_disk=True)  # 想完全不落盘：改 False
-    return build_storm_weather_features_max_total_48h_stream(df_storm=df_storm, grid_map=grid_map)
+def run_all_stream(df_storm: pd.DataFrame, store_dir: Path = None, n_workers: int = 1,
+                   era5_dir: Path = ERA5_DIR, grid_map=None) -> pd.DataFrame:
+    # era5_dir may hold a subset of the cells (a sharded_pipeline shard); the
+    # default lookup still comes from the full ERA5_DIR, so every shard maps
+    # cells to the same counties
+    if grid_map is None:
+        grid_map = build_grid_lookup()
+    return build_storm_weather_features_max_total_48h_stream(
+        df_storm=df_storm, grid_map=grid_map, era5_dir=Path(era5_dir), store_dir=store_dir, n_workers=n_workers,
+    )
 
 
 if __name__ == "__main__":
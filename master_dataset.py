@@ -0,0 +1,171 @@
+import shutil
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from outage_scoring import FEATURE_COLS
+from storm_schema import FIPS_KEY, apply_storm_schema, fips_strings, with_fips_strings
+
+
+BASE_DIR = Path().resolve()
+
+MASTER_PATH = BASE_DIR / "storms_data.parquet"
+MASTER_CSV = BASE_DIR / "storms_data.csv"
+
+# Layout:
+#   storms_data.parquet/YEAR=2018/STATE_FIPS=25/part-0.parquet
+# Typed columns (storm_schema dtypes, categoricals as dictionaries), rows
+# sorted by YEARMONTH and fips_key inside a partition and written in row
+# groups of ROW_GROUP_ROWS, so YEAR / STATE_FIPS filters skip whole
+# directories and YEARMONTH / fips_key filters skip row groups by their
+# statistics. row_id is the row's position in the table that was written;
+# load_master returns rows in that order, so seeded train/test splits in the
+# notebooks see the same rows as they did from the CSV.
+PARTITION_COLS = ["YEAR", "STATE_FIPS"]
+PARTITIONING = ds.partitioning(
+    pa.schema([("YEAR", pa.int16()), ("STATE_FIPS", pa.int8())]), flavor="hive",
+)
+ROW_ID = "row_id"
+ROW_GROUP_ROWS = 64_000
+
+# columns made from fips_key at load time instead of being stored
+DERIVED_COLS = ["full_fips", "fips_str"]
+
+# what the modelling notebooks read: ids, the XGBoost feature set and targets
+MODEL_COLUMNS = [
+    "EVENT_ID", FIPS_KEY, "full_fips", "BEGIN_DATE_TIME", "YEARMONTH",
+    *FEATURE_COLS,
+    "max_outage_after_24h", "baseline_outage_median", "housing_units", "outage_ratio", "duration_hours",
+]
+
+
+def _to_table(df: pd.DataFrame) -> pa.Table:
+    try:
+        return pa.Table.from_pandas(df, preserve_index=False)
+    except (pa.ArrowTypeError, pa.ArrowInvalid):
+        # object columns holding mixed values (numbers and strings from a CSV) go as strings
+        mixed = {
+            c: df[c].where(df[c].isna(), df[c].astype(str))
+            for c in df.columns if df[c].dtype == object
+        }
+        return pa.Table.from_pandas(df.assign(**mixed), preserve_index=False)
+
+
+def write_master(storms_data: pd.DataFrame, path: Path = MASTER_PATH, require=MODEL_COLUMNS) -> Path:
+    """Write storms_data as the partitioned Parquet master dataset, replacing any previous one.
+
+    The columns in `require` (default: the ones the modelling notebooks load)
+    must be present; otherwise nothing is written and the old dataset is kept.
+    """
+    path = Path(path)
+    df = apply_storm_schema(storms_data)
+    missing = [c for c in require if c not in df.columns and c not in DERIVED_COLS]
+    if missing:
+        raise KeyError(f"storms_data lacks master dataset columns: {missing}")
+    df = df.drop(columns=[c for c in df.columns if c.startswith("Unnamed:")] +
+                 [c for c in DERIVED_COLS if c in df.columns])
+
+    # partition keys; rows without a date or county go under -1
+    year = df["YEAR"] if "YEAR" in df.columns else pd.to_datetime(df["BEGIN_DATE_TIME"], errors="coerce").dt.year
+    year = pd.to_numeric(year, errors="coerce").fillna(-1).to_numpy(dtype=np.int16)
+    state = (df[FIPS_KEY].to_numpy() // 1000).astype(np.int8)
+    df = df.assign(YEAR=year, STATE_FIPS=state, **{ROW_ID: np.arange(len(df), dtype=np.int64)})
+
+    order = [c for c in PARTITION_COLS + ["YEARMONTH", FIPS_KEY, "BEGIN_DATE_TIME", ROW_ID] if c in df.columns]
+    df = df.sort_values(order, kind="stable")
+
+    tmp = path.with_name(path.name + ".tmp")
+    if tmp.exists():
+        shutil.rmtree(tmp)
+    ds.write_dataset(
+        _to_table(df), tmp, format="parquet", partitioning=PARTITIONING,
+        max_rows_per_group=ROW_GROUP_ROWS, min_rows_per_group=min(ROW_GROUP_ROWS, 4096),
+        basename_template="part-{i}.parquet",
+    )
+    old = path.with_name(path.name + ".old")
+    if path.exists():
+        path.rename(old)
+    tmp.rename(path)
+    if old.exists():
+        shutil.rmtree(old)
+    return path
+
+
+def save_storms_data(storms_data: pd.DataFrame, out: Path = MASTER_PATH) -> Path:
+    """Write to the Parquet master dataset, or a flat CSV (with fips_str / full_fips) when out ends in .csv."""
+    out = Path(out)
+    if out.suffix.lower() != ".csv":
+        return write_master(storms_data, out)
+    with_fips_strings(storms_data).to_csv(out)
+    return out
+
+
+def convert_csv(csv_path: Path = MASTER_CSV, path: Path = MASTER_PATH) -> Path:
+    """One-off conversion of an exported storms_data.csv into the Parquet master dataset."""
+    return write_master(pd.read_csv(csv_path, low_memory=False), path)
+
+
+def open_master(path: Path = MASTER_PATH, csv_path: Path = MASTER_CSV) -> ds.Dataset:
+    path = Path(path)
+    if not path.exists():
+        if csv_path is None or not Path(csv_path).exists():
+            raise FileNotFoundError(f"no master dataset at {path}")
+        print(f"[master_dataset] converting {csv_path} -> {path}")
+        convert_csv(csv_path, path)
+    return ds.dataset(path, format="parquet", partitioning=PARTITIONING)
+
+
+def master_columns(path: Path = MASTER_PATH, csv_path: Path = MASTER_CSV) -> list:
+    names = [c for c in open_master(path, csv_path).schema.names if c != ROW_ID]
+    return names + DERIVED_COLS
+
+
+def load_master(columns=None, filters=None, path: Path = MASTER_PATH, csv_path: Path = MASTER_CSV,
+                ordered: bool = True) -> pd.DataFrame:
+    """Read the master dataset, reading only `columns` and only the partitions /
+    row groups that can match `filters`.
+
+    filters: [("YEARMONTH", ">=", 201501), ("STATE_FIPS", "in", [25, 44])], the
+    pyarrow / pandas read_parquet form, or a pyarrow.dataset expression.
+    full_fips / fips_str are rebuilt from fips_key. With ordered=True rows come
+    back in the order they were written (the CSV's order). A missing dataset is
+    converted from csv_path on first use.
+    """
+    dataset = open_master(path, csv_path)
+    want = None if columns is None else list(dict.fromkeys(columns))
+    derived = [c for c in (DERIVED_COLS if want is None else want) if c in DERIVED_COLS]
+
+    read = None
+    if want is not None:
+        read = [c for c in want if c not in DERIVED_COLS]
+        if derived and FIPS_KEY not in read:
+            read.append(FIPS_KEY)
+        if ordered:
+            read.append(ROW_ID)
+        missing = [c for c in read if c not in dataset.schema.names]
+        if missing:
+            raise KeyError(f"not in the master dataset: {missing}")
+
+    if filters is not None and not isinstance(filters, ds.Expression):
+        filters = pq.filters_to_expression(filters)
+    df = dataset.to_table(columns=read, filter=filters).to_pandas()
+
+    if ordered:
+        df = df.sort_values(ROW_ID, kind="stable", ignore_index=True)
+    for c in derived:
+        df[c] = fips_strings(df[FIPS_KEY].to_numpy())
+    if want is None:
+        return df.drop(columns=[ROW_ID])
+    return df[want]
+
+
+def read_storms_data(path: Path = MASTER_PATH, columns=None) -> pd.DataFrame:
+    """load_master for a dataset directory, pd.read_csv for a .csv file."""
+    path = Path(path)
+    if path.suffix.lower() == ".csv":
+        return pd.read_csv(path, usecols=columns, low_memory=False)
+    return load_master(columns=columns, path=path, csv_path=None)
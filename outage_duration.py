@@ -0,0 +1,224 @@
+import numpy as np
+import pandas as pd
+
+from eaglei_ingest import OutageCache
+from storm_schema import FIPS_KEY, storm_fips_key, to_fips_key
+from window_kernels import first_stable_run
+
+
+def _first_stable_off_time(times: np.ndarray,
+                           outage: np.ndarray,
+                           baseline: float,
+                           start_idx: int,
+                           stable_steps: int):
+
+    off = first_stable_run(outage <= baseline, [start_idx], [len(outage)], stable_steps)[0]
+    if off < 0:
+        return pd.NaT
+    return pd.Timestamp(times[off])
+
+
+def _storm_key(s: pd.DataFrame) -> np.ndarray:
+    try:
+        return storm_fips_key(s)
+    except KeyError:
+        # a bare CZ_FIPS already holds the 5-digit county code
+        if "CZ_FIPS" not in s.columns:
+            raise
+        return to_fips_key(s["CZ_FIPS"])
+
+
+def _outage_groups(outage_df, outage_time_col, outage_value_col, outage_fips_col) -> dict:
+    # fips_key -> (times, values), each county sorted by time
+    if isinstance(outage_df, OutageCache):
+        return {int(fips): (t, v) for fips, t, v in outage_df.items()}
+
+    o = outage_df.copy()
+    o.columns = o.columns.str.strip()
+    o[outage_time_col] = pd.to_datetime(o[outage_time_col])
+    o[FIPS_KEY] = to_fips_key(o[outage_fips_col])
+    o[outage_value_col] = pd.to_numeric(o[outage_value_col], errors="coerce")
+    o = o[(o[FIPS_KEY] >= 0) & o[outage_time_col].notna()].sort_values([FIPS_KEY, outage_time_col], kind="stable")
+    return {
+        int(k): (df[outage_time_col].to_numpy(), df[outage_value_col].to_numpy())
+        for k, df in o.groupby(FIPS_KEY, sort=False)
+    }
+
+
+def _durations_loop(s, outage_groups, storm_begin_col, storm_end_col, pre_delta, post_delta, stable_steps):
+    # reference implementation: one window filter and convolution per storm
+    t_on_list, t_off_list, dur_hours_list = [], [], []
+    for _, row in s.iterrows():
+        fips = row[FIPS_KEY]
+        O0 = row["baseline_outage_median"]
+        t0 = row[storm_begin_col]
+        t1 = row[storm_end_col]
+
+        if pd.isna(O0) or pd.isna(t0) or pd.isna(t1) or (fips not in outage_groups):
+            t_on_list.append(pd.NaT)
+            t_off_list.append(pd.NaT)
+            dur_hours_list.append(np.nan)
+            continue
+
+        t_all, v_all = outage_groups[fips]
+
+        win_start = t0 - pre_delta
+        win_end = t1 + post_delta
+        win = (t_all >= win_start) & (t_all <= win_end)
+
+        if not win.any():
+            t_on_list.append(pd.NaT)
+            t_off_list.append(pd.NaT)
+            dur_hours_list.append(np.nan)
+            continue
+
+        times = t_all[win]
+        vals = np.asarray(v_all[win], dtype=float)
+
+        # t_on
+        on = np.where(vals > float(O0))[0]
+        if len(on) == 0:
+            t_on_list.append(pd.NaT)
+            t_off_list.append(pd.NaT)
+            dur_hours_list.append(0.0)
+            continue
+
+        on_idx = int(on[0])
+        t_on = pd.Timestamp(times[on_idx])
+
+        # t_off
+        t_off = _first_stable_off_time(
+            times=times,
+            outage=vals,
+            baseline=float(O0),
+            start_idx=on_idx + 1,
+            stable_steps=stable_steps,
+        )
+
+        if pd.isna(t_off):
+            duration_hours = np.nan
+        else:
+            duration_hours = (t_off - t_on) / pd.Timedelta(hours=1)
+
+        t_on_list.append(t_on)
+        t_off_list.append(t_off)
+        dur_hours_list.append(duration_hours)
+
+    return (
+        pd.to_datetime(pd.Series(t_on_list, dtype=object)).to_numpy(dtype="datetime64[ns]"),
+        pd.to_datetime(pd.Series(t_off_list, dtype=object)).to_numpy(dtype="datetime64[ns]"),
+        np.asarray(dur_hours_list, dtype=float),
+    )
+
+
+def _durations_batched(s, outage_groups, storm_begin_col, storm_end_col, pre_delta, post_delta, stable_steps):
+    # all storms of a county at once: searchsorted window bounds, then the
+    # first above-baseline step and the first run of stable_steps at-or-below
+    # steps after it from window_kernels.first_stable_run
+    n = len(s)
+    t_on = np.full(n, np.datetime64("NaT"), dtype="datetime64[ns]")
+    t_off = np.full(n, np.datetime64("NaT"), dtype="datetime64[ns]")
+    dur = np.full(n, np.nan)
+
+    begin = s[storm_begin_col].to_numpy(dtype="datetime64[ns]")
+    end = s[storm_end_col].to_numpy(dtype="datetime64[ns]")
+    base = pd.to_numeric(s["baseline_outage_median"], errors="coerce").to_numpy(dtype=float)
+    usable = ~np.isnan(base) & ~np.isnat(begin) & ~np.isnat(end)
+
+    for (fips, O0), pos in s[usable].groupby([FIPS_KEY, "baseline_outage_median"], sort=False).indices.items():
+        if fips not in outage_groups:
+            continue
+        pos = np.flatnonzero(usable)[pos]
+        times, vals = outage_groups[fips]
+        times = np.asarray(times, dtype="datetime64[ns]")
+        vals = np.asarray(vals, dtype=float)
+
+        lo = np.searchsorted(times, begin[pos] - pre_delta.to_timedelta64(), side="left")
+        hi = np.searchsorted(times, end[pos] + post_delta.to_timedelta64(), side="right")
+        has_win = hi > lo
+
+        on_idx = first_stable_run(vals > float(O0), lo, hi, 1)
+        has_on = has_win & (on_idx >= 0)
+        dur[pos[has_win & ~has_on]] = 0.0
+
+        off_idx = first_stable_run(vals <= float(O0), on_idx + 1, np.where(has_on, hi, 0), stable_steps)
+        has_off = has_on & (off_idx >= 0)
+
+        p_on = pos[has_on]
+        t_on[p_on] = times[on_idx[has_on]]
+        p_off = pos[has_off]
+        t_off[p_off] = times[off_idx[has_off]]
+        dur[p_off] = (t_off[p_off] - t_on[p_off]) / np.timedelta64(1, "h")
+
+    return t_on, t_off, dur
+
+
+def add_outage_duration_by_baseline(
+    storms_data: pd.DataFrame,
+    outage_df: pd.DataFrame,
+    baseline_df: pd.DataFrame,
+    *,
+    # key / columns
+    storm_begin_col: str = "BEGIN_DATE_TIME",
+    storm_end_col: str = "END_DATE_TIME",
+    outage_time_col: str = "run_start_time",
+    outage_value_col: str = "sum",
+    outage_fips_col: str = "fips_code",
+    baseline_fips_col: str = "CZ_FIPS",
+    baseline_value_col: str = "baseline_outage_median",
+    # search / stability params
+    post_hours: int = 72,
+    pre_hours: int = 0,
+    stable_steps: int = 4,
+    engine: str = "batched",
+) -> pd.DataFrame:
+    """Outage onset t_on, restoration t_off and duration_hours per storm.
+
+    Within [begin - pre_hours, end + post_hours], t_on is the first step above
+    the county baseline and t_off the first step after it that starts
+    stable_steps consecutive steps at or below the baseline.
+
+    engine="batched" answers every storm of a county with searchsorted lookups;
+    engine="loop" is the original per-storm implementation. outage_df may be
+    the raw EAGLE-I frame or an eaglei_ingest.OutageCache.
+    """
+    if engine not in ("batched", "loop"):
+        raise ValueError(f"unknown engine: {engine}")
+
+    s = storms_data.copy()
+    b = baseline_df.copy()
+
+    s.columns = s.columns.str.strip()
+    b.columns = b.columns.str.strip()
+
+    s[FIPS_KEY] = _storm_key(s)
+
+    if baseline_value_col not in b.columns:
+        raise KeyError(f"baseline_df 缺少列 {baseline_value_col}")
+
+    b[FIPS_KEY] = to_fips_key(b[baseline_fips_col])
+    if "baseline_outage_median" in s.columns:
+        s = s.drop(columns=["baseline_outage_median"])
+
+    s = s.merge(
+        b[[FIPS_KEY, baseline_value_col]].rename(columns={baseline_value_col: "baseline_outage_median"}),
+        on=FIPS_KEY,
+        how="left",
+        validate="many_to_one",
+    )
+
+    s[storm_begin_col] = pd.to_datetime(s[storm_begin_col])
+    s[storm_end_col] = pd.to_datetime(s[storm_end_col])
+    outage_groups = _outage_groups(outage_df, outage_time_col, outage_value_col, outage_fips_col)
+
+    pre_delta = pd.Timedelta(hours=pre_hours)
+    post_delta = pd.Timedelta(hours=post_hours)
+
+    run = _durations_batched if engine == "batched" else _durations_loop
+    t_on, t_off, dur = run(s, outage_groups, storm_begin_col, storm_end_col, pre_delta, post_delta, stable_steps)
+
+    s["t_on"] = t_on
+    s["t_off"] = t_off
+    s["duration_hours"] = dur
+
+    return s
@@ -0,0 +1,261 @@
+import json
+import os
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import xgboost as xgb
+
+from storm_schema import ERA_COLS, FIPS_KEY, storm_fips_key
+
+
+BASE_DIR = Path().resolve()
+
+MODEL_DIR = (
+    BASE_DIR
+    / "models"
+)
+
+# feature order of the XGBoost notebooks; the boosters see columns by position
+FEATURE_COLS = [
+    "era_i10fg_max_total_48h",
+    "era_tp_max_total_48h",
+    "era_crr_max_total_48h",
+    "housing_units_by_area",
+    "overhead_circuits",
+    "n_points",
+    "n_urban",
+    "season_code",
+    "cbp_emp_total",
+]
+
+# county exposure columns; scenarios only bring the ERA fields and a month
+PROFILE_COLS = ["housing_units_by_area", "overhead_circuits", "n_points", "n_urban", "cbp_emp_total"]
+
+# model name -> how its raw prediction maps back to the reported scale
+#   occurrence  XGBoost_3levels_&_binary_occurance.ipynb, P(outage above baseline + 10)
+#   severity    XGBoost_severity.ipynb, trained on log1p(100 * outage_ratio)
+#   duration    XGBoost_duration.ipynb, trained on log1p(hours), given an outage
+MODELS = ("occurrence", "severity", "duration")
+
+# missing features as each notebook fitted them: severity and duration fill
+# them with 0, occurrence drops those rows, so its booster gets NaN (XGBoost's
+# missing value) rather than a 0 it never saw standing in for one
+FILL_MISSING = {"occurrence": False, "severity": True, "duration": True}
+
+SEASON_CODE = {12: 3, 1: 3, 2: 3, 3: 1, 4: 1, 5: 1, 6: 2, 7: 2, 8: 2, 9: 0, 10: 0, 11: 0}
+
+
+def _inverse(name: str, raw: np.ndarray) -> np.ndarray:
+    if name == "severity":
+        return (np.expm1(raw) / 100.0).clip(0.0, 1.0)
+    if name == "duration":
+        return np.expm1(raw).clip(min=0.0)
+    return raw
+
+
+def _write_json(path: Path, obj) -> None:
+    tmp = path.with_suffix(".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(obj, f, indent=1)
+    os.replace(tmp, path)
+
+
+def _read_manifest(model_dir: Path) -> dict:
+    path = model_dir / "models.json"
+    if not path.exists():
+        return {}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_model(name: str, model, model_dir: Path = MODEL_DIR, feature_cols=FEATURE_COLS) -> Path:
+    """Save a fitted XGBClassifier / XGBRegressor / Booster as `name` (one of MODELS)."""
+    if name not in MODELS:
+        raise ValueError(f"unknown model: {name}")
+    model_dir = Path(model_dir)
+    model_dir.mkdir(parents=True, exist_ok=True)
+    booster = model.get_booster() if hasattr(model, "get_booster") else model
+    path = model_dir / f"{name}.ubj"
+    booster.save_model(path)
+
+    manifest = _read_manifest(model_dir)
+    manifest[name] = {"file": path.name, "features": list(feature_cols)}
+    _write_json(model_dir / "models.json", manifest)
+    return path
+
+
+def county_profile(storms_data: pd.DataFrame) -> pd.DataFrame:
+    """fips_key + PROFILE_COLS, the per-county mean over storms_data (NaN / inf as 0, as in training)."""
+    prof = storms_data[PROFILE_COLS].apply(pd.to_numeric, errors="coerce")
+    prof = prof.replace([np.inf, -np.inf], np.nan).fillna(0.0)
+    prof[FIPS_KEY] = storm_fips_key(storms_data)
+    prof = prof[prof[FIPS_KEY] >= 0]
+    return prof.groupby(FIPS_KEY, as_index=False)[PROFILE_COLS].mean()
+
+
+def save_county_profile(storms_data: pd.DataFrame, model_dir: Path = MODEL_DIR) -> Path:
+    model_dir = Path(model_dir)
+    model_dir.mkdir(parents=True, exist_ok=True)
+    path = model_dir / "county_profile.parquet"
+    tmp = path.with_suffix(".tmp")
+    county_profile(storms_data).to_parquet(tmp)
+    os.replace(tmp, path)
+    return path
+
+
+class OutageScorer:
+    """Saved boosters plus county exposure, scoring hazard scenarios for every county at once.
+
+    score() takes hazard fields shaped (n_members, n_counties, 3) in ERA_COLS
+    order and returns occurrence probability, severity ratio and duration
+    (hours, given an outage) as (n_members, n_counties) arrays. Features are
+    laid out in one C-contiguous float32 matrix and fed to inplace_predict,
+    so no DMatrix or DataFrame is built per call.
+    """
+
+    def __init__(self, boosters: dict, profile: pd.DataFrame, nthread: int = None):
+        missing = [m for m in MODELS if m not in boosters]
+        if missing:
+            raise KeyError(f"missing models: {missing}")
+        self.boosters = boosters
+        if nthread is not None:
+            for b in boosters.values():
+                b.set_param({"nthread": nthread})
+        profile = profile.sort_values(FIPS_KEY)
+        self.fips = profile[FIPS_KEY].to_numpy(dtype=np.int32)
+        self.profile = np.ascontiguousarray(profile[PROFILE_COLS].to_numpy(dtype=np.float32))
+        self._col = {c: i for i, c in enumerate(FEATURE_COLS)}
+
+    @classmethod
+    def load(cls, model_dir: Path = MODEL_DIR, nthread: int = None):
+        model_dir = Path(model_dir)
+        manifest = _read_manifest(model_dir)
+        boosters = {}
+        for name in MODELS:
+            if name not in manifest:
+                raise FileNotFoundError(f"no saved {name} model in {model_dir}")
+            if manifest[name]["features"] != FEATURE_COLS:
+                raise ValueError(f"{name} model was trained on {manifest[name]['features']}")
+            boosters[name] = xgb.Booster(model_file=str(model_dir / manifest[name]["file"]))
+        profile = pd.read_parquet(model_dir / "county_profile.parquet")
+        return cls(boosters, profile, nthread=nthread)
+
+    @property
+    def counties(self) -> np.ndarray:
+        return self.fips
+
+    def features(self, hazard, season_code, n_points=None, n_urban=None) -> np.ndarray:
+        """(n_members * n_counties, len(FEATURE_COLS)) float32 feature matrix, members outermost."""
+        hazard = np.asarray(hazard, dtype=np.float32)
+        if hazard.ndim == 2:
+            hazard = hazard[None]
+        n_mem, n_cty, _ = hazard.shape
+        if n_cty != len(self.fips):
+            raise ValueError(f"hazard has {n_cty} counties, the profile {len(self.fips)}")
+
+        X = np.empty((n_mem, n_cty, len(FEATURE_COLS)), dtype=np.float32)
+        X[:, :, :len(ERA_COLS)] = hazard
+        for j, c in enumerate(PROFILE_COLS):
+            X[:, :, self._col[c]] = self.profile[:, j]
+        for c, v in (("n_points", n_points), ("n_urban", n_urban)):
+            if v is not None:
+                X[:, :, self._col[c]] = v
+        X[:, :, self._col["season_code"]] = season_code
+        # inf as missing; NaN is left for _predict to fill per model
+        np.nan_to_num(X, copy=False, nan=np.nan, posinf=np.nan, neginf=np.nan)
+        return X.reshape(n_mem * n_cty, len(FEATURE_COLS))
+
+    def _predict(self, X: np.ndarray) -> dict:
+        # model name -> prediction on the reported scale; the 0-filled copy
+        # is made once for the models that were fitted on one
+        filled = None
+        out = {}
+        for name in MODELS:
+            if FILL_MISSING[name]:
+                if filled is None:
+                    filled = np.nan_to_num(X, nan=0.0)
+                Xm = filled
+            else:
+                Xm = X
+            raw = self.boosters[name].inplace_predict(Xm, validate_features=False)
+            out[name] = _inverse(name, np.asarray(raw, dtype=np.float64))
+        return out
+
+    def score(self, hazard, season_code=None, month=None, n_points=None, n_urban=None) -> dict:
+        """occurrence_prob, severity_ratio, duration_h, each (n_members, n_counties).
+
+        hazard: (n_members, n_counties, 3) or (n_counties, 3), counties in
+        self.counties order. season_code, or the scenario month (1-12).
+        n_points / n_urban override the county profile (scalar or per county).
+        """
+        if season_code is None:
+            if month is None:
+                raise ValueError("pass season_code or month")
+            season_code = SEASON_CODE[int(month)]
+        X = self.features(hazard, season_code, n_points, n_urban)
+        shape = (-1, len(self.fips))
+        pred = self._predict(X)
+        return {key: pred[name].reshape(shape)
+                for name, key in zip(MODELS, ("occurrence_prob", "severity_ratio", "duration_h"))}
+
+    def score_rows(self, fips_key, hazard, season_code) -> dict:
+        """Row-wise scoring: one storm-county per row, hazard (n, 3) in ERA_COLS order and
+        a season_code per row. Rows whose county is not in the profile come back NaN."""
+        key = np.asarray(fips_key, dtype=np.int32)
+        c_idx = np.searchsorted(self.fips, key)
+        c_idx = np.minimum(c_idx, max(len(self.fips) - 1, 0))
+        ok = (self.fips[c_idx] == key) if len(self.fips) else np.zeros(len(key), dtype=bool)
+
+        X = np.empty((len(key), len(FEATURE_COLS)), dtype=np.float32)
+        X[:, :len(ERA_COLS)] = np.asarray(hazard, dtype=np.float32).reshape(len(key), len(ERA_COLS))
+        for j, c in enumerate(PROFILE_COLS):
+            X[:, self._col[c]] = self.profile[c_idx, j] if len(self.fips) else np.nan
+        X[:, self._col["season_code"]] = season_code
+        np.nan_to_num(X, copy=False, nan=np.nan, posinf=np.nan, neginf=np.nan)
+
+        pred = self._predict(X[ok]) if ok.any() else {}
+        out = {}
+        for name, k in zip(MODELS, ("occurrence_prob", "severity_ratio", "duration_h")):
+            res = np.full(len(key), np.nan)
+            if ok.any():
+                res[ok] = pred[name]
+            out[k] = res
+        return out
+
+    def score_frame(self, scenarios: pd.DataFrame, member_col: str = "member", month: int = None) -> pd.DataFrame:
+        """Long-format scoring: one row per (member, county) with ERA_COLS, one season per call
+        (a season_code column, or month).
+
+        Counties missing from a member get NaN hazard (0 for the severity and
+        duration models, missing for occurrence, as each was fitted); counties
+        outside the profile are dropped.
+        """
+        key = storm_fips_key(scenarios)
+        if member_col in scenarios.columns:
+            members, m_idx = np.unique(scenarios[member_col].to_numpy(), return_inverse=True)
+        else:
+            members, m_idx = np.array([0]), np.zeros(len(scenarios), dtype=np.int64)
+        c_idx = np.searchsorted(self.fips, key)
+        ok = (c_idx < len(self.fips)) & (self.fips[np.minimum(c_idx, len(self.fips) - 1)] == key)
+
+        hazard = np.full((len(members), len(self.fips), len(ERA_COLS)), np.nan, dtype=np.float32)
+        hazard[m_idx[ok], c_idx[ok]] = scenarios.loc[ok, ERA_COLS].to_numpy(dtype=np.float32)
+        if "season_code" in scenarios.columns:
+            seasons = pd.unique(scenarios["season_code"])
+            if len(seasons) != 1:
+                raise ValueError(f"score_frame scores one season per call, got season_code {sorted(seasons.tolist())}")
+            season = seasons[0]
+        elif month is not None:
+            season = SEASON_CODE[int(month)]
+        else:
+            raise ValueError("scenarios need a season_code column, or pass month")
+
+        res = self.score(hazard, season_code=season)
+        out = pd.DataFrame({
+            member_col: np.repeat(members, len(self.fips)),
+            FIPS_KEY: np.tile(self.fips, len(members)),
+        })
+        for k, v in res.items():
+            out[k] = v.ravel()
+        return out
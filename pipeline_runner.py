@@ -0,0 +1,562 @@
+import argparse
+import hashlib
+import inspect
+import os
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable
+
+import numpy as np
+import pandas as pd
+
+from eaglei_ingest import OUTAGE_CACHE_DIR, OutageCache, build_outage_cache
+from era5_store import STORE_DIR as ERA5_STORE_DIR, ingest_era5_store
+from stage_metrics import PROFILERS, StageMetrics
+from storm_schema import ERA_COLS, FIPS_KEY, apply_storm_schema
+
+
+BASE_DIR = Path().resolve()
+
+DATA_RAW = BASE_DIR / "data" / "raw"
+
+STAGE_CACHE_DIR = (
+    BASE_DIR
+    / "data" / "interim" / "stage_cache"
+)
+
+
+# ---------------------------------------------------------------------------
+# content hashing
+# ---------------------------------------------------------------------------
+
+def _hash_frame(df: pd.DataFrame, h) -> None:
+    h.update(repr(list(df.columns)).encode())
+    h.update(repr([str(t) for t in df.dtypes]).encode())
+    for c in df.columns:
+        col = df[c]
+        if str(col.dtype) == "geometry":
+            col = pd.Series(col.to_wkb(), index=col.index)
+        try:
+            v = pd.util.hash_pandas_object(col, index=False).to_numpy()
+        except TypeError:
+            v = pd.util.hash_pandas_object(col.astype(str), index=False).to_numpy()
+        h.update(v.tobytes())
+    h.update(pd.util.hash_pandas_object(df.index.to_series(), index=False).to_numpy().tobytes())
+
+
+def _hash_path(p: Path, h) -> None:
+    # files are identified by name, size and mtime; directories by their contents
+    p = Path(p)
+    h.update(str(p).encode())
+    if p.is_dir():
+        for f in sorted(p.rglob("*")):
+            if f.is_file():
+                st = f.stat()
+                h.update(f"{f.relative_to(p)}|{st.st_size}|{st.st_mtime_ns}".encode())
+    elif p.exists():
+        st = p.stat()
+        h.update(f"{st.st_size}|{st.st_mtime_ns}".encode())
+
+
+def _update_hash(obj, h) -> None:
+    if isinstance(obj, pd.DataFrame):
+        h.update(b"df")
+        _hash_frame(obj, h)
+    elif isinstance(obj, pd.Series):
+        h.update(b"series")
+        _hash_frame(obj.to_frame(), h)
+    elif isinstance(obj, np.ndarray):
+        h.update(f"nd{obj.dtype}{obj.shape}".encode())
+        h.update(np.ascontiguousarray(obj).tobytes())
+    elif isinstance(obj, Path):
+        h.update(b"path")
+        _hash_path(obj, h)
+    elif isinstance(obj, OutageCache):
+        # the cache files by stamp, plus the counties a shard selected
+        h.update(b"outage_cache")
+        _hash_path(obj.cache_dir, h)
+        _update_hash(obj.fips, h)
+    elif isinstance(obj, dict):
+        h.update(b"dict")
+        for k in sorted(obj, key=repr):
+            h.update(repr(k).encode())
+            _update_hash(obj[k], h)
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        h.update(type(obj).__name__.encode())
+        for v in (sorted(obj, key=repr) if isinstance(obj, (set, frozenset)) else obj):
+            _update_hash(v, h)
+    elif callable(obj):
+        # the whole defining module, so edits to helpers it calls count too
+        h.update(b"func")
+        h.update(getattr(obj, "__qualname__", repr(obj)).encode())
+        try:
+            h.update(inspect.getsource(inspect.getmodule(obj)).encode())
+        except (OSError, TypeError):
+            h.update(repr(obj).encode())
+    else:
+        h.update(repr(obj).encode())
+
+
+def content_hash(*objs) -> str:
+    h = hashlib.sha1()
+    for obj in objs:
+        _update_hash(obj, h)
+    return h.hexdigest()
+
+
+# ---------------------------------------------------------------------------
+# DAG runner
+# ---------------------------------------------------------------------------
+
+@dataclass
+class Stage:
+    name: str
+    func: Callable
+    inputs: list
+    params: dict = field(default_factory=dict)
+    # row-wise stages: the first input is split on this column and each
+    # partition is cached on its own, so new rows only recompute new partitions
+    partition_by: str = None
+    # extra functions whose module source is part of the cache key (for
+    # wrapper stages that call into other modules)
+    code: tuple = ()
+    # keyword arguments that change how, not what, the stage computes (worker
+    # counts); passed to func but left out of the cache key
+    runtime: dict = field(default_factory=dict)
+
+
+class Pipeline:
+    """Stages registered as a DAG, each output cached on disk by content hash.
+
+    A stage's cache key covers its function source, its params and the keys of
+    its inputs (raw inputs are hashed by content, upstream stages contribute
+    their own key), so editing code, changing a parameter or new raw data
+    invalidate exactly the stages downstream of the change.
+    """
+
+    def __init__(self, cache_dir: Path = STAGE_CACHE_DIR, verbose: bool = True, metrics=None):
+        self.cache_dir = Path(cache_dir)
+        self.verbose = verbose
+        # stage_metrics.StageMetrics: time, memory and rows of every stage run
+        self.metrics = metrics
+        self.raw = {}
+        self.stages = {}
+        self._keys = {}
+        self._values = {}
+
+    def add_input(self, name: str, value) -> None:
+        if name in self.stages or name in self.raw:
+            raise ValueError(f"duplicate node name: {name}")
+        self.raw[name] = value
+
+    def add_stage(self, name, func, inputs, params=None, partition_by=None, code=(), runtime=None) -> None:
+        if name in self.stages or name in self.raw:
+            raise ValueError(f"duplicate node name: {name}")
+        self.stages[name] = Stage(name, func, list(inputs), dict(params or {}), partition_by, tuple(code),
+                                  dict(runtime or {}))
+
+    # -- graph -------------------------------------------------------------
+
+    def _order(self, targets) -> list:
+        order, seen, active = [], set(), set()
+
+        def visit(n):
+            if n in seen:
+                return
+            if n in active:
+                raise ValueError(f"cycle through stage {n}")
+            if n not in self.stages and n not in self.raw:
+                raise KeyError(f"unknown node: {n}")
+            active.add(n)
+            for dep in self.stages[n].inputs if n in self.stages else []:
+                visit(dep)
+            active.discard(n)
+            seen.add(n)
+            order.append(n)
+
+        for t in targets:
+            visit(t)
+        return order
+
+    def _key(self, name) -> str:
+        if name not in self._keys:
+            if name in self.raw:
+                self._keys[name] = content_hash(self.raw[name])
+            else:
+                st = self.stages[name]
+                self._keys[name] = content_hash(
+                    st.name, st.func, st.code, st.params, st.partition_by,
+                    [self._key(d) for d in st.inputs],
+                )
+        return self._keys[name]
+
+    # -- cache -------------------------------------------------------------
+
+    def _cache_path(self, name, key) -> Path:
+        return self.cache_dir / name / f"{key}.pkl"
+
+    def _load(self, path: Path):
+        return pd.read_pickle(path) if path.exists() else None
+
+    def _save(self, path: Path, value) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(".tmp")
+        pd.to_pickle(value, tmp)
+        os.replace(tmp, path)
+
+    # -- execution ---------------------------------------------------------
+
+    def _call(self, st: Stage, args, status="run"):
+        kwargs = {**st.params, **st.runtime}
+        if self.metrics is None:
+            return st.func(*args, **kwargs)
+        return self.metrics.measure(st.name, st.func, args, kwargs, status=status)
+
+    def _note_cached(self, st: Stage, value, t0) -> None:
+        if self.metrics is not None:
+            self.metrics.note_cached(st.name, value, time.perf_counter() - t0)
+
+    def _run_stage(self, st: Stage):
+        key = self._key(st.name)
+        path = self._cache_path(st.name, key)
+        t0 = time.perf_counter()
+        cached = self._load(path)
+        if cached is not None:
+            if self.verbose:
+                print(f"[pipeline] {st.name}: cached")
+            self._note_cached(st, cached, t0)
+            return cached
+
+        args = [self._values[d] for d in st.inputs]
+        if st.partition_by is None:
+            if self.verbose:
+                print(f"[pipeline] {st.name}: run")
+            out = self._call(st, args)
+        else:
+            out = self._run_partitioned(st, args)
+
+        self._save(path, out)
+        return out
+
+    def _run_partitioned(self, st: Stage, args):
+        rows, rest = args[0], args[1:]
+        col = st.partition_by
+        rest_key = content_hash(
+            st.name, st.func, st.code, st.params,
+            [self._key(d) for d in st.inputs[1:]],
+        )
+
+        t0 = time.perf_counter()
+        parts, missing = {}, []
+        for value, part in rows.groupby(col, sort=True, dropna=False):
+            # row content only: a re-sorted source file must not invalidate old months
+            pkey = content_hash(rest_key, part.reset_index(drop=True))
+            ppath = self.cache_dir / st.name / "partitions" / f"{pkey}.pkl"
+            cached = self._load(ppath)
+            if cached is None:
+                missing.append((value, part, ppath))
+            else:
+                parts[value] = cached
+
+        if self.verbose:
+            print(f"[pipeline] {st.name}: {len(parts)} partitions cached, {len(missing)} to run")
+
+        if missing:
+            new_rows = pd.concat([p for _, p, _ in missing])
+            out = self._call(st, [new_rows] + rest, status="partial" if parts else "run")
+            if col not in out.columns:
+                raise KeyError(f"stage {st.name} dropped partition column {col}")
+            by_value = dict(tuple(out.groupby(col, sort=False, dropna=False)))
+            for value, _, ppath in missing:
+                res = by_value.get(value, out.iloc[:0])
+                self._save(ppath, res)
+                parts[value] = res
+
+        ordered = [parts[v] for v in sorted(parts, key=lambda v: (pd.isna(v), v))]
+        out = pd.concat(ordered, ignore_index=True) if ordered else rows.iloc[:0]
+        if not missing:
+            self._note_cached(st, out, t0)
+        return out
+
+    def run(self, targets=None, force=()):
+        """Run the stages needed for targets (default: every stage); returns a dict of outputs."""
+        if targets is None:
+            targets = list(self.stages)
+        elif isinstance(targets, str):
+            targets = [targets]
+
+        force = set(force)
+        for name in force:
+            for p in (self.cache_dir / name).rglob("*.pkl"):
+                p.unlink()
+
+        for name in self._order(targets):
+            if name in self._values:
+                continue
+            if name in self.raw:
+                self._values[name] = self.raw[name]
+            else:
+                self._values[name] = self._run_stage(self.stages[name])
+
+        return {t: self._values[t] for t in targets}
+
+
+# ---------------------------------------------------------------------------
+# primary.ipynb stages
+# ---------------------------------------------------------------------------
+
+STORM_DROP_COLS = [
+    'LOCATION_INDEX', 'RANGE',
+    'AZIMUTH', 'LOCATION', 'LAT2', 'LON2', 'EVENT_TYPE', 'INJURIES_DIRECT',
+    'INJURIES_INDIRECT', 'DEATHS_DIRECT', 'DEATHS_INDIRECT',
+    'DAMAGE_PROPERTY', 'DAMAGE_CROPS', 'MAGNITUDE', 'MAGNITUDE_TYPE', 'BEGIN_RANGE', 'BEGIN_AZIMUTH', 'END_RANGE',
+    'END_AZIMUTH', 'BEGIN_LAT', 'BEGIN_LON', 'END_LAT', 'END_LON', 'key', 'STATE_UP', 'WFO', 'FLOOD_CAUSE',
+    'CZ_NAME_UP', 'CZ_TIMEZONE', 'EPISODE_ID_DET',
+]
+
+CT_DROP_COUNTIES = {"NEW LONDON", "FAIRFIELD", "MIDDLESEX", "NEW HAVEN"}
+
+
+def clean_storm_events(storms_data):
+    mask = (
+        storms_data["STATE"].eq("CONNECTICUT") &
+        storms_data["CZ_NAME"].isin(CT_DROP_COUNTIES)
+    )
+    storms_data = storms_data.loc[~mask]
+    # one int32 fips_key for every later join (storm_schema)
+    return apply_storm_schema(storms_data.drop(columns=STORM_DROP_COLS, errors="ignore"))
+
+
+SEASONS = {
+    'December': "winter", 'January': "winter", 'February': "winter",
+    'March': "spring", 'April': "spring", 'May': "spring",
+    'June': "summer", 'July': "summer", 'August': "summer",
+    'September': "fall", 'October': "fall", 'November': "fall",
+}
+
+
+def add_outage_ratio(storms_data):
+    storms_data["max_outage_after_24h"] = pd.to_numeric(storms_data["max_outage_after_24h"], errors="coerce")
+    storms_data["outage_ratio"] = np.where(
+        (storms_data["housing_units"].notna()) & (storms_data["housing_units"] > 0),
+        storms_data["max_outage_after_24h"] / storms_data["housing_units"],
+        np.nan,
+    )
+    return storms_data
+
+
+# UG_ratio_proxy = expit(a * urban_score + b * rd_norm), a / b as picked by the
+# grid search of primary.ipynb
+UG_A = 3
+UG_B = 2
+
+
+def add_model_features(storms_data, ug_a=UG_A, ug_b=UG_B):
+    # primary.ipynb: UG proxy and overhead circuits, housing units and CBP
+    # employment per km2 of county area
+    from scipy.special import expit
+
+    missing = [c for c in ("urban_score", "rd_norm") if c not in storms_data.columns]
+    if missing:
+        raise KeyError(f"UG_ratio_proxy needs {missing} on storms_data (the ug_inputs county table)")
+    storms_data["UG_ratio_proxy"] = expit(ug_a * storms_data["urban_score"] + ug_b * storms_data["rd_norm"])
+    storms_data["overhead_circuits"] = (
+        (1 - storms_data["UG_ratio_proxy"]) * storms_data["weighted_number_of_circuits"]
+    )
+    storms_data["housing_units_by_area"] = storms_data["housing_units"] / storms_data["county_area_km2"]
+    storms_data["cbp_emp_total"] = storms_data["cbp_emp_total"] / storms_data["county_area_km2"]
+    return storms_data
+
+
+def attach_county_covariates(storms_data, county_attrs):
+    # housing units, road density, circuits, RUCC, CBP employment and county
+    # area in one gather from the county_attributes store, then the derived
+    # outage ratio, season code and per-area features, as in primary.ipynb
+    storms_data = apply_storm_schema(storms_data)
+    storms_data["YEAR"] = pd.to_numeric(storms_data["YEAR"], errors="coerce").astype("Int64")
+    storms_data = add_outage_ratio(county_attrs.attach(storms_data))
+
+    storms_data["season"] = storms_data["MONTH_NAME"].map(SEASONS).astype("category")
+    storms_data["season_code"] = storms_data["season"].cat.codes
+    return add_model_features(storms_data)
+
+
+def filter_and_fill_era(storms_data, min_yearmonth=201501):
+    storms_data = apply_storm_schema(storms_data[storms_data["YEARMONTH"] >= min_yearmonth].copy())
+    storms_data[ERA_COLS] = (
+        storms_data.groupby(FIPS_KEY)[ERA_COLS]
+        .transform(lambda x: x.fillna(x.median()))
+    )
+    return storms_data
+
+
+def load_raw_inputs(data_raw: Path = DATA_RAW, outage_cache_dir: Path = OUTAGE_CACHE_DIR,
+                    era5_store_dir: Path = ERA5_STORE_DIR) -> dict:
+    import geopandas as gpd
+    from era5_storm_features_max48h import GRID_LOOKUP_NPZ, build_grid_lookup
+
+    # EAGLE-I goes through the memory-mapped county cache and the yearly ERA5
+    # CSVs through the columnar store; both are built on the first run and
+    # only redone for source files that changed
+    era5_dir = data_raw / "storm_intensity" / "era5_NE_coastal_county_hourly"
+    ingest_era5_store(era5_dir, era5_store_dir)
+    # the ERA5 cell -> county lookup is refreshed here, so the era5_features
+    # key covers it (by file stamp) instead of a lookup the stage builds itself
+    build_grid_lookup(data_raw / "shapefiles" / "ne_counties" / "NE_coastal_counties.shp", GRID_LOOKUP_NPZ, era5_dir)
+    return {
+        "ne_coastal": pd.read_csv(data_raw / "northeast_counties" / "ne_coastal_counties_fips.csv"),
+        "storm_events": pd.read_csv(data_raw / "storm_events" / "StormEvents_2014_2022_NE_coastal.csv"),
+        "outage_df": build_outage_cache(
+            data_raw / "power_outages" / "eaglei_outages_2014_2022_NE_coastal_raw.csv", outage_cache_dir
+        ),
+        "hu20202024": pd.read_csv(data_raw / "housing_units" / "to_process_hu2020-2024.csv"),
+        "hu20102020": pd.read_csv(data_raw / "housing_units" / "to_process_hu2010-2020.csv", encoding="latin1"),
+        "era5_store": Path(era5_store_dir),
+        "grid_lookup": GRID_LOOKUP_NPZ,
+        "roads_dir": data_raw / "road_density" / "raw",
+        "counties_shape": gpd.read_file(
+            data_raw / "road_density" / "data_county_boundary" / "cb_2018_us_county_500k.shp"
+        ),
+        "dist_sys": pd.read_excel(data_raw / "circuit_distribution" / "Distribution_Systems_2023.xlsx"),
+        "serv_terr": pd.read_excel(data_raw / "circuit_distribution" / "Service_Territory_2023.xlsx"),
+        "rucc": pd.read_csv(data_raw / "rucc" / "Ruralurbancontinuumcodes2023.csv", encoding="latin1"),
+        # urban_score / rd_norm per county, as used by the UG_ratio_proxy cells
+        "ug_inputs": pd.read_csv(data_raw / "ug_proxy" / "county_ug_inputs.csv"),
+        "cbp": pd.read_csv(data_raw / "county_business_pattern" / "merged_coastal_counties_data.csv"),
+        "urban_shp": data_raw / "shapefiles" / "national urban area shapefile" / "tl_2020_us_uac20.shp",
+    }
+
+
+def _road_density_stage(roads_dir, ne_coastal, counties_shape):
+    from road_datasets_process import road_datasets_process, ROAD_CACHE_DIR
+    # road_datasets_process writes helper columns into its inputs
+    return road_datasets_process(roads_dir, ne_coastal.copy(), counties_shape.copy(), cache_dir=ROAD_CACHE_DIR)
+
+
+def _era5_stage(storms_data, era5_store, grid_lookup, n_workers=1):
+    from era5_storm_features_max48h import GridLookup, run_all_stream
+    return run_all_stream(storms_data, store_dir=era5_store, n_workers=n_workers,
+                          grid_map=GridLookup.load(grid_lookup))
+
+
+def _small_county_stage(storms_data, era5_store):
+    from small_county_ERA5_overlap import small_county_ERA5_overlap
+    # the CSV directory is only read when there is no store
+    return small_county_ERA5_overlap(None, storms_data.copy(), store_dir=era5_store)
+
+
+def _circuits_stage(dist_sys, serv_terr, road_density):
+    from circuits_distribution_process import county_circuits, CIRCUITS_CACHE_DIR
+    return county_circuits(dist_sys, serv_terr, road_density, cache_dir=CIRCUITS_CACHE_DIR)
+
+
+def _exposure_stage(storms_data, urban_shp, counties_shape, ne_coastal):
+    from urban_area_index import build_urban_index
+    from strom_impact_location_exposure import strom_impact_location_exposure
+    fips = counties_shape["STATEFP"] + counties_shape["COUNTYFP"]
+    ne_counties = counties_shape[fips.isin(ne_coastal["fips"].astype(str).str.zfill(5))]
+    urban_index = build_urban_index(urban_shp, counties=ne_counties)
+    return strom_impact_location_exposure(None, storms_data, urban_index=urban_index)
+
+
+def _duration_stage(storms_data, outage_df):
+    from outage_duration import add_outage_duration_by_baseline
+    # the baseline stage already put each county's median on its storms
+    baseline_df = (
+        storms_data[[FIPS_KEY, "baseline_outage_median"]]
+        .drop_duplicates(FIPS_KEY)
+        .rename(columns={FIPS_KEY: "CZ_FIPS"})
+    )
+    return add_outage_duration_by_baseline(storms_data, outage_df, baseline_df)
+
+
+def build_master_pipeline(raw: dict, cache_dir: Path = STAGE_CACHE_DIR, verbose: bool = True,
+                          metrics=None, era5_workers: int = 1) -> Pipeline:
+    """Register the primary.ipynb feature stages on the raw inputs of load_raw_inputs.
+
+    Stages that work one storm row at a time are partitioned by YEARMONTH: a
+    new month of storm events only runs those stages on the new month's rows.
+    """
+    from storm_outage_after24h import match_max_outage_after24h
+    from era5_storm_features_max48h import run_all_stream
+    from housing_units_process import housing_units_process
+    from road_datasets_process import road_datasets_process
+    from circuits_distribution_process import county_circuits
+    from county_attributes import build_county_attributes
+    from small_county_ERA5_overlap import small_county_ERA5_overlap
+    from strom_impact_location_exposure import strom_impact_location_exposure
+    from urban_area_index import build_urban_index
+    from baseline_outage_construction import baseline_outage_construction
+    from outage_duration import add_outage_duration_by_baseline
+
+    p = Pipeline(cache_dir=cache_dir, verbose=verbose, metrics=metrics)
+    for name, value in raw.items():
+        p.add_input(name, value)
+
+    p.add_stage("storms_clean", clean_storm_events, ["storm_events"])
+    p.add_stage("outage_after24h", match_max_outage_after24h, ["storms_clean", "outage_df"],
+                partition_by="YEARMONTH")
+    # era5_workers: processes for the ERA5 years (run_all_stream n_workers)
+    p.add_stage("era5_features", _era5_stage, ["outage_after24h", "era5_store", "grid_lookup"],
+                partition_by="YEARMONTH", code=[run_all_stream], runtime={"n_workers": era5_workers})
+
+    # county covariates stay in the county x year store until one gather
+    p.add_stage("housing_units", housing_units_process, ["hu20202024", "hu20102020", "ne_coastal"])
+    p.add_stage("road_density", _road_density_stage, ["roads_dir", "ne_coastal", "counties_shape"],
+                code=[road_datasets_process])
+    p.add_stage("county_circuits", _circuits_stage, ["dist_sys", "serv_terr", "road_density"],
+                code=[county_circuits])
+    p.add_stage("county_attributes", build_county_attributes,
+                ["housing_units", "road_density", "county_circuits", "rucc", "cbp", "ug_inputs",
+                 "counties_shape"])
+    p.add_stage("with_covariates", attach_county_covariates, ["era5_features", "county_attributes"],
+                partition_by="YEARMONTH")
+
+    # median fill is per county over all years, so it is not partitioned
+    p.add_stage("era_filled", filter_and_fill_era, ["with_covariates"])
+    p.add_stage("small_county_era5", _small_county_stage, ["era_filled", "era5_store"],
+                partition_by="YEARMONTH", code=[small_county_ERA5_overlap])
+    # exposure is aggregated per (CZ_FIPS, EPISODE_ID_LOC) and an episode can
+    # span months, so it sees all rows as well
+    p.add_stage("urban_exposure", _exposure_stage, ["small_county_era5", "urban_shp", "counties_shape", "ne_coastal"],
+                code=[strom_impact_location_exposure, build_urban_index])
+    # the baseline excludes every storm window of a county, so it needs all rows
+    p.add_stage("baseline", baseline_outage_construction, ["urban_exposure", "outage_df"])
+    p.add_stage("duration", _duration_stage, ["baseline", "outage_df"],
+                code=[add_outage_duration_by_baseline])
+    return p
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Build storms_data with cached pipeline stages.")
+    ap.add_argument("--data-raw", type=Path, default=DATA_RAW)
+    ap.add_argument("--cache-dir", type=Path, default=STAGE_CACHE_DIR)
+    ap.add_argument("--target", default="duration")
+    ap.add_argument("--force", nargs="*", default=[], help="stages whose cache is dropped first")
+    ap.add_argument("--out", type=Path, default=BASE_DIR / "storms_data.parquet",
+                    help="Parquet master dataset directory, or a .csv file")
+    ap.add_argument("--report", type=Path, default=None,
+                    help="run report (.json or .csv) with time, peak memory and rows per stage")
+    ap.add_argument("--profile-stage", default=None, help="stage to run under a profiler")
+    ap.add_argument("--profiler", choices=PROFILERS, default="cprofile")
+    ap.add_argument("--era5-workers", type=int, default=1, help="processes for the ERA5 years (0 = all cores)")
+    args = ap.parse_args()
+
+    metrics = None
+    if args.report is not None or args.profile_stage is not None:
+        metrics = StageMetrics(profile_stage=args.profile_stage, profiler=args.profiler)
+
+    p = build_master_pipeline(load_raw_inputs(args.data_raw), cache_dir=args.cache_dir, metrics=metrics,
+                              era5_workers=args.era5_workers or None)
+    try:
+        storms_data = p.run(args.target, force=args.force)[args.target]
+    finally:
+        if metrics is not None:
+            print(f"[pipeline] report: {metrics.write_report(args.report)}")
+    from master_dataset import save_storms_data
+    save_storms_data(storms_data, args.out)
+
+
+if __name__ == "__main__":
+    main()
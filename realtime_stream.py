@@ -0,0 +1,603 @@
+import argparse
+import asyncio
+import inspect
+from dataclasses import dataclass, field
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from outage_scoring import SEASON_CODE
+from storm_schema import ERA_COLS, FIPS_KEY, storm_fips_key, to_fips_key
+
+
+BASE_DIR = Path().resolve()
+
+FEED_DIR = (
+    BASE_DIR
+    / "data" / "raw" / "realtime_feed"
+)
+
+# Incremental version of the three storm-window features, for a feed of
+#   storms    NOAA storm-event rows (EVENT_ID, BEGIN/END_DATE_TIME, STATE_FIPS + CZ_FIPS)
+#   outages   EAGLE-I snapshots (fips_code, sum, run_start_time), every 15 minutes
+#   weather   ERA5 hourly grid rows (valid_time, latitude, longitude, tp, i10fg, crr)
+#
+# Each county keeps ring buffers of its recent outage snapshots and ERA5 hour
+# maxima. A storm that arrives is seeded from the buffers; every later batch
+# only touches the open storms of the counties it carries, folding the new
+# steps into the storm's running state:
+#   max_outage_after_24h   max over [begin, begin + 24h]   (storm_outage_after24h)
+#   t_on / t_off           first step above the county baseline in
+#                          [begin - pre_hours, end + post_hours], then the
+#                          first run of stable_steps steps at or below it
+#                          (outage_duration)
+#   era_*_max_total_48h    max of the county-hour maxima in [begin - 24h,
+#                          begin + 24h]   (era5_storm_features_max48h)
+# A storm closes once the outage and weather feeds have moved past its windows.
+# Storms and outages are matched on fips_key.
+#
+# Per county, rows must arrive in time order: an outage snapshot at or before
+# the county's newest buffered one, or an ERA5 hour before its newest hour,
+# is dropped and counted in StreamState.late (ERA5 rows of the newest hour
+# are merged into it).
+
+OUTAGE_BUFFER_HOURS = 96
+WEATHER_BUFFER_HOURS = 72
+OUTAGE_STEPS_PER_HOUR = 4
+
+OUTAGE_WINDOW_H = 24
+ERA_WINDOW_H = 24
+
+HOUR_NS = 3_600_000_000_000
+NAT = np.iinfo(np.int64).min
+
+FEEDS = ("storms", "outages", "weather")
+
+# era5 variable per ERA_COLS entry
+ERA_VARS = ["i10fg", "tp", "crr"]
+
+
+class RingBuffer:
+    """Fixed-capacity, time-ordered series: int64 ns times and float64 rows of `width` values.
+
+    Appending past the capacity overwrites the oldest rows; evicted_upto is
+    the newest time dropped that way, so a reader can tell whether a window
+    still lies entirely in the buffer.
+    """
+
+    def __init__(self, capacity: int, width: int = 1):
+        self.capacity = int(capacity)
+        self.times = np.empty(self.capacity, dtype=np.int64)
+        self.values = np.empty((self.capacity, width))
+        self.start = 0
+        self.size = 0
+        self.evicted_upto = NAT
+
+    def __len__(self) -> int:
+        return self.size
+
+    @property
+    def last(self) -> int:
+        return self.times[(self.start + self.size - 1) % self.capacity] if self.size else NAT
+
+    def merge_last(self, values) -> None:
+        i = (self.start + self.size - 1) % self.capacity
+        self.values[i] = np.fmax(self.values[i], values)
+
+    def extend(self, times: np.ndarray, values: np.ndarray) -> None:
+        """Append rows with ascending times, all after self.last."""
+        n = len(times)
+        if n > self.capacity:
+            self.evicted_upto = max(self.evicted_upto, int(times[n - self.capacity - 1]))
+            times, values, n = times[-self.capacity:], values[-self.capacity:], self.capacity
+        drop = self.size + n - self.capacity
+        if drop > 0:
+            self.evicted_upto = max(self.evicted_upto, int(self.times[(self.start + drop - 1) % self.capacity]))
+            self.start = (self.start + drop) % self.capacity
+            self.size -= drop
+        idx = (self.start + self.size + np.arange(n)) % self.capacity
+        self.times[idx] = times
+        self.values[idx] = values.reshape(n, -1)
+        self.size += n
+
+    def window(self, lo: int, hi: int):
+        """(times, values) with lo <= time <= hi, oldest first."""
+        idx = (self.start + np.arange(self.size)) % self.capacity
+        t = self.times[idx]
+        a, b = np.searchsorted(t, lo, side="left"), np.searchsorted(t, hi, side="right")
+        return t[a:b], self.values[idx[a:b]]
+
+
+def _max_by_county_time(key: np.ndarray, t: np.ndarray, values: np.ndarray):
+    """Rows sorted by (key, t) with duplicates reduced to their NaN-skipping max."""
+    order = np.lexsort((t, key))
+    key, t, values = key[order], t[order], values[order]
+    first = np.r_[True, (key[1:] != key[:-1]) | (t[1:] != t[:-1])] if len(key) else np.empty(0, dtype=bool)
+    start = np.flatnonzero(first)
+    if len(start) < len(key):
+        values = np.fmax.reduceat(values, start, axis=0)
+    return key[start], t[start], values
+
+
+def _county_runs(key: np.ndarray):
+    # [a, b) row ranges of each county in a key-sorted array
+    bounds = np.flatnonzero(key[1:] != key[:-1]) + 1
+    return zip(np.r_[0, bounds], np.r_[bounds, len(key)])
+
+
+@dataclass
+class StormState:
+    event_id: object
+    fips: int
+    begin: int                      # ns
+    end: int                        # ns
+    baseline: float
+    row: dict
+    max_outage: float = 0.0
+    # duration: steps seen in the window, onset, and the current run at or below baseline
+    n_window: int = 0
+    t_on: int = NAT
+    t_off: int = NAT
+    run_start: int = NAT
+    run_len: int = 0
+    era: np.ndarray = field(default_factory=lambda: np.full(len(ERA_COLS), np.nan))
+    partial: bool = False
+    closed: bool = False
+
+
+class StreamState:
+    """Per-county ring buffers plus the running window state of every open storm.
+
+    add_storms / add_outages / add_weather take one batch of feed rows and
+    return the EVENT_IDs whose features changed; close_ready() closes the
+    storms whose windows the feeds have passed. frame() gives the current
+    rows, scored when a scorer (outage_scoring.OutageScorer) is set.
+
+    baseline: county baseline medians, the CZ_FIPS / baseline_outage_median
+    frame of baseline_outage_construction.compute_baseline_medians.
+    grid_map: GridLookup (or grid_to_fips frame) placing ERA5 cells in counties.
+    require: the feeds a storm waits for before it closes.
+    """
+
+    def __init__(self, baseline: pd.DataFrame, grid_map=None, scorer=None,
+                 pre_hours: int = 0, post_hours: int = 72, stable_steps: int = 4,
+                 outage_buffer_hours: int = OUTAGE_BUFFER_HOURS,
+                 weather_buffer_hours: int = WEATHER_BUFFER_HOURS,
+                 require=("outages", "weather")):
+        from era5_storm_features_max48h import _as_lookup
+
+        self.baseline = dict(zip(
+            to_fips_key(baseline["CZ_FIPS"]).tolist(),
+            pd.to_numeric(baseline["baseline_outage_median"], errors="coerce").tolist(),
+        ))
+        self.lookup = _as_lookup(grid_map) if grid_map is not None else None
+        self._cell_fips = to_fips_key(self.lookup.fips) if self.lookup is not None else None
+        self.scorer = scorer
+        self.pre_ns = int(pre_hours * HOUR_NS)
+        self.post_ns = int(post_hours * HOUR_NS)
+        self.stable_steps = max(int(stable_steps), 1)
+        self.outage_capacity = int(outage_buffer_hours * OUTAGE_STEPS_PER_HOUR)
+        self.weather_capacity = int(weather_buffer_hours)
+        self.require = tuple(require)
+
+        self.outage_buf = {}
+        self.weather_buf = {}
+        self.watermark = {"outages": NAT, "weather": NAT}
+        self.late = {"outages": 0, "weather": 0}
+        self.storms = {}
+        self.by_county = {}
+        # EVENT_ID -> final state; a re-sent report of a closed storm re-opens it
+        self.closed = {}
+
+    # -- storms ---------------------------------------------------------------
+
+    def _tracks_duration(self, st: StormState) -> bool:
+        return not np.isnan(st.baseline) and st.end != NAT
+
+    def _outage_end(self, st: StormState) -> int:
+        end = st.begin + OUTAGE_WINDOW_H * HOUR_NS
+        if self._tracks_duration(st) and st.t_off == NAT:
+            end = max(end, st.end + self.post_ns)
+        return end
+
+    def _era_hours(self, st: StormState):
+        # valid_time in [t0, t1]  <=>  hour in [ceil(t0), floor(t1)]
+        t0 = st.begin - ERA_WINDOW_H * HOUR_NS
+        t1 = st.begin + ERA_WINDOW_H * HOUR_NS
+        return -(-t0 // HOUR_NS) * HOUR_NS, t1 // HOUR_NS * HOUR_NS
+
+    def add_storms(self, storms: pd.DataFrame) -> set:
+        """Open (or, for a known EVENT_ID, re-open with the new times) the storms of a batch."""
+        if storms.empty:
+            return set()
+        keys = storm_fips_key(storms)
+        begin = pd.to_datetime(storms["BEGIN_DATE_TIME"], errors="coerce").to_numpy(dtype="datetime64[ns]")
+        end_col = storms["END_DATE_TIME"] if "END_DATE_TIME" in storms.columns else storms["BEGIN_DATE_TIME"]
+        end = pd.to_datetime(end_col, errors="coerce").to_numpy(dtype="datetime64[ns]")
+        changed = set()
+        for row, key, b, e in zip(storms.to_dict("records"), keys, begin.astype(np.int64), end.astype(np.int64)):
+            eid = row["EVENT_ID"]
+            old = self.storms.pop(eid, None)
+            self.closed.pop(eid, None)
+            if old is not None:
+                self.by_county.get(old.fips, set()).discard(eid)
+            st = StormState(eid, int(key), int(b), int(e), self.baseline.get(int(key), np.nan), row)
+            self.storms[eid] = st
+            changed.add(eid)
+            if b == NAT or key < 0:
+                # nothing to match; closes with the batch defaults (0 / NaN)
+                st.closed = True
+                continue
+            self.by_county.setdefault(st.fips, set()).add(eid)
+            self._seed(st)
+        return changed
+
+    def _seed(self, st: StormState) -> None:
+        # replay what the county buffers still hold; flag storms whose window
+        # starts before data the buffers already evicted
+        lo = st.begin - self.pre_ns
+        buf = self.outage_buf.get(st.fips)
+        if buf is not None:
+            t, v = buf.window(lo, self._outage_end(st))
+            self._fold_outages(st, t, v[:, 0])
+            st.partial |= buf.evicted_upto >= lo
+        h0, h1 = self._era_hours(st)
+        buf = self.weather_buf.get(st.fips)
+        if buf is not None:
+            t, v = buf.window(h0, h1)
+            if len(t):
+                st.era = np.fmax(st.era, np.fmax.reduce(v, axis=0))
+            st.partial |= buf.evicted_upto >= h0
+
+    # -- outages --------------------------------------------------------------
+
+    def _fold_outages(self, st: StormState, times: np.ndarray, values: np.ndarray) -> bool:
+        if not len(times):
+            return False
+        changed = False
+        m = (times >= st.begin) & (times <= st.begin + OUTAGE_WINDOW_H * HOUR_NS)
+        if m.any():
+            new = np.fmax(st.max_outage, np.fmax.reduce(values[m]))
+            changed |= new != st.max_outage
+            st.max_outage = new
+
+        if not self._tracks_duration(st) or st.t_off != NAT:
+            return changed
+        m = (times >= st.begin - self.pre_ns) & (times <= st.end + self.post_ns)
+        if not m.any():
+            return changed
+        st.n_window += int(m.sum())
+        changed = True
+        for t, v in zip(times[m].tolist(), values[m].tolist()):
+            if st.t_on == NAT:
+                if v > st.baseline:
+                    st.t_on = t
+                continue
+            if v <= st.baseline:
+                if st.run_len == 0:
+                    st.run_start = t
+                st.run_len += 1
+                if st.run_len >= self.stable_steps:
+                    st.t_off = st.run_start
+                    break
+            else:
+                st.run_len = 0
+        return changed
+
+    def add_outages(self, outages: pd.DataFrame) -> set:
+        """Buffer a batch of EAGLE-I snapshots and fold them into the open storms of their counties."""
+        key = to_fips_key(outages["fips_code"])
+        t = pd.to_datetime(outages["run_start_time"], errors="coerce").to_numpy(dtype="datetime64[ns]").astype(np.int64)
+        v = pd.to_numeric(outages["sum"], errors="coerce").to_numpy(dtype=float)
+        ok = (key >= 0) & (t != NAT)
+        if not ok.any():
+            return set()
+        # one snapshot per county and time within the batch
+        k_all, t_all, v_all = _max_by_county_time(key[ok], t[ok], v[ok])
+        self.watermark["outages"] = max(self.watermark["outages"], int(t_all.max()))
+
+        changed = set()
+        for a, b in _county_runs(k_all):
+            fips = int(k_all[a])
+            buf = self.outage_buf.get(fips)
+            if buf is None:
+                buf = self.outage_buf[fips] = RingBuffer(self.outage_capacity)
+            times, vals = t_all[a:b], v_all[a:b]
+            fresh = times > buf.last
+            self.late["outages"] += int((~fresh).sum())
+            times, vals = times[fresh], vals[fresh]
+            if not len(times):
+                continue
+            buf.extend(times, vals)
+            for eid in self.by_county.get(fips, ()):
+                if self._fold_outages(self.storms[eid], times, vals):
+                    changed.add(eid)
+        return changed
+
+    # -- weather --------------------------------------------------------------
+
+    def add_weather(self, weather: pd.DataFrame) -> set:
+        """Reduce a batch of ERA5 grid rows to county-hour maxima, buffer them and
+        fold them into the open storms' window maxima."""
+        if self.lookup is None:
+            raise ValueError("StreamState needs a grid_map for weather rows")
+        c_idx = self.lookup.county_index(weather["latitude"].to_numpy(), weather["longitude"].to_numpy())
+        inside = c_idx >= 0
+        if not inside.any():
+            return set()
+        hours = pd.to_datetime(weather["valid_time"]).to_numpy(dtype="datetime64[ns]")[inside]
+        k_all, t_all, v_all = _max_by_county_time(
+            self._cell_fips[c_idx[inside]],
+            hours.astype("datetime64[h]").astype("datetime64[ns]").astype(np.int64),
+            np.column_stack([weather[v].to_numpy(dtype=float)[inside] for v in ERA_VARS]),
+        )
+        self.watermark["weather"] = max(self.watermark["weather"], int(t_all.max()))
+
+        changed = set()
+        for a, b in _county_runs(k_all):
+            fips = int(k_all[a])
+            buf = self.weather_buf.get(fips)
+            if buf is None:
+                buf = self.weather_buf[fips] = RingBuffer(self.weather_capacity, len(ERA_COLS))
+            times, vals = t_all[a:b], v_all[a:b]
+            last = buf.last
+            if times[0] == last:
+                buf.merge_last(vals[0])
+            self.late["weather"] += int((times < last).sum())
+            keep = times >= last
+            times, vals = times[keep], vals[keep]
+            new = times > last
+            buf.extend(times[new], vals[new])
+            for eid in self.by_county.get(fips, ()):
+                st = self.storms[eid]
+                h0, h1 = self._era_hours(st)
+                m = (times >= h0) & (times <= h1)
+                if m.any():
+                    era = np.fmax(st.era, np.fmax.reduce(vals[m], axis=0))
+                    if not np.array_equal(era, st.era, equal_nan=True):
+                        st.era = era
+                        changed.add(eid)
+        return changed
+
+    def add(self, kind: str, batch: pd.DataFrame) -> set:
+        if kind == "storms":
+            return self.add_storms(batch)
+        if kind == "outages":
+            return self.add_outages(batch)
+        if kind == "weather":
+            return self.add_weather(batch)
+        raise ValueError(f"unknown feed: {kind}")
+
+    # -- closing and output ---------------------------------------------------
+
+    def _ready(self, st: StormState) -> bool:
+        if "outages" in self.require and self.watermark["outages"] <= self._outage_end(st):
+            return False
+        if "weather" in self.require and self.watermark["weather"] <= self._era_hours(st)[1]:
+            return False
+        return True
+
+    def close_ready(self) -> set:
+        """Close the storms the required feeds have moved past; returns their EVENT_IDs."""
+        done = {eid for eid, st in self.storms.items() if st.closed or self._ready(st)}
+        for eid in done:
+            st = self.storms.pop(eid)
+            st.closed = True
+            self.by_county.get(st.fips, set()).discard(eid)
+            self.closed[eid] = st
+        return done
+
+    def finish(self) -> set:
+        """End of feed: close every open storm with what has arrived."""
+        done = set(self.storms)
+        for st in self.storms.values():
+            st.closed = True
+            self.closed[st.event_id] = st
+        self.storms.clear()
+        self.by_county.clear()
+        return done
+
+    def _rows(self, states) -> pd.DataFrame:
+        states = list(states)
+        if not states:
+            return pd.DataFrame()
+        cols = {c: [st.row.get(c) for st in states] for c in dict.fromkeys(c for st in states for c in st.row)}
+        t_on = np.array([st.t_on for st in states], dtype=np.int64)
+        t_off = np.array([st.t_off for st in states], dtype=np.int64)
+        dur = np.where(t_off != NAT, (t_off - t_on) / HOUR_NS, np.nan)
+        seen = np.array([st.n_window > 0 for st in states])
+        dur[seen & (t_on == NAT)] = 0.0
+        era = np.array([st.era for st in states], dtype=np.float32).reshape(len(states), len(ERA_COLS))
+        fips = np.array([st.fips for st in states], dtype=np.int32)
+        cols.update({
+            FIPS_KEY: fips,
+            "max_outage_after_24h": np.array([st.max_outage for st in states]),
+            "baseline_outage_median": np.array([st.baseline for st in states]),
+            "t_on": t_on.view("datetime64[ns]"),
+            "t_off": t_off.view("datetime64[ns]"),
+            "duration_hours": dur,
+            **{c: era[:, j] for j, c in enumerate(ERA_COLS)},
+            "partial": np.array([st.partial for st in states]),
+            "closed": np.array([st.closed for st in states]),
+        })
+        if self.scorer is not None:
+            month = pd.to_datetime(pd.Series(cols["BEGIN_DATE_TIME"]), errors="coerce").dt.month
+            season = month.map(SEASON_CODE).fillna(0).to_numpy(dtype=np.float32)
+            cols.update(self.scorer.score_rows(fips, era, season))
+        return pd.DataFrame(cols)
+
+    def frame(self, event_ids=None) -> pd.DataFrame:
+        """Current rows of the open storms (or of event_ids, open or closed)."""
+        if event_ids is None:
+            return self._rows(self.storms.values())
+        return self._rows([self.storms.get(eid) or self.closed[eid] for eid in event_ids])
+
+    def closed_frame(self) -> pd.DataFrame:
+        return self._rows(self.closed.values())
+
+
+# ---------------------------------------------------------------------------
+# feeds: async iterators of (kind, DataFrame) batches
+# ---------------------------------------------------------------------------
+
+def feed_kind(columns) -> str:
+    cols = set(columns)
+    if {"run_start_time", "sum", "fips_code"} <= cols:
+        return "outages"
+    if {"valid_time", "latitude", "longitude"} <= cols:
+        return "weather"
+    if {"EVENT_ID", "BEGIN_DATE_TIME"} <= cols:
+        return "storms"
+    raise ValueError(f"not a storm, EAGLE-I or ERA5 file: {sorted(cols)[:8]}")
+
+
+def _read_feed_file(path: Path) -> pd.DataFrame:
+    return pd.read_parquet(path) if path.suffix == ".parquet" else pd.read_csv(path, low_memory=False)
+
+
+def load_replay(feed_dir: Path = FEED_DIR, storm_lag_hours: float = 0.0, weather_lag_hours: float = 0.0) -> dict:
+    """kind -> rows of every .csv / .parquet file in feed_dir, with an _arrival time, sorted by it.
+
+    Storms arrive at REPORT_TIME when the file has one, else BEGIN_DATE_TIME
+    + storm_lag_hours; ERA5 hours at valid_time + weather_lag_hours (the
+    reanalysis lags real time); outage snapshots at run_start_time.
+    """
+    parts = {k: [] for k in FEEDS}
+    for path in sorted(Path(feed_dir).iterdir()):
+        if path.suffix not in (".csv", ".parquet"):
+            continue
+        df = _read_feed_file(path)
+        parts[feed_kind(df.columns)].append(df)
+
+    out = {}
+    for kind, frames in parts.items():
+        if not frames:
+            continue
+        df = pd.concat(frames, ignore_index=True)
+        # time columns are parsed here once, not per batch
+        if kind == "storms":
+            df = df.assign(**{c: pd.to_datetime(df[c], errors="coerce")
+                              for c in ("BEGIN_DATE_TIME", "END_DATE_TIME", "REPORT_TIME") if c in df.columns})
+            t = df["REPORT_TIME"] if "REPORT_TIME" in df.columns else \
+                df["BEGIN_DATE_TIME"] + pd.Timedelta(hours=storm_lag_hours)
+        elif kind == "weather":
+            df["valid_time"] = pd.to_datetime(df["valid_time"], errors="coerce")
+            t = df["valid_time"] + pd.Timedelta(hours=weather_lag_hours)
+        else:
+            df["run_start_time"] = pd.to_datetime(df["run_start_time"], errors="coerce")
+            t = df["run_start_time"]
+        out[kind] = df.assign(_arrival=t).dropna(subset=["_arrival"]).sort_values("_arrival", kind="stable",
+                                                                                 ignore_index=True)
+    return out
+
+
+async def replay_feed(feed_dir: Path = FEED_DIR, tick_minutes: float = 15, speed: float = None,
+                      storm_lag_hours: float = 0.0, weather_lag_hours: float = 0.0):
+    """Simulated feed: the files of feed_dir replayed in arrival order, one batch per
+    kind and tick of tick_minutes.
+
+    speed: simulated seconds per wall second (None replays as fast as the
+    consumer takes the batches).
+    """
+    data = load_replay(feed_dir, storm_lag_hours, weather_lag_hours)
+    tick_ns = int(tick_minutes * 60 * 1e9)
+    ticks = {k: df["_arrival"].to_numpy(dtype="datetime64[ns]").astype(np.int64) // tick_ns for k, df in data.items()}
+    all_ticks = np.unique(np.concatenate(list(ticks.values()))) if ticks else np.empty(0, dtype=np.int64)
+
+    prev = None
+    for tk in all_ticks:
+        if speed is not None and prev is not None:
+            await asyncio.sleep((tk - prev) * tick_ns / 1e9 / speed)
+        prev = tk
+        # storms first, so a storm and the snapshots of its own tick meet in the buffers
+        for kind in FEEDS:
+            if kind not in data:
+                continue
+            a, b = np.searchsorted(ticks[kind], [tk, tk + 1])
+            if b > a:
+                yield kind, data[kind].iloc[a:b].drop(columns="_arrival")
+        await asyncio.sleep(0)
+
+
+async def run_stream(feeds, state: StreamState, on_update=None, queue_size: int = 16) -> pd.DataFrame:
+    """Consume one or more feeds (async iterators of (kind, DataFrame)) into state.
+
+    Every feed is pumped by its own task into a bounded queue, so a slow
+    consumer holds the producers back. After each batch on_update (sync or
+    async) gets the rows of the storms that changed or closed. When all feeds
+    end, the remaining storms are closed and every closed row is returned.
+    """
+    queue = asyncio.Queue(maxsize=queue_size)
+
+    async def pump(feed):
+        try:
+            async for item in feed:
+                await queue.put(item)
+        finally:
+            await queue.put(None)
+
+    tasks = [asyncio.create_task(pump(f)) for f in feeds]
+    running = len(tasks)
+    try:
+        while running:
+            item = await queue.get()
+            if item is None:
+                running -= 1
+                continue
+            kind, batch = item
+            changed = state.add(kind, batch) | state.close_ready()
+            if on_update is not None and changed:
+                res = on_update(state.frame(changed))
+                if inspect.isawaitable(res):
+                    await res
+        await asyncio.gather(*tasks)
+    finally:
+        for t in tasks:
+            t.cancel()
+
+    done = state.finish()
+    if on_update is not None and done:
+        res = on_update(state.frame(done))
+        if inspect.isawaitable(res):
+            await res
+    return state.closed_frame()
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Replay a directory of storm / EAGLE-I / ERA5 files as a live feed.")
+    ap.add_argument("--feed-dir", type=Path, default=FEED_DIR)
+    ap.add_argument("--baseline", type=Path, required=True, help="CZ_FIPS / baseline_outage_median table (.csv or .parquet)")
+    ap.add_argument("--tick", type=float, default=15, help="replay tick, minutes")
+    ap.add_argument("--speed", type=float, default=None, help="simulated seconds per wall second")
+    ap.add_argument("--storm-lag", type=float, default=0.0, help="hours from storm begin to its report")
+    ap.add_argument("--weather-lag", type=float, default=0.0, help="hours from an ERA5 hour to its arrival")
+    ap.add_argument("--models", type=Path, default=None, help="score storms with the saved models in this directory")
+    ap.add_argument("--updates", type=Path, default=None, help="append every update to this CSV")
+    ap.add_argument("--out", type=Path, default=BASE_DIR / "storms_realtime.csv")
+    args = ap.parse_args()
+
+    from era5_storm_features_max48h import build_grid_lookup
+    from outage_scoring import OutageScorer
+
+    baseline = _read_feed_file(args.baseline)
+    scorer = OutageScorer.load(args.models) if args.models is not None else None
+    state = StreamState(baseline, build_grid_lookup(), scorer=scorer)
+
+    header = [True]
+
+    def on_update(rows):
+        n_closed = int(rows["closed"].sum())
+        print(f"[stream] {len(rows) - n_closed} updated, {n_closed} closed, {len(state.storms)} open")
+        if args.updates is not None:
+            rows.to_csv(args.updates, mode="w" if header[0] else "a", header=header[0], index=False)
+            header[0] = False
+
+    feed = replay_feed(args.feed_dir, args.tick, args.speed, args.storm_lag, args.weather_lag)
+    out = asyncio.run(run_stream([feed], state, on_update))
+    out.to_csv(args.out, index=False)
+    print(f"[stream] {len(out)} storms -> {args.out}; late rows {state.late}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,37 +1,153 @@
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
 import geopandas as gpd
 from pathlib import Path
+import numpy as np
 import pandas as pd
+import shapely
+from pyproj import CRS, Geod, Transformer
 
-def road_datasets_process(DATA_ROOT, df_ne_costal, counties):
-    results = []
-    
-    for county_dir in DATA_ROOT.iterdir():
+BASE_DIR = Path().resolve()
+
+ROAD_CACHE_DIR = (
+    BASE_DIR
+    / "data" / "interim" / "road_length_cache"
+)
+
+CACHE_VERSION = 1
+
+# length_method:
+#   "planar"     original behaviour: EPSG:3857 lengths when the edges are in
+#                EPSG:4326, otherwise lengths in the file's own CRS
+#   "geodesic"   WGS84 ellipsoid distance between consecutive vertices
+#   "equal_area" lengths in EPSG:5070 (CONUS Albers)
+LENGTH_METHODS = ("planar", "geodesic", "equal_area")
+EQUAL_AREA_CRS = "EPSG:5070"
+
+
+def _read_edges(edges_path: Path) -> gpd.GeoSeries:
+    # geometry only; pyogrio + Arrow skips building the attribute columns
+    try:
+        import pyogrio
+    except ImportError:
+        return gpd.read_file(edges_path).geometry
+    gdf = pyogrio.read_dataframe(edges_path, columns=[], use_arrow=True)
+    return gdf.geometry
+
+
+def _vertex_pairs(geoms):
+    # coordinates of every line part plus a mask of consecutive pairs in the same part
+    parts = shapely.get_parts(np.asarray(geoms))
+    coords, part_idx = shapely.get_coordinates(parts, return_index=True)
+    same = part_idx[1:] == part_idx[:-1]
+    return coords[:, 0], coords[:, 1], same
+
+
+def edges_length_m(geoms: gpd.GeoSeries, length_method: str = "planar") -> float:
+    """Total length of the edge geometries, transforming vertices rather than the frame."""
+    if length_method not in LENGTH_METHODS:
+        raise ValueError(f"unknown length_method: {length_method}")
+    crs = CRS.from_user_input(geoms.crs) if geoms.crs is not None else None
+    x, y, same = _vertex_pairs(geoms.to_numpy())
+    if len(x) < 2:
+        return 0.0
+
+    if length_method == "geodesic":
+        if crs is not None and crs.to_epsg() != 4326:
+            x, y = Transformer.from_crs(crs, "EPSG:4326", always_xy=True).transform(x, y)
+        _, _, dist = Geod(ellps="WGS84").inv(x[:-1][same], y[:-1][same], x[1:][same], y[1:][same])
+        return float(np.sum(dist))
+
+    if length_method == "equal_area":
+        x, y = Transformer.from_crs(crs, EQUAL_AREA_CRS, always_xy=True).transform(x, y)
+    elif crs is not None and crs.to_epsg() == 4326:
+        x, y = Transformer.from_crs(crs, "EPSG:3857", always_xy=True).transform(x, y)
+    return float(np.sum(np.hypot(np.diff(x)[same], np.diff(y)[same])))
+
+
+def _county_length(edges_path: Path, length_method: str) -> float:
+    return edges_length_m(_read_edges(edges_path), length_method)
+
+
+def _stamp(path: Path) -> dict:
+    st = path.stat()
+    return {"mtime": st.st_mtime, "size": st.st_size}
+
+
+def _read_cache(cache_dir: Path) -> dict:
+    path = cache_dir / "road_lengths.json"
+    if not path.exists():
+        return {}
+    with open(path, encoding="utf-8") as f:
+        cache = json.load(f)
+    return cache["counties"] if cache.get("version") == CACHE_VERSION else {}
+
+
+def _write_cache(cache_dir: Path, entries: dict) -> None:
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    tmp = cache_dir / "road_lengths.json.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({"version": CACHE_VERSION, "counties": entries}, f, indent=1)
+    os.replace(tmp, cache_dir / "road_lengths.json")
+
+
+def road_lengths(DATA_ROOT, n_workers=1, cache_dir=None, length_method="planar") -> pd.DataFrame:
+    """county_fips, county_name, road_length_km for every DATA_ROOT/<fips>_*/edges/edges.shp.
+
+    n_workers > 1 spreads counties over a process pool (None = all cores).
+    With cache_dir, per-county lengths are kept in road_lengths.json keyed by
+    the shapefile's mtime and size, so only new or changed counties are read.
+    """
+    if length_method not in LENGTH_METHODS:
+        raise ValueError(f"unknown length_method: {length_method}")
+
+    counties = []
+    for county_dir in Path(DATA_ROOT).iterdir():
         if not county_dir.is_dir():
             continue
-    
-        county_name = county_dir.name
-        county_fips = county_name.split("_")[0]   # 如 23001
-    
         edges_path = county_dir / "edges" / "edges.shp"
-        if not edges_path.exists():
-            continue
-    
-        gdf = gpd.read_file(edges_path)
-    
-        if gdf.crs.to_epsg() == 4326:
-            gdf = gdf.to_crs(epsg=3857)
-    
-        total_length_m = gdf.length.sum()
-        total_length_km = total_length_m / 1000
+        if edges_path.exists():
+            counties.append((county_dir.name, edges_path))
+
+    entries = _read_cache(Path(cache_dir)) if cache_dir is not None else {}
+    lengths, todo = {}, []
+    for county_name, edges_path in counties:
+        key = f"{county_name}|{length_method}"
+        hit = entries.get(key)
+        if hit is not None and {k: hit[k] for k in ("mtime", "size")} == _stamp(edges_path):
+            lengths[county_name] = hit["length_m"]
+        else:
+            todo.append((county_name, edges_path))
+
+    if n_workers == 1 or len(todo) <= 1:
+        computed = [_county_length(p, length_method) for _, p in todo]
+    else:
+        with ProcessPoolExecutor(max_workers=n_workers) as pool:
+            computed = list(pool.map(_county_length, [p for _, p in todo], [length_method] * len(todo)))
+
+    for (county_name, edges_path), length_m in zip(todo, computed):
+        lengths[county_name] = length_m
+        entries[f"{county_name}|{length_method}"] = {**_stamp(edges_path), "length_m": length_m}
+    if cache_dir is not None and todo:
+        _write_cache(Path(cache_dir), entries)
+
+    results = []
+    for county_name, _ in counties:
         results.append({
-            "county_fips": county_fips,
+            "county_fips": county_name.split("_")[0],   # 如 23001
             "county_name": county_name,
-            "road_length_km": total_length_km
+            "road_length_km": lengths[county_name] / 1000
         })
-    
-    df_roads = pd.DataFrame(results)
+    return pd.DataFrame(results)
+
+
+def road_datasets_process(DATA_ROOT, df_ne_costal, counties, n_workers=1, cache_dir=None, length_method="planar"):
+    df_roads = road_lengths(DATA_ROOT, n_workers=n_workers, cache_dir=cache_dir, length_method=length_method)
     counties["county_fips"] = counties["STATEFP"] + counties["COUNTYFP"]
-    counties = counties.to_crs(epsg=3857)
+    # planar keeps the original EPSG:3857 area; the true-length methods get
+    # the matching equal-area denominator, as county_attributes.county_areas
+    counties = counties.to_crs(epsg=3857) if length_method == "planar" else counties.to_crs(EQUAL_AREA_CRS)
     counties["area_km2"] = counties.area / 1e6
     df_final = counties.merge(df_roads, on="county_fips", how="left")
     df_final["road_density_km_per_km2"] = (
@@ -42,7 +158,7 @@ def road_datasets_process(DATA_ROOT, df_ne_costal, counties):
     df_final_ne = df_final[df_final["county_fips"].isin(df_ne_costal["fips"])].copy()
     cols_keep = [
         "county_fips",
-        "NAME",         
+        "NAME",
         "STATEFP",
         "road_length_km",
         "area_km2",
@@ -50,4 +166,3 @@ def road_datasets_process(DATA_ROOT, df_ne_costal, counties):
     ]
     road_density = df_final_ne[cols_keep]
     return road_density
-
@@ -0,0 +1,273 @@
+import argparse
+import json
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+from pipeline_runner import (
+    BASE_DIR, DATA_RAW, STAGE_CACHE_DIR, build_master_pipeline, load_raw_inputs,
+)
+from eaglei_ingest import OutageCache
+from stage_metrics import count_rows
+from storm_schema import storm_fips_key
+
+
+SHARD_DIR = (
+    BASE_DIR
+    / "data" / "interim" / "shards"
+)
+
+# ERA5 cells kept around each shard's counties; at least the 1 deg search pad
+# of small_county_ERA5_overlap, so nearest-cell lookups see the cells across
+# the state line
+HALO_DEG = 1.0
+CHUNKSIZE = 2_000_000
+SPLIT_VERSION = 1
+
+YEAR_RE = re.compile(r"data\s*(\d{4}).*\.csv$", re.IGNORECASE)
+
+# census divisions by state FIPS, for shards coarser than one state
+REGIONS = {
+    "new_england": [9, 23, 25, 33, 44, 50],
+    "middle_atlantic": [34, 36, 42],
+    "east_north_central": [17, 18, 26, 39, 55],
+    "west_north_central": [19, 20, 27, 29, 31, 38, 46],
+    "south_atlantic": [10, 11, 12, 13, 24, 37, 45, 51, 54],
+    "east_south_central": [1, 21, 28, 47],
+    "west_south_central": [5, 22, 40, 48],
+    "mountain": [4, 8, 16, 30, 32, 35, 49, 56],
+    "pacific": [2, 6, 15, 41, 53],
+}
+
+# Every per-storm stage of build_master_pipeline is county-local (outage
+# matching, ERA5 windows, per-county median fill, nearest-cell overlap, urban
+# sjoin, baseline medians, outage durations), so a shard holding all storms
+# and outages of its states gives the same rows as the full run. Raw inputs below are split by
+# state; the rest (county tables, shapes, utilities) go to every shard whole,
+# and the county stages built on them run once in the parent and are shared
+# through the stage cache.
+#
+#   storm_events   STATE_FIPS (+ CZ_FIPS)
+#   outage_df      EAGLE-I fips_code // 1000 (a county selection of the
+#                  memory-mapped OutageCache, or rows of a raw frame)
+#   era5_dir       per-shard copies of the yearly CSVs: the cells inside the
+#                  shard counties' bounding box plus HALO_DEG. A border cell
+#                  lands in every shard whose halo reaches it; which county it
+#                  feeds is still decided by the one grid lookup built from the
+#                  full ERA5_DIR, so no county sees a cell twice or misses one.
+#                  Only for builds that read the CSVs: build_master_pipeline
+#                  reads the ERA5 store, which every shard shares whole and
+#                  reads only its own counties' cells from.
+SHARDED_INPUTS = ("storm_events", "outage_df", "era5_dir")
+
+
+def storm_states(storms: pd.DataFrame) -> np.ndarray:
+    return storm_fips_key(storms) // 1000
+
+
+def outage_states(outage_df) -> np.ndarray:
+    # per county for an eaglei_ingest.OutageCache, per row for a raw frame
+    if isinstance(outage_df, OutageCache):
+        return outage_df.fips.astype(np.int64) // 1000
+    return pd.to_numeric(outage_df["fips_code"], errors="coerce").fillna(-1000).to_numpy(dtype=np.int64) // 1000
+
+
+def shard_plan(storms: pd.DataFrame, by: str = "state") -> dict:
+    """shard name -> state FIPS list, for the states present in storms.
+
+    by="state" makes one shard per state, by="region" one per census division.
+    """
+    present = sorted(int(s) for s in np.unique(storm_states(storms)) if s > 0)
+    if by == "state":
+        return {f"st{s:02d}": [s] for s in present}
+    if by != "region":
+        raise ValueError(f"unknown shard mode: {by}")
+    plan = {}
+    for name, states in REGIONS.items():
+        sel = [s for s in states if s in present]
+        if sel:
+            plan[name] = sel
+    rest = [s for s in present if not any(s in v for v in plan.values())]
+    if rest:
+        plan["other"] = rest
+    return plan
+
+
+def shard_bounds(counties_shape, plan: dict, halo_deg: float = HALO_DEG) -> dict:
+    """shard -> (lat_min, lat_max, lon_min, lon_max) of its counties in EPSG:4326, padded by halo_deg."""
+    shapes = counties_shape.to_crs(epsg=4326)
+    state = shapes["STATEFP"].astype(int)
+    out = {}
+    for name, states in plan.items():
+        sel = shapes[state.isin(states)]
+        if sel.empty:
+            raise KeyError(f"shard {name}: no county shapes for states {states}")
+        lon_min, lat_min, lon_max, lat_max = sel.total_bounds
+        out[name] = (lat_min - halo_deg, lat_max + halo_deg, lon_min - halo_deg, lon_max + halo_deg)
+    return out
+
+
+def _source_stamp(files) -> dict:
+    return {p.name: [p.stat().st_size, p.stat().st_mtime_ns] for p in files}
+
+
+def split_era5(era5_dir: Path, bounds: dict, out_dir: Path = SHARD_DIR, chunksize: int = CHUNKSIZE) -> dict:
+    """shard -> directory of "data YYYY.csv" files holding the cells inside its bounds.
+
+    Each source CSV is parsed once and every chunk is appended to all shards
+    whose box contains its cells. Shard directories are reused while the
+    source files and the bounds are unchanged.
+    """
+    era5_dir, out_dir = Path(era5_dir), Path(out_dir)
+    files = sorted(p for p in era5_dir.glob("data*.csv") if YEAR_RE.search(p.name))
+    manifest = {
+        "version": SPLIT_VERSION,
+        "source": str(era5_dir),
+        "files": _source_stamp(files),
+        "bounds": {k: [float(x) for x in v] for k, v in bounds.items()},
+    }
+    dirs = {name: out_dir / name / "era5" for name in bounds}
+    manifest_path = out_dir / "era5_split.json"
+    if manifest_path.exists():
+        with open(manifest_path, encoding="utf-8") as f:
+            if json.load(f) == manifest:
+                return dirs
+
+    for d in dirs.values():
+        d.mkdir(parents=True, exist_ok=True)
+        for old in d.glob("data*.csv"):
+            old.unlink()
+    for path in files:
+        tmp = {name: d / (path.name + ".tmp") for name, d in dirs.items()}
+        header = dict.fromkeys(dirs, True)
+        for chunk in pd.read_csv(path, chunksize=chunksize):
+            count_rows(path, len(chunk))
+            lat = chunk["latitude"].to_numpy()
+            lon = chunk["longitude"].to_numpy()
+            for name, (lat_min, lat_max, lon_min, lon_max) in bounds.items():
+                m = (lat >= lat_min) & (lat <= lat_max) & (lon >= lon_min) & (lon <= lon_max)
+                if m.any() or header[name]:
+                    chunk.loc[m].to_csv(tmp[name], mode="w" if header[name] else "a",
+                                        header=header[name], index=False)
+                    header[name] = False
+        for name, d in dirs.items():
+            os.replace(tmp[name], d / path.name)
+
+    out_dir.mkdir(parents=True, exist_ok=True)
+    tmp = manifest_path.with_suffix(".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=1)
+    os.replace(tmp, manifest_path)
+    return dirs
+
+
+def shard_inputs(raw: dict, plan: dict, era5_dirs: dict = None) -> dict:
+    """shard -> raw input dict with the SHARDED_INPUTS restricted to its states."""
+    s_state = storm_states(raw["storm_events"])
+    o_state = outage_states(raw["outage_df"]) if "outage_df" in raw else None
+    out = {}
+    for i, (name, states) in enumerate(plan.items()):
+        r = dict(raw)
+        # storms without a county key match nothing; they ride along with the first shard
+        r["storm_events"] = raw["storm_events"][np.isin(s_state, states) | ((s_state < 0) & (i == 0))]
+        if isinstance(raw.get("outage_df"), OutageCache):
+            r["outage_df"] = raw["outage_df"].select(raw["outage_df"].fips[np.isin(o_state, states)])
+        elif o_state is not None:
+            r["outage_df"] = raw["outage_df"][np.isin(o_state, states)]
+        if era5_dirs is not None and "era5_dir" in raw:
+            r["era5_dir"] = era5_dirs[name]
+        out[name] = r
+    return out
+
+
+def shared_stages(p, sharded=SHARDED_INPUTS) -> list:
+    """Stages of pipeline p that depend on no sharded input; they are the same for every shard."""
+    return [
+        name for name in p.stages
+        if not any(n in sharded for n in p._order([name]) if n in p.raw)
+    ]
+
+
+def _run_shard(build, raw, cache_dir, target):
+    p = build(raw, cache_dir=cache_dir, verbose=False)
+    return p.run(target)[target]
+
+
+def merge_shards(parts: list, sort_by: str = "YEARMONTH") -> pd.DataFrame:
+    parts = [p for p in parts if p is not None and len(p)]
+    if not parts:
+        return pd.DataFrame()
+    # storm_schema categoricals differ per shard; widen them so concat keeps the dtype
+    for c in parts[0].columns:
+        if all(isinstance(p[c].dtype, pd.CategoricalDtype) for p in parts if c in p.columns):
+            cats = union_categoricals([p[c] for p in parts if c in p.columns], ignore_order=True).categories
+            cats = cats.sort_values() if not parts[0][c].cat.ordered else cats
+            parts = [p.assign(**{c: p[c].cat.set_categories(cats)}) if c in p.columns else p for p in parts]
+    out = pd.concat(parts, ignore_index=True)
+    if sort_by in out.columns:
+        out = out.sort_values(sort_by, kind="stable", ignore_index=True)
+    return out
+
+
+def run_sharded(raw: dict, by: str = "state", target: str = "duration", n_workers: int = None,
+                cache_dir: Path = STAGE_CACHE_DIR, shard_dir: Path = SHARD_DIR,
+                halo_deg: float = HALO_DEG, build=build_master_pipeline) -> pd.DataFrame:
+    """Run `target` of build(raw) per state (or region) shard in worker processes and
+    merge the shard outputs into one table.
+
+    build is called as build(raw, cache_dir=..., verbose=...) and must be a
+    module-level function (it is sent to the workers).
+    """
+    plan = shard_plan(raw["storm_events"], by)
+    era5_dirs = None
+    if "era5_dir" in raw:
+        bounds = shard_bounds(raw["counties_shape"], plan, halo_deg)
+        era5_dirs = split_era5(raw["era5_dir"], bounds, shard_dir)
+    shards = shard_inputs(raw, plan, era5_dirs)
+
+    # county-level stages once, here; the shards then load them from the cache
+    full = build(raw, cache_dir=cache_dir)
+    shared = [s for s in shared_stages(full) if s in full._order([target])]
+    if shared:
+        full.run(shared)
+
+    n_workers = min(n_workers or os.cpu_count(), len(shards))
+    print(f"[sharded] {len(shards)} shards ({by}) on {n_workers} workers")
+    if n_workers <= 1:
+        parts = [_run_shard(build, r, cache_dir, target) for r in shards.values()]
+    else:
+        # a fresh process per shard, so no worker holds two shards' frames
+        with ProcessPoolExecutor(max_workers=n_workers, max_tasks_per_child=1) as pool:
+            futures = [pool.submit(_run_shard, build, r, cache_dir, target) for r in shards.values()]
+            parts = [f.result() for f in futures]
+    return merge_shards(parts)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Build storms_data per state shard in parallel.")
+    ap.add_argument("--data-raw", type=Path, default=DATA_RAW)
+    ap.add_argument("--cache-dir", type=Path, default=STAGE_CACHE_DIR)
+    ap.add_argument("--shard-dir", type=Path, default=SHARD_DIR)
+    ap.add_argument("--by", choices=("state", "region"), default="state")
+    ap.add_argument("--target", default="duration")
+    ap.add_argument("--workers", type=int, default=None)
+    ap.add_argument("--halo", type=float, default=HALO_DEG, help="ERA5 halo around each shard, degrees")
+    ap.add_argument("--out", type=Path, default=BASE_DIR / "storms_data.parquet",
+                    help="Parquet master dataset directory, or a .csv file")
+    args = ap.parse_args()
+
+    storms_data = run_sharded(
+        load_raw_inputs(args.data_raw), by=args.by, target=args.target, n_workers=args.workers,
+        cache_dir=args.cache_dir, shard_dir=args.shard_dir, halo_deg=args.halo,
+    )
+    from master_dataset import save_storms_data
+    save_storms_data(storms_data, args.out)
+
+
+if __name__ == "__main__":
+    main()
@@ -4,8 +4,75 @@ import numpy as np
 import pandas as pd
 from sklearn.neighbors import BallTree
 
-def small_county_ERA5_overlap(ERA5_DIR, storms_data):
-    BAD_FIPS = {"34023","25025","34017","34039","44003","36047","44001","36005"}
+from era5_store import load_grid, read_era5_store, store_years, hours_to_datetime, parse_hours, _grid_key
+from stage_metrics import count_rows
+from storm_schema import FIPS_KEY, to_fips_key
+from window_kernels import window_max, window_sum
+
+# counties too small to contain an ERA5 cell centre; their storms take the
+# nearest cell to the storm point instead of the county mapping
+BAD_FIPS = {"34023","25025","34017","34039","44003","36047","44001","36005"}
+
+
+def _window_reduce(era_all, storm_bad, time_col, lat_col, lon_col):
+    """Window max(i10fg) / sum(tp) / sum(crr) for every storm in one sorted pass.
+
+    ERA rows are keyed by (grid_id, hour) packed into one int64 and sorted, so
+    each storm's window is a contiguous key range; window_kernels reduces all
+    of them in one sweep per variable.
+    """
+    era_key = _grid_key(era_all[lat_col].to_numpy(), era_all[lon_col].to_numpy())
+    cells, gid = np.unique(era_key, return_inverse=True)
+    hours = era_all[time_col].to_numpy().astype("datetime64[h]").astype(np.int64)
+    packed = gid.astype(np.int64) << 32 | hours
+    order = np.argsort(packed, kind="stable")
+    packed = packed[order]
+
+    storm_key = _grid_key(storm_bad["grid_lat"].to_numpy(), storm_bad["grid_lon"].to_numpy())
+    pos = np.searchsorted(cells, storm_key)
+    pos_c = np.minimum(pos, len(cells) - 1)
+    known = cells[pos_c] == storm_key
+
+    h_start = storm_bad["t_start"].to_numpy().astype("datetime64[h]").astype(np.int64)
+    h_end = storm_bad["t_end"].to_numpy().astype("datetime64[h]").astype(np.int64)
+    lo = pos_c[known].astype(np.int64) << 32 | h_start[known]
+    hi = pos_c[known].astype(np.int64) << 32 | h_end[known]
+
+    out = np.full((len(storm_bad), 3), np.nan)
+    i10, count = window_max(packed, era_all["i10fg"].to_numpy(dtype=float)[order], lo, hi)
+    tp, _ = window_sum(packed, era_all["tp"].to_numpy(dtype=float)[order], lo, hi)
+    crr, _ = window_sum(packed, era_all["crr"].to_numpy(dtype=float)[order], lo, hi)
+    hit = count > 0
+    out[np.flatnonzero(known)[hit]] = np.column_stack([i10, tp, crr])[hit]
+    return out
+
+
+def _hour_bitmap(h_start, h_end, year):
+    """Hours of `year` covered by any inclusive [h_start, h_end] window.
+
+    Returns (base, mask): mask[i] is True when hour base + i (hours since the
+    epoch) is needed. Windows are painted with a +1/-1 difference array.
+    """
+    base = int(np.datetime64(f"{year}-01-01", "h").astype(np.int64))
+    n = int(np.datetime64(f"{year + 1}-01-01", "h").astype(np.int64)) - base
+    a = np.clip(np.asarray(h_start, dtype=np.int64) - base, 0, n)
+    b = np.clip(np.asarray(h_end, dtype=np.int64) - base + 1, 0, n)
+    keep = a < b
+    diff = np.zeros(n + 1, dtype=np.int32)
+    np.add.at(diff, a[keep], 1)
+    np.add.at(diff, b[keep], -1)
+    return base, np.cumsum(diff[:-1]) > 0
+
+
+def small_county_ERA5_overlap(ERA5_DIR, storms_data, store_dir=None, fips=None, engine="batch"):
+    # store_dir: read the columnar store (era5_store.ingest_era5_store) instead of
+    #   chunk-parsing the yearly CSVs in ERA5_DIR
+    # fips: counties that take the nearest-cell path (default BAD_FIPS)
+    # engine: "batch" (one BallTree query, sorted (grid, hour) reductions) or
+    #   "loop" (the original per-storm query and scan)
+    if engine not in ("batch", "loop"):
+        raise ValueError(f"unknown engine: {engine}")
+    target_fips = BAD_FIPS if fips is None else {str(f).zfill(5) for f in fips}
     FIPS_COL = "full_fips"
     LAT_COL_STORM = "LATITUDE"
     LON_COL_STORM = "LONGITUDE"
@@ -20,18 +87,22 @@ def small_county_ERA5_overlap(ERA5_DIR, storms_data):
     OUT_I10FG = "era_i10fg_max_total_48h"
     OUT_TP    = "era_tp_max_total_48h"
     OUT_CRR   = "era_crr_max_total_48h"
+    OUT_COLS  = [OUT_I10FG, OUT_TP, OUT_CRR]
     
     HOURS_HALF = 24          
     CHUNKSIZE  = 1_200_000   
     BBOX_PAD_DEG = 1.0      
     
 
-    need = [FIPS_COL, LAT_COL_STORM, LON_COL_STORM, STORM_TIME_COL]
+    # storm_schema frames are matched on the int32 fips_key, no string padding
+    use_key = FIPS_KEY in storms_data.columns
+    need = [FIPS_KEY if use_key else FIPS_COL, LAT_COL_STORM, LON_COL_STORM, STORM_TIME_COL]
     miss = [c for c in need if c not in storms_data.columns]
     if miss:
         raise KeyError(f"storms_data missing columns: {miss}")
     
-    storms_data[FIPS_COL] = storms_data[FIPS_COL].astype(str).str.replace(r"\.0$", "", regex=True).str.zfill(5)
+    if not use_key:
+        storms_data[FIPS_COL] = storms_data[FIPS_COL].astype(str).str.replace(r"\.0$", "", regex=True).str.zfill(5)
     storms_data[STORM_TIME_COL] = pd.to_datetime(storms_data[STORM_TIME_COL], errors="coerce")
     if storms_data[STORM_TIME_COL].isna().any():
         raise ValueError(f"{STORM_TIME_COL} has NaT. Fix parsing first.")
@@ -40,11 +111,14 @@ def small_county_ERA5_overlap(ERA5_DIR, storms_data):
         if c not in storms_data.columns:
             storms_data[c] = np.nan
     
-    mask_bad = storms_data[FIPS_COL].isin(BAD_FIPS)
+    if use_key:
+        mask_bad = storms_data[FIPS_KEY].isin(to_fips_key(sorted(target_fips)))
+    else:
+        mask_bad = storms_data[FIPS_COL].isin(target_fips)
     storm_bad = storms_data.loc[mask_bad].copy()
     if storm_bad.empty:
-        print("No BAD_FIPS rows. Nothing to do.")
-        raise SystemExit(0)
+        print("No rows in the requested FIPS. Nothing to do.")
+        return storms_data
     
     # bbox over BAD_FIPS storms
     lat_min = float(storm_bad[LAT_COL_STORM].min()) - BBOX_PAD_DEG
@@ -61,24 +135,10 @@ def small_county_ERA5_overlap(ERA5_DIR, storms_data):
         pd.concat([storm_bad["t_start"], storm_bad["t_end"]]).dt.year.unique().tolist()
     ))
     
-    required_times_by_year = {}
-    for y in years_needed:
-        # collect all window hours that fall in this year
-        times = []
-        sub = storm_bad[(storm_bad["t_start"].dt.year <= y) & (storm_bad["t_end"].dt.year >= y)]
-        for _, r in sub.iterrows():
-            # clamp to year range
-            a = r["t_start"]
-            b = r["t_end"]
-            a2 = max(a, pd.Timestamp(f"{y}-01-01 00:00:00"))
-            b2 = min(b, pd.Timestamp(f"{y}-12-31 23:00:00"))
-            if a2 <= b2:
-                times.append(pd.date_range(a2, b2, freq="h"))
-        if times:
-            all_times = pd.DatetimeIndex(np.unique(np.concatenate([t.values for t in times])))
-            required_times_by_year[y] = set(all_times.values)  # set of numpy datetime64[ns]
-        else:
-            required_times_by_year[y] = set()
+    # per year: bitmap over the year's hours, True where some storm window needs it
+    h_start = storm_bad["t_start"].to_numpy().astype("datetime64[h]").astype(np.int64)
+    h_end = storm_bad["t_end"].to_numpy().astype("datetime64[h]").astype(np.int64)
+    required_hours_by_year = {y: _hour_bitmap(h_start, h_end, y) for y in years_needed}
     
     print("Years needed:", years_needed)
     
@@ -94,24 +154,35 @@ def small_county_ERA5_overlap(ERA5_DIR, storms_data):
             raise FileNotFoundError(f"No ERA5 yearly CSVs found in {era_dir} matching 'data*YYYY*.csv'")
         return out
     
-    YEAR2PATH = find_year_files(ERA5_DIR)
+    if store_dir is not None:
+        YEAR2PATH = {y: store_dir for y in store_years(store_dir)}
+        store_grid = load_grid(store_dir)
+        store_grid = store_grid[
+            (store_grid["latitude"] >= lat_min) & (store_grid["latitude"] <= lat_max) &
+            (store_grid["longitude"] >= lon_min) & (store_grid["longitude"] <= lon_max)
+        ]
+        grid_df = store_grid[["latitude", "longitude"]].rename(
+            columns={"latitude": LAT_COL_ERA, "longitude": LON_COL_ERA}
+        )
+    else:
+        YEAR2PATH = find_year_files(ERA5_DIR)
 
-    sample_year = next((y for y in years_needed if y in YEAR2PATH), None)
-    sample_path = YEAR2PATH[sample_year]
+        sample_year = next((y for y in years_needed if y in YEAR2PATH), None)
+        sample_path = YEAR2PATH[sample_year]
 
-    grid_points = []
-    usecols_grid = [LAT_COL_ERA, LON_COL_ERA]
-    for chunk in pd.read_csv(sample_path, usecols=usecols_grid, chunksize=CHUNKSIZE):
-        m = (
-            (chunk[LAT_COL_ERA] >= lat_min) & (chunk[LAT_COL_ERA] <= lat_max) &
-            (chunk[LON_COL_ERA] >= lon_min) & (chunk[LON_COL_ERA] <= lon_max)
-        )
-        chunk = chunk.loc[m]
-        if chunk.empty:
-            continue
-        grid_points.append(chunk.drop_duplicates())
-    
-    grid_df = pd.concat(grid_points, ignore_index=True).drop_duplicates()
+        grid_points = []
+        usecols_grid = [LAT_COL_ERA, LON_COL_ERA]
+        for chunk in pd.read_csv(sample_path, usecols=usecols_grid, chunksize=CHUNKSIZE):
+            m = (
+                (chunk[LAT_COL_ERA] >= lat_min) & (chunk[LAT_COL_ERA] <= lat_max) &
+                (chunk[LON_COL_ERA] >= lon_min) & (chunk[LON_COL_ERA] <= lon_max)
+            )
+            chunk = chunk.loc[m]
+            if chunk.empty:
+                continue
+            grid_points.append(chunk.drop_duplicates())
+
+        grid_df = pd.concat(grid_points, ignore_index=True).drop_duplicates()
 
     
     GRID = grid_df[[LAT_COL_ERA, LON_COL_ERA]].to_numpy()
@@ -123,27 +194,37 @@ def small_county_ERA5_overlap(ERA5_DIR, storms_data):
         i = int(idx[0, 0])
         return float(GRID[i, 0]), float(GRID[i, 1])
     
-    storm_bad["grid_latlon"] = storm_bad.apply(lambda r: nearest_grid(r[LAT_COL_STORM], r[LON_COL_STORM]), axis=1)
-    storm_bad["grid_lat"] = storm_bad["grid_latlon"].apply(lambda x: x[0])
-    storm_bad["grid_lon"] = storm_bad["grid_latlon"].apply(lambda x: x[1])
+    if engine == "batch":
+        q = np.radians(storm_bad[[LAT_COL_STORM, LON_COL_STORM]].to_numpy(dtype=float))
+        _, idx = TREE.query(q, k=1)
+        storm_bad["grid_lat"] = GRID[idx[:, 0], 0].astype(float)
+        storm_bad["grid_lon"] = GRID[idx[:, 0], 1].astype(float)
+    else:
+        storm_bad["grid_latlon"] = storm_bad.apply(lambda r: nearest_grid(r[LAT_COL_STORM], r[LON_COL_STORM]), axis=1)
+        storm_bad["grid_lat"] = storm_bad["grid_latlon"].apply(lambda x: x[0])
+        storm_bad["grid_lon"] = storm_bad["grid_latlon"].apply(lambda x: x[1])
     
     def read_era_year_filtered(year: int) -> pd.DataFrame:
         """Read one year's ERA5 CSV, but keep only:
            - bbox rows
-           - rows whose valid_time is in required_times_by_year[year]
+           - rows whose valid_time hour is set in required_hours_by_year[year]
         """
         if year not in YEAR2PATH:
             return pd.DataFrame(columns=[TIME_COL, LAT_COL_ERA, LON_COL_ERA] + ERA_COLS)
     
-        timeset = required_times_by_year.get(year, set())
-        if not timeset:
+        base, needed = required_hours_by_year[year]
+        if not needed.any():
             return pd.DataFrame(columns=[TIME_COL, LAT_COL_ERA, LON_COL_ERA] + ERA_COLS)
     
+        if store_dir is not None:
+            return read_store_year_filtered(year, base, needed)
+
         path = YEAR2PATH[year]
         usecols = [TIME_COL, LAT_COL_ERA, LON_COL_ERA] + ERA_COLS
         kept = []
     
         for chunk in pd.read_csv(path, usecols=usecols, chunksize=CHUNKSIZE):
+            count_rows(path, len(chunk))
             # bbox first (cheap)
             m = (
                 (chunk[LAT_COL_ERA] >= lat_min) & (chunk[LAT_COL_ERA] <= lat_max) &
@@ -153,17 +234,15 @@ def small_county_ERA5_overlap(ERA5_DIR, storms_data):
             if chunk.empty:
                 continue
     
-            # parse valid_time
-            chunk[TIME_COL] = pd.to_datetime(chunk[TIME_COL], errors="coerce").dt.floor("h")
-            chunk = chunk.dropna(subset=[TIME_COL])
-    
-            # time filter
-            # Convert to numpy datetime64[ns] for set membership
-            tvals = chunk[TIME_COL].values
-            mask_t = np.isin(tvals, list(timeset))
-            chunk = chunk.loc[mask_t].copy()
+            # parse valid_time to hours, then time filter by bitmap lookup
+            hours, ok = parse_hours(chunk[TIME_COL].to_numpy())
+            rel = hours - base
+            ok &= (rel >= 0) & (rel < len(needed))
+            ok[ok] = needed[rel[ok]]
+            chunk = chunk.loc[ok].copy()
             if chunk.empty:
                 continue
+            chunk[TIME_COL] = hours_to_datetime(hours[ok])
     
             # numeric
             for c in ERA_COLS:
@@ -177,6 +256,27 @@ def small_county_ERA5_overlap(ERA5_DIR, storms_data):
         df = pd.concat(kept, ignore_index=True)
         return df
     
+    def read_store_year_filtered(year: int, base: int, needed) -> pd.DataFrame:
+        """Same filter as read_era_year_filtered, pushed down to the store's row groups."""
+        hours = base + np.flatnonzero(needed)
+        df = read_era5_store(
+            store_dir,
+            years=[year],
+            grid_ids=store_grid["grid_id"].to_numpy(),
+            hour_range=(hours[0], hours[-1]),
+            columns=ERA_COLS,
+        )
+        df = df[needed[df["hour"].to_numpy() - base]]
+        df = df.merge(store_grid, on="grid_id", how="inner")
+        out = pd.DataFrame({
+            TIME_COL: hours_to_datetime(df["hour"].to_numpy()),
+            LAT_COL_ERA: df["latitude"].to_numpy(),
+            LON_COL_ERA: df["longitude"].to_numpy(),
+        })
+        for c in ERA_COLS:
+            out[c] = df[c].to_numpy(dtype=float)
+        return out
+
     # Load filtered ERA data per year (only the exact hours you need)
     era_by_year = {}
     for y in years_needed:
@@ -189,7 +289,15 @@ def small_county_ERA5_overlap(ERA5_DIR, storms_data):
     if era_all.empty:
         raise RuntimeError("No ERA rows matched your required times. Check TIME_COL parsing and storm times.")
 
-    era_all[TIME_COL] = pd.to_datetime(era_all[TIME_COL], errors="coerce").dt.floor("H")
+    era_all[TIME_COL] = pd.to_datetime(era_all[TIME_COL], errors="coerce").dt.floor("h")
+
+    if engine == "batch":
+        era_all = era_all.dropna(subset=[TIME_COL])
+        res = _window_reduce(era_all, storm_bad, TIME_COL, LAT_COL_ERA, LON_COL_ERA)
+        # keep the columns' dtypes (float32 under storm_schema)
+        res = pd.DataFrame(res, index=storm_bad.index, columns=OUT_COLS).astype(storms_data[OUT_COLS].dtypes)
+        storms_data.loc[storm_bad.index, OUT_COLS] = res
+        return storms_data
 
     def agg_one(row):
         t_start = row["t_start"]
@@ -214,6 +322,6 @@ def small_county_ERA5_overlap(ERA5_DIR, storms_data):
     res = storm_bad.apply(agg_one, axis=1)
     
     # Write back to storms_data
-    storms_data.loc[storm_bad.index, [OUT_I10FG, OUT_TP, OUT_CRR]] = res.values
+    storms_data.loc[storm_bad.index, OUT_COLS] = res.astype(storms_data[OUT_COLS].dtypes)
 
-return storms_data
+    return storms_data
@@ -0,0 +1,245 @@
+import csv
+import functools
+import json
+import os
+import threading
+import time
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+
+BASE_DIR = Path().resolve()
+
+REPORT_DIR = (
+    BASE_DIR
+    / "data" / "interim" / "run_reports"
+)
+
+PROFILERS = ("cprofile", "pyinstrument")
+
+# seconds between RSS samples while a stage runs
+SAMPLE_INTERVAL = 0.02
+
+# Usage:
+#   metrics = StageMetrics(profile_stage="era5_features")
+#   p = build_master_pipeline(raw, metrics=metrics)        # every stage is measured
+#   housing = metrics.wrap(housing_units_process)(...)     # or any single function
+#   metrics.write_report()                                 # .json or .csv
+#
+# Readers call count_rows(...) for rows pulled from a file; it is a no-op unless
+# a StageMetrics is measuring a stage in this process, so pool workers are not
+# counted (their CPU time is, as children_cpu_s).
+
+
+@dataclass
+class StageRecord:
+    stage: str
+    status: str                 # run / cached / partial (some partitions cached)
+    wall_s: float = 0.0
+    cpu_s: float = 0.0
+    children_cpu_s: float = 0.0
+    peak_rss_mb: float = None
+    rss_delta_mb: float = None
+    rows_in: int = None
+    rows_out: int = None
+    # source label -> rows read, from count_rows()
+    rows_read: dict = field(default_factory=dict)
+    profile: str = None
+
+
+_active = threading.local()
+
+
+def count_rows(source, n) -> None:
+    """Add n rows read from source (a file name) to the stage being measured."""
+    rec = getattr(_active, "record", None)
+    if rec is not None:
+        key = Path(source).name if isinstance(source, Path) else str(source)
+        rec.rows_read[key] = rec.rows_read.get(key, 0) + int(n)
+
+
+def n_rows(obj):
+    """Row count of a frame / array / store argument, None for anything else."""
+    if isinstance(obj, (pd.DataFrame, pd.Series, np.ndarray)):
+        return int(len(obj))
+    if hasattr(obj, "fips") and hasattr(obj, "values"):
+        # county_attributes.CountyAttributeStore: one row per county
+        return int(len(obj.fips))
+    return None
+
+
+def _rss_reader():
+    try:
+        import psutil
+    except ImportError:
+        psutil = None
+    if psutil is not None:
+        proc = psutil.Process()
+        return lambda: proc.memory_info().rss
+    if Path("/proc/self/statm").exists():
+        page = os.sysconf("SC_PAGE_SIZE")
+
+        def statm():
+            with open("/proc/self/statm") as f:
+                return int(f.read().split()[1]) * page
+        return statm
+    return None
+
+
+class _PeakRSS:
+    # background thread sampling RSS; the process high-water mark cannot be
+    # reset between stages, so each stage gets its own sampled peak
+    def __init__(self, read):
+        self.read = read
+        self.start = self.peak = read()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(SAMPLE_INTERVAL):
+            self.peak = max(self.peak, self.read())
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, self.read())
+        return self.start, self.peak
+
+
+class StageMetrics:
+    """Wall / CPU time, peak RSS and rows in and out for each measured stage,
+    written as one run report.
+
+    profile_stage names the one stage that also gets a profiler dump
+    (cProfile .prof, or pyinstrument .html when installed) in profile_dir.
+    """
+
+    def __init__(self, profile_stage: str = None, profiler: str = "cprofile",
+                 profile_dir: Path = REPORT_DIR, verbose: bool = True):
+        if profiler not in PROFILERS:
+            raise ValueError(f"profiler must be one of {PROFILERS}")
+        self.profile_stage = profile_stage
+        self.profiler = profiler
+        self.profile_dir = Path(profile_dir)
+        self.verbose = verbose
+        self.records = []
+        self.started = time.strftime("%Y-%m-%dT%H:%M:%S")
+        self._rss = _rss_reader()
+
+    def _profiled(self, name, func):
+        if self.profiler == "pyinstrument":
+            try:
+                from pyinstrument import Profiler
+            except ImportError:
+                raise ImportError("profiler='pyinstrument' needs the pyinstrument package") from None
+            path = self.profile_dir / f"{name}.html"
+
+            def run():
+                prof = Profiler()
+                prof.start()
+                try:
+                    return func()
+                finally:
+                    prof.stop()
+                    path.write_text(prof.output_html(), encoding="utf-8")
+        else:
+            import cProfile
+            path = self.profile_dir / f"{name}.prof"
+
+            def run():
+                prof = cProfile.Profile()
+                try:
+                    return prof.runcall(func)
+                finally:
+                    prof.dump_stats(path)
+        self.profile_dir.mkdir(parents=True, exist_ok=True)
+        return run, path
+
+    def measure(self, name: str, func, args=(), kwargs=None, rows_in=None, status="run"):
+        """Call func(*args, **kwargs) and record it as stage `name`; returns func's result.
+
+        rows_in defaults to the row count of the first argument.
+        """
+        rec = StageRecord(name, status)
+        rec.rows_in = rows_in if rows_in is not None else (n_rows(args[0]) if args else None)
+        call = functools.partial(func, *args, **(kwargs or {}))
+        if name == self.profile_stage:
+            call, path = self._profiled(name, call)
+            rec.profile = str(path)
+
+        prev = getattr(_active, "record", None)
+        _active.record = rec
+        sampler = _PeakRSS(self._rss) if self._rss is not None else None
+        t0, c0 = time.perf_counter(), time.process_time()
+        ch0 = os.times()
+        try:
+            out = call()
+        finally:
+            rec.wall_s = time.perf_counter() - t0
+            rec.cpu_s = time.process_time() - c0
+            ch1 = os.times()
+            rec.children_cpu_s = (ch1.children_user - ch0.children_user) + (ch1.children_system - ch0.children_system)
+            if sampler is not None:
+                start, peak = sampler.stop()
+                rec.peak_rss_mb = peak / 2**20
+                rec.rss_delta_mb = (peak - start) / 2**20
+            _active.record = prev
+            self.records.append(rec)
+
+        rec.rows_out = n_rows(out)
+        if self.verbose:
+            print(self._line(rec))
+        return out
+
+    def wrap(self, func, name: str = None):
+        """func, measured as stage `name` (default: its __name__) on every call."""
+        name = name or func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            return self.measure(name, func, args, kwargs)
+        return wrapper
+
+    def note_cached(self, name: str, value, load_s: float = 0.0) -> None:
+        self.records.append(StageRecord(name, "cached", wall_s=load_s, rows_out=n_rows(value)))
+
+    @staticmethod
+    def _line(rec: StageRecord) -> str:
+        rows = f"{rec.rows_in} -> {rec.rows_out} rows" if rec.rows_in is not None else f"{rec.rows_out} rows"
+        mem = "" if rec.peak_rss_mb is None else f", peak {rec.peak_rss_mb:.0f} MB"
+        read = f", read {sum(rec.rows_read.values())} rows from {len(rec.rows_read)} files" if rec.rows_read else ""
+        return f"[metrics] {rec.stage}: {rec.wall_s:.2f} s wall, {rec.cpu_s:.2f} s cpu{mem}, {rows}{read}"
+
+    def frame(self) -> pd.DataFrame:
+        rows = []
+        for r in self.records:
+            d = asdict(r)
+            d["rows_read_total"] = sum(r.rows_read.values())
+            d["rows_read"] = json.dumps(r.rows_read, sort_keys=True)
+            rows.append(d)
+        return pd.DataFrame(rows, columns=list(StageRecord.__dataclass_fields__) + ["rows_read_total"])
+
+    def write_report(self, path: Path = None) -> Path:
+        """Run report as JSON (run info + one entry per stage) or CSV (one row per stage), by suffix."""
+        if path is None:
+            path = REPORT_DIR / f"run_{self.started.replace(':', '')}.json"
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(".tmp")
+        if path.suffix == ".csv":
+            self.frame().to_csv(tmp, index=False, quoting=csv.QUOTE_MINIMAL)
+        else:
+            report = {
+                "started": self.started,
+                "pid": os.getpid(),
+                "profile_stage": self.profile_stage,
+                "stages": [asdict(r) for r in self.records],
+            }
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(report, f, indent=1)
+        os.replace(tmp, path)
+        return path
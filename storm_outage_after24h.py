@@ -1,41 +1,43 @@
+import numpy as np
 import pandas as pd
 
-def match_max_outage_after24h(
-    storm_df: pd.DataFrame,
-    outage_df: pd.DataFrame,
-    storm_time_col: str = "BEGIN_DATE_TIME",
-    storm_state_col: str = "STATE",
-    storm_county_col: str = "CZ_NAME",
-    outage_time_col: str = "run_start_time",
-    outage_state_col: str = "state",
-    outage_county_col: str = "county",
-    outage_value_col: str = "sum",
-    result_col: str = "max_outage_after_24h",
-    verbose: bool = False,
-) -> pd.DataFrame:
+from eaglei_ingest import OutageCache
+from window_kernels import window_max
 
-    storm_df = storm_df.copy()
-    outage_df = outage_df.copy()
-    storm_df[storm_time_col] = pd.to_datetime(storm_df[storm_time_col], errors="coerce")
-    outage_df[outage_time_col] = pd.to_datetime(outage_df[outage_time_col], errors="coerce")
-    storm_df["_county_clean"] = storm_df[storm_county_col].astype(str).str.strip().str.upper()
-    storm_df["_state_clean"] = storm_df[storm_state_col].astype(str).str.strip().str.upper()
-    outage_df["_county_clean"] = outage_df[outage_county_col].astype(str).str.strip().str.upper()
-    outage_df["_state_clean"] = outage_df[outage_state_col].astype(str).str.strip().str.upper()
-
-    storm_df["_loc_key"] = storm_df["_state_clean"] + "||" + storm_df["_county_clean"]
-    outage_df["_loc_key"] = outage_df["_state_clean"] + "||" + outage_df["_county_clean"]
-
-    outage_slim = (
-        outage_df[["_loc_key", outage_time_col, outage_value_col]]
-        .dropna(subset=[outage_time_col])
-        .sort_values(["_loc_key", outage_time_col])
-    )
 
-    storm_valid = storm_df[storm_df[storm_time_col].notna()].copy()
-    storm_valid["_storm_idx"] = storm_valid.index
-    storm_valid["_after_24h_end"] = storm_valid[storm_time_col] + pd.Timedelta(hours=24)
+def _clean_names(values):
+    # strip / upper once per distinct name rather than once per row; names
+    # that only differ in case or spacing share one code
+    codes, uniq = pd.factorize(values, use_na_sentinel=False)
+    names, inverse = np.unique([str(u).strip().upper() for u in uniq], return_inverse=True)
+    return inverse[codes], names.astype(object)
+
+
+def _loc_codes(state, county):
+    # (code per row, "STATE||COUNTY" key per code)
+    s_codes, s_names = _clean_names(state)
+    c_codes, c_names = _clean_names(county)
+    codes, pairs = pd.factorize(s_codes.astype(np.int64) * len(c_names) + c_codes)
+    keys = np.array([f"{s_names[p // len(c_names)]}||{c_names[p % len(c_names)]}" for p in pairs], dtype=object)
+    return codes, keys, s_names[s_codes], c_names[c_codes]
+
+
+def _as_datetime(values):
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return values
+    return pd.to_datetime(values, errors="coerce")
+
+
+def _clean_key(df, time_col, state_col, county_col):
+    df[time_col] = _as_datetime(df[time_col])
+    codes, keys, state, county = _loc_codes(df[state_col], df[county_col])
+    df["_county_clean"] = county
+    df["_state_clean"] = state
+    df["_loc_key"] = keys[codes]
 
+
+def _match_loop(storm_valid, outage_slim, storm_time_col, outage_time_col, outage_value_col, result_col):
+    # reference implementation: rescan the county's outage rows for every storm
     results = []
 
     for loc in storm_valid["_loc_key"].unique():
@@ -55,9 +57,121 @@ def match_max_outage_after24h(
             max_outage = outage_loc.loc[mask, outage_value_col].max() if mask.any() else 0
             results.append({"_storm_idx": srow["_storm_idx"], result_col: max_outage})
 
-    res_df = pd.DataFrame(results)
+    return pd.DataFrame(results)
+
+
+def _segments_from_frame(outage_df, time_col, state_col, county_col, value_col) -> dict:
+    # _loc_key -> (times, values), each county sorted by time; rows are grouped
+    # by integer key code, so the outage frame is neither copied nor string-sorted
+    codes, keys, _, _ = _loc_codes(outage_df[state_col], outage_df[county_col])
+    times = _as_datetime(outage_df[time_col]).to_numpy()
+    values = outage_df[value_col].to_numpy()
+    keep = np.flatnonzero(~np.isnat(times))
+    order = keep[np.lexsort((times[keep], codes[keep]))]
+    codes, times, values = codes[order], times[order], values[order]
+    seg_codes, seg_start = np.unique(codes, return_index=True)
+    seg_end = np.append(seg_start[1:], len(codes))
+    return {keys[c]: (times[a:b], values[a:b]) for c, a, b in zip(seg_codes, seg_start, seg_end)}
+
+
+def _segments_from_cache(outage_cache) -> dict:
+    segments = {}
+    for i, (fips, times, values) in enumerate(outage_cache.items()):
+        key = f"{outage_cache.states[i].strip().upper()}||{outage_cache.counties[i].strip().upper()}"
+        segments[key] = (times, values)
+    return segments
+
+
+def _match_sorted(storm_valid, segments, storm_time_col, result_col, int_values):
+    # per-county windowed max over the sorted series, all storms of a county in one sweep
+
+    storm_idx = storm_valid["_storm_idx"].to_numpy()
+    starts = storm_valid[storm_time_col].to_numpy()
+    ends = storm_valid["_after_24h_end"].to_numpy()
+    out = np.zeros(len(storm_valid), dtype=float)
+
+    for loc, pos in storm_valid.groupby("_loc_key", sort=False).indices.items():
+        seg = segments.get(loc)
+        if seg is None:
+            continue
+        t, v = seg
+        res, count = window_max(t, v, starts[pos], ends[pos])
+        out[pos] = np.where(count > 0, res, 0.0)
+
+    if int_values and not np.isnan(out).any():
+        out = out.astype(np.int64)
+    return pd.DataFrame({"_storm_idx": storm_idx, result_col: out})
+
+
+def match_max_outage_after24h(
+    storm_df: pd.DataFrame,
+    outage_df: pd.DataFrame,
+    storm_time_col: str = "BEGIN_DATE_TIME",
+    storm_state_col: str = "STATE",
+    storm_county_col: str = "CZ_NAME",
+    outage_time_col: str = "run_start_time",
+    outage_state_col: str = "state",
+    outage_county_col: str = "county",
+    outage_value_col: str = "sum",
+    result_col: str = "max_outage_after_24h",
+    verbose: bool = False,
+    engine: str = "sorted",
+) -> pd.DataFrame:
+    """Max outage in [t, t + 24h] per storm, matched on (state, county) names.
+
+    engine="sorted" answers all storms of a county with one window_kernels
+    window_max sweep; engine="loop" is the original per-storm scan
+    and is kept as the reference for benchmarks/bench_outage_after24h.py.
+
+    outage_df may also be an eaglei_ingest.OutageCache, whose memory-mapped
+    county series are searched in place (the *_col outage arguments are then
+    unused).
+    """
+    if engine not in ("sorted", "loop"):
+        raise ValueError(f"unknown engine: {engine}")
+
+    from_cache = isinstance(outage_df, OutageCache)
+    if from_cache and engine == "loop":
+        outage_df = outage_df.to_frame()
+        outage_time_col, outage_state_col, outage_county_col, outage_value_col = (
+            "run_start_time", "state", "county", "sum"
+        )
+        from_cache = False
+
+    storm_df = storm_df.copy()
+    _clean_key(storm_df, storm_time_col, storm_state_col, storm_county_col)
+    if engine == "loop":
+        outage_df = outage_df.copy()
+        _clean_key(outage_df, outage_time_col, outage_state_col, outage_county_col)
+        outage_slim = (
+            outage_df[["_loc_key", outage_time_col, outage_value_col]]
+            .dropna(subset=[outage_time_col])
+            .sort_values(["_loc_key", outage_time_col], kind="stable")
+        )
+
+    storm_valid = storm_df[storm_df[storm_time_col].notna()].copy()
+    storm_valid["_storm_idx"] = storm_valid.index
+    storm_valid["_after_24h_end"] = storm_valid[storm_time_col] + pd.Timedelta(hours=24)
+
+    if engine == "loop":
+        res_df = _match_loop(storm_valid, outage_slim, storm_time_col, outage_time_col, outage_value_col, result_col)
+    else:
+        if from_cache:
+            # cache sums are float32 counts; integer results unless some are missing,
+            # like a raw "sum" column that read as int64
+            segments = _segments_from_cache(outage_df)
+            int_values = not outage_df.missing.any()
+        else:
+            segments = _segments_from_frame(outage_df, outage_time_col, outage_state_col, outage_county_col,
+                                            outage_value_col)
+            int_values = np.issubdtype(outage_df[outage_value_col].dtype, np.integer)
+        res_df = _match_sorted(storm_valid, segments, storm_time_col, result_col, int_values)
+    if verbose:
+        print(f"[match_max_outage_after24h] engine={engine} storms={len(res_df)}")
+
     storm_df[result_col] = 0
-    storm_df.loc[res_df["_storm_idx"], result_col] = res_df[result_col].values
+    if not res_df.empty:
+        storm_df.loc[res_df["_storm_idx"], result_col] = res_df[result_col].values
 
     # --- 清理 ---
     storm_df.drop(
@@ -66,4 +180,4 @@ def match_max_outage_after24h(
         errors="ignore",
     )
 
-    return storm_df
\ No newline at end of file
+    return storm_df
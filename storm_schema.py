@@ -0,0 +1,97 @@
+import numpy as np
+import pandas as pd
+
+
+# Canonical in-memory schema of the storms_data master table:
+#   fips_key      int32   state * 1000 + county (-1 when unknown); the only join key
+#   STATE, CZ_NAME                   category
+#   era_* features                   float32
+#   BEGIN/END_DATE_TIME              datetime64[ns] (int64 nanoseconds)
+# Zero-padded FIPS strings (fips_str, full_fips) are only produced for export.
+
+FIPS_KEY = "fips_key"
+
+CATEGORY_COLS = ["STATE", "CZ_NAME"]
+
+ERA_COLS = [
+    "era_i10fg_max_total_48h",
+    "era_tp_max_total_48h",
+    "era_crr_max_total_48h",
+]
+
+TIME_COLS = ["BEGIN_DATE_TIME", "END_DATE_TIME"]
+
+
+def to_fips_key(values) -> np.ndarray:
+    """5-digit county FIPS in any form ("09001", 9001, 9001.0, "9001.0") -> int32, -1 if missing."""
+    v = np.asarray(values)
+    if v.dtype.kind in "iu":
+        return v.astype(np.int32)
+    if v.dtype.kind != "f":
+        v = pd.to_numeric(pd.Series(v, dtype=object), errors="coerce").to_numpy(dtype=float)
+    return np.where(np.isnan(v), -1, v).astype(np.int32)
+
+
+def fips_key_from_parts(state, county) -> np.ndarray:
+    """State FIPS and county FIPS (3-digit) columns -> int32 key, -1 if either is missing."""
+    s = to_fips_key(state)
+    c = to_fips_key(county)
+    return np.where((s < 0) | (c < 0), -1, s * 1000 + c).astype(np.int32)
+
+
+def storm_fips_key(df: pd.DataFrame) -> np.ndarray:
+    # storm events carry STATE_FIPS + CZ_FIPS; derived tables carry a 5-digit column
+    if FIPS_KEY in df.columns:
+        return df[FIPS_KEY].to_numpy(dtype=np.int32)
+    if "STATE_FIPS" in df.columns and "CZ_FIPS" in df.columns:
+        return fips_key_from_parts(df["STATE_FIPS"], df["CZ_FIPS"])
+    for col in ("full_fips", "fips_str", "fips", "county_fips", "FIPS"):
+        if col in df.columns:
+            return to_fips_key(df[col])
+    raise KeyError("no county FIPS column")
+
+
+def with_fips_key(df: pd.DataFrame, col: str = None) -> pd.DataFrame:
+    """df with an int32 fips_key column, from `col` (5-digit FIPS) or the columns storm_fips_key knows."""
+    key = to_fips_key(df[col]) if col is not None else storm_fips_key(df)
+    return df.assign(**{FIPS_KEY: key})
+
+
+def apply_storm_schema(df: pd.DataFrame) -> pd.DataFrame:
+    """Cast storms_data (or any stage output) to the canonical dtypes.
+
+    Idempotent, and returns df itself (no copy) when it already conforms.
+    """
+    out = {}
+    if FIPS_KEY not in df.columns:
+        out[FIPS_KEY] = storm_fips_key(df)
+    elif df[FIPS_KEY].dtype != np.int32:
+        out[FIPS_KEY] = to_fips_key(df[FIPS_KEY])
+    for c in CATEGORY_COLS:
+        if c in df.columns and not isinstance(df[c].dtype, pd.CategoricalDtype):
+            out[c] = df[c].astype("category")
+    for c in ERA_COLS:
+        if c in df.columns and df[c].dtype != np.float32:
+            out[c] = pd.to_numeric(df[c], errors="coerce").astype(np.float32)
+    for c in TIME_COLS:
+        if c in df.columns and not pd.api.types.is_datetime64_ns_dtype(df[c]):
+            out[c] = pd.to_datetime(df[c], errors="coerce")
+    return df.assign(**out) if out else df
+
+
+def fips_strings(key) -> np.ndarray:
+    """int32 fips_key -> zero-padded 5-character strings (None where the key is -1)."""
+    key = np.asarray(key)
+    s = pd.Series(key).astype(str).str.zfill(5).to_numpy(dtype=object)
+    s[key < 0] = None
+    return s
+
+
+def with_fips_strings(df: pd.DataFrame) -> pd.DataFrame:
+    """Add fips_str / full_fips from fips_key, for CSV export and the modelling notebooks."""
+    s = fips_strings(storm_fips_key(df))
+    return df.assign(fips_str=s, full_fips=s)
+
+
+def memory_mb(df: pd.DataFrame) -> float:
+    return df.memory_usage(deep=True).sum() / 2**20
@@ -1,22 +1,33 @@
+import numpy as np
 import pandas as pd
 import geopandas as gpd
 
-def strom_impact_location_exposure(gdf_urban, storms_data):
-    gdf_storm = gpd.GeoDataFrame(
-        storms_data,
-        geometry=gpd.points_from_xy(storms_data["LONGITUDE"], storms_data["LATITUDE"]),
-        crs="EPSG:4326"
-    )
-    
-    gdf_join = gpd.sjoin(
-        gdf_storm,
-        gdf_urban[["geometry"]],
-        how="left",
-        predicate="within"
-    )
-    
-    gdf_join["urban_flag"] = gdf_join["index_right"].notna().astype(int)
-    
+def strom_impact_location_exposure(gdf_urban, storms_data, urban_index=None):
+    # urban_index: urban_area_index.UrbanIndex answering point-in-urban from a
+    # persisted STRtree (and its point cache) instead of a fresh sjoin;
+    # gdf_urban is then unused
+    if urban_index is None:
+        gdf_storm = gpd.GeoDataFrame(
+            storms_data,
+            geometry=gpd.points_from_xy(storms_data["LONGITUDE"], storms_data["LATITUDE"]),
+            crs="EPSG:4326"
+        )
+
+        gdf_join = gpd.sjoin(
+            gdf_storm,
+            gdf_urban[["geometry"]],
+            how="left",
+            predicate="within"
+        )
+
+        gdf_join["urban_flag"] = gdf_join["index_right"].notna().astype(int)
+    else:
+        # same rows as the left sjoin: one per containing polygon, one unmatched row otherwise
+        n_within = urban_index.classify(storms_data["LONGITUDE"].to_numpy(), storms_data["LATITUDE"].to_numpy())
+        rows = np.maximum(n_within, 1)
+        gdf_join = storms_data[["CZ_FIPS", "EPISODE_ID_LOC"]].iloc[np.repeat(np.arange(len(storms_data)), rows)].copy()
+        gdf_join["urban_flag"] = np.repeat(n_within > 0, rows).astype(int)
+
     group_cols = ["CZ_FIPS", "EPISODE_ID_LOC"]
     
     agg = (
@@ -31,4 +42,4 @@ def strom_impact_location_exposure(gdf_urban, storms_data):
     
     storms_data = storms_data.merge(agg, on=group_cols, how="left")
     storms_data[["n_points", "n_urban", "urban_ratio"]] = storms_data[["n_points", "n_urban", "urban_ratio"]].fillna(0)
-    return storms_data
\ No newline at end of file
+    return storms_data
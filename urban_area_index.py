@@ -0,0 +1,148 @@
+import hashlib
+import json
+import os
+from pathlib import Path
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import shapely
+
+
+BASE_DIR = Path().resolve()
+
+URBAN_SHP = (
+    BASE_DIR
+    / "data" / "raw" / "shapefiles"
+    / "national urban area shapefile" / "tl_2020_us_uac20.shp"
+)
+
+URBAN_INDEX_DIR = (
+    BASE_DIR
+    / "data" / "interim" / "urban_index"
+)
+
+INDEX_VERSION = 1
+
+# Layout of the index:
+#   index_dir/index.json        source (mtime, size), counties key, polygon count
+#   index_dir/polygons.parquet  urban polygons (EPSG:4326) as WKB
+#   index_dir/points.parquet    lon, lat -> n_within for every point classified so far
+# points.parquet is dropped whenever the polygons are rebuilt.
+
+
+def _counties_key(counties) -> str:
+    if counties is None:
+        return ""
+    wkb = shapely.to_wkb(counties.to_crs("EPSG:4326").geometry.to_numpy())
+    h = hashlib.sha1()
+    for b in wkb:
+        h.update(b)
+    return h.hexdigest()
+
+
+class UrbanIndex:
+    """STRtree over prepared urban-area polygons, answering point-in-urban in batches."""
+
+    def __init__(self, polygons, index_dir: Path = None):
+        self.polygons = np.asarray(polygons, dtype=object)
+        shapely.prepare(self.polygons)
+        self.tree = shapely.STRtree(self.polygons)
+        self.index_dir = Path(index_dir) if index_dir is not None else None
+        self._points = None
+
+    @classmethod
+    def from_geodataframe(cls, gdf_urban: gpd.GeoDataFrame, counties: gpd.GeoDataFrame = None, index_dir: Path = None):
+        """Index gdf_urban, keeping only polygons that intersect `counties` when given.
+
+        Kept polygons stay whole, so containment is unchanged for every point
+        inside one of them.
+        """
+        polys = gdf_urban.to_crs("EPSG:4326").geometry.to_numpy()
+        if counties is not None:
+            region = counties.to_crs("EPSG:4326").geometry.to_numpy()
+            hit = shapely.STRtree(region).query(polys, predicate="intersects")[0]
+            polys = polys[np.unique(hit)]
+        return cls(polys, index_dir=index_dir)
+
+    @classmethod
+    def load(cls, index_dir: Path = URBAN_INDEX_DIR):
+        index_dir = Path(index_dir)
+        wkb = pd.read_parquet(index_dir / "polygons.parquet")["wkb"].to_numpy()
+        return cls(shapely.from_wkb(wkb), index_dir=index_dir)
+
+    def save(self, index_dir: Path, meta: dict) -> None:
+        index_dir = Path(index_dir)
+        index_dir.mkdir(parents=True, exist_ok=True)
+        pd.DataFrame({"wkb": shapely.to_wkb(self.polygons)}).to_parquet(index_dir / "polygons.parquet")
+        (index_dir / "points.parquet").unlink(missing_ok=True)
+        # index last: a half-written index is never considered current
+        tmp = index_dir / "index.json.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"version": INDEX_VERSION, "polygons": len(self.polygons), **meta}, f, indent=1)
+        os.replace(tmp, index_dir / "index.json")
+        self.index_dir = index_dir
+
+    def within_counts(self, lon, lat) -> np.ndarray:
+        """Number of urban polygons containing each (lon, lat); NaN coordinates give 0."""
+        pts = shapely.points(np.asarray(lon, dtype=float), np.asarray(lat, dtype=float))
+        point_idx, _ = self.tree.query(pts, predicate="within")
+        return np.bincount(point_idx, minlength=len(pts)).astype(np.int64)
+
+    def _load_points(self) -> pd.DataFrame:
+        if self._points is None:
+            path = self.index_dir / "points.parquet" if self.index_dir is not None else None
+            if path is not None and path.exists():
+                self._points = pd.read_parquet(path)
+            else:
+                self._points = pd.DataFrame({
+                    "lon": pd.Series(dtype=float),
+                    "lat": pd.Series(dtype=float),
+                    "n_within": pd.Series(dtype=np.int64),
+                })
+        return self._points
+
+    def classify(self, lon, lat) -> np.ndarray:
+        """within_counts, answered from points.parquet and extended with unseen points only."""
+        lon = np.asarray(lon, dtype=float)
+        lat = np.asarray(lat, dtype=float)
+        if self.index_dir is None:
+            return self.within_counts(lon, lat)
+
+        known = self._load_points()
+        pts = pd.DataFrame({"lon": lon, "lat": lat})
+        uniq = pts.drop_duplicates().merge(known, on=["lon", "lat"], how="left")
+        new = uniq["n_within"].isna().to_numpy()
+        if new.any():
+            counts = self.within_counts(uniq.loc[new, "lon"], uniq.loc[new, "lat"])
+            uniq.loc[new, "n_within"] = counts
+            self._points = pd.concat([known, uniq.loc[new]], ignore_index=True).astype({"n_within": np.int64})
+            self._points.to_parquet(self.index_dir / "points.parquet")
+        # a left merge keeps the row order of pts
+        return pts.merge(uniq, on=["lon", "lat"], how="left")["n_within"].to_numpy(dtype=np.int64)
+
+
+def build_urban_index(
+    urban_path: Path = URBAN_SHP,
+    counties: gpd.GeoDataFrame = None,
+    index_dir: Path = URBAN_INDEX_DIR,
+    rebuild: bool = False,
+) -> UrbanIndex:
+    """Load the persisted urban index, (re)building it when the shapefile or counties changed."""
+    urban_path, index_dir = Path(urban_path), Path(index_dir)
+    st = urban_path.stat()
+    meta = {
+        "source": {"path": str(urban_path), "mtime": st.st_mtime, "size": st.st_size},
+        "counties": _counties_key(counties),
+    }
+    path = index_dir / "index.json"
+    if not rebuild and path.exists():
+        with open(path, encoding="utf-8") as f:
+            current = json.load(f)
+        if current.get("version") == INDEX_VERSION and current["source"] == meta["source"] \
+                and current["counties"] == meta["counties"]:
+            return UrbanIndex.load(index_dir)
+
+    index = UrbanIndex.from_geodataframe(gpd.read_file(urban_path), counties)
+    index.save(index_dir, meta)
+    return index
@@ -0,0 +1,263 @@
+import numpy as np
+
+try:
+    import numba
+except ImportError:
+    numba = None
+
+
+# Shared time-window reductions over sorted int64 time arrays (datetime64[ns]
+# views, or any sorted int64 key such as era5 (grid_id << 32 | hour)):
+#   window_max        NaN-skipping max of values with start <= t <= end, per window
+#   window_sum        sum of the same (NaN as 0)
+#   interval_union    merge closed [begin, end] intervals into sorted disjoint ones
+#   in_intervals      mask of times inside merged intervals
+#   first_stable_run  first index of `k` consecutive True flags inside [lo, hi)
+#
+# With numba the kernels are compiled two-pointer sweeps (windows visited in
+# start order, so the lower bound only moves forward); without it the same
+# results come from searchsorted, sparse tables and reduceat in NumPy.
+# backend=None picks BACKEND.
+
+BACKENDS = ("numba", "numpy")
+BACKEND = "numba" if numba is not None else "numpy"
+
+
+def _backend(backend):
+    backend = BACKEND if backend is None else backend
+    if backend not in BACKENDS:
+        raise ValueError(f"unknown backend: {backend}")
+    if backend == "numba" and numba is None:
+        raise ImportError("numba is not installed")
+    return backend
+
+
+def _jit(func):
+    # compiled kernels are cached next to the module, so pool workers load
+    # them instead of compiling again
+    return numba.njit(cache=True, nogil=True)(func) if numba is not None else func
+
+
+def _as_i8(t) -> np.ndarray:
+    t = np.asarray(t)
+    if t.dtype.kind == "M":
+        t = t.astype("datetime64[ns]").view(np.int64)
+    return np.ascontiguousarray(t, dtype=np.int64)
+
+
+# ---------------------------------------------------------------------------
+# compiled kernels
+# ---------------------------------------------------------------------------
+
+@_jit
+def _window_reduce_jit(times, values, starts, ends, order, use_max):
+    n_t = times.shape[0]
+    out = np.empty(starts.shape[0])
+    count = np.zeros(starts.shape[0], dtype=np.int64)
+    j = 0
+    for q in order:
+        s, e = starts[q], ends[q]
+        while j < n_t and times[j] < s:
+            j += 1
+        acc = np.nan if use_max else 0.0
+        k = j
+        while k < n_t and times[k] <= e:
+            v = values[k]
+            if v == v:
+                if not use_max:
+                    acc += v
+                elif acc != acc or v > acc:
+                    acc = v
+            k += 1
+        out[q] = acc
+        count[q] = k - j
+    return out, count
+
+
+@_jit
+def _interval_union_jit(b, e):
+    starts = np.empty(b.shape[0], dtype=np.int64)
+    ends = np.empty(b.shape[0], dtype=np.int64)
+    n = 0
+    for i in range(b.shape[0]):
+        if n > 0 and b[i] <= ends[n - 1]:
+            if e[i] > ends[n - 1]:
+                ends[n - 1] = e[i]
+        else:
+            starts[n] = b[i]
+            ends[n] = e[i]
+            n += 1
+    return starts[:n], ends[:n]
+
+
+@_jit
+def _in_intervals_jit(t, order, starts, ends):
+    out = np.zeros(t.shape[0], dtype=np.bool_)
+    j = 0
+    for i in order:
+        while j < starts.shape[0] and ends[j] < t[i]:
+            j += 1
+        if j == starts.shape[0]:
+            break
+        out[i] = t[i] >= starts[j]
+    return out
+
+
+@_jit
+def _first_stable_run_jit(flags, lo, hi, k):
+    out = np.full(lo.shape[0], -1, dtype=np.int64)
+    for q in range(lo.shape[0]):
+        run = 0
+        for i in range(max(lo[q], 0), min(hi[q], flags.shape[0])):
+            if flags[i]:
+                run += 1
+                if run >= k:
+                    out[q] = i - k + 1
+                    break
+            else:
+                run = 0
+    return out
+
+
+# ---------------------------------------------------------------------------
+# NumPy fallbacks
+# ---------------------------------------------------------------------------
+
+def _sparse_table(values: np.ndarray) -> list:
+    # level k holds max over [i, i + 2**k); NaN-skipping like Series.max()
+    table = [values]
+    k = 1
+    while (1 << k) <= len(values):
+        prev = table[-1]
+        half = 1 << (k - 1)
+        table.append(np.fmax(prev[:-half], prev[half:]))
+        k += 1
+    return table
+
+
+def _range_max(table: list, lo: np.ndarray, hi: np.ndarray) -> np.ndarray:
+    # max over [lo, hi) for every pair; caller guarantees hi > lo
+    length = hi - lo
+    k = np.floor(np.log2(length)).astype(int)
+    out = np.empty(len(lo), dtype=table[0].dtype)
+    for level in np.unique(k):
+        sel = k == level
+        t = table[level]
+        out[sel] = np.fmax(t[lo[sel]], t[hi[sel] - (1 << level)])
+    return out
+
+
+def _range_sum(values: np.ndarray, lo: np.ndarray, hi: np.ndarray) -> np.ndarray:
+    # reduceat over interleaved (lo, hi) bounds: even slots are the windows,
+    # odd slots the gaps between them (discarded); bounds must be sorted by lo
+    srt = np.argsort(lo, kind="stable")
+    idx = np.empty(2 * len(srt), dtype=np.int64)
+    idx[0::2] = lo[srt]
+    idx[1::2] = hi[srt]
+    out = np.empty(len(lo))
+    out[srt] = np.add.reduceat(np.append(values, 0.0), idx)[0::2]
+    return out
+
+
+def _run_lengths(ok: np.ndarray) -> np.ndarray:
+    # run[j] = number of consecutive True values starting at j
+    n = len(ok)
+    bad = np.flatnonzero(~ok)
+    next_bad = np.append(bad, n)[np.searchsorted(bad, np.arange(n))]
+    return next_bad - np.arange(n)
+
+
+# ---------------------------------------------------------------------------
+# public kernels
+# ---------------------------------------------------------------------------
+
+def _window_reduce(times, values, starts, ends, use_max, backend):
+    times, starts, ends = _as_i8(times), _as_i8(starts), _as_i8(ends)
+    values = np.ascontiguousarray(values, dtype=np.float64)
+    if _backend(backend) == "numba":
+        order = np.argsort(starts, kind="stable")
+        return _window_reduce_jit(times, values, starts, ends, order, use_max)
+
+    lo = np.searchsorted(times, starts, side="left")
+    hi = np.searchsorted(times, ends, side="right")
+    count = np.maximum(hi - lo, 0)
+    out = np.full(len(starts), np.nan if use_max else 0.0)
+    hit = count > 0
+    if hit.any():
+        if use_max:
+            out[hit] = _range_max(_sparse_table(values), lo[hit], hi[hit])
+        else:
+            out[hit] = _range_sum(np.nan_to_num(values, nan=0.0), lo[hit], hi[hit])
+    return out, count
+
+
+def window_max(times, values, starts, ends, backend=None):
+    """(max, count) per window [starts[i], ends[i]] over sorted times.
+
+    max skips NaN and is NaN for a window with no rows (or only NaN rows);
+    count is the number of rows inside the window.
+    """
+    return _window_reduce(times, values, starts, ends, True, backend)
+
+
+def window_sum(times, values, starts, ends, backend=None):
+    """(sum, count) per window [starts[i], ends[i]] over sorted times; NaN counts as 0."""
+    return _window_reduce(times, values, starts, ends, False, backend)
+
+
+def interval_union(begins, ends, backend=None):
+    """Union of closed intervals [begin, end] as sorted, disjoint (starts, ends) int64 arrays.
+
+    Intervals with a missing (NaT) bound or end < begin are dropped.
+    """
+    b, e = _as_i8(begins), _as_i8(ends)
+    nat = np.iinfo(np.int64).min
+    ok = (b != nat) & (e != nat) & (e >= b)
+    b, e = b[ok], e[ok]
+    if len(b) == 0:
+        return b, e
+    order = np.argsort(b, kind="stable")
+    b, e = b[order], e[order]
+    if _backend(backend) == "numba":
+        return _interval_union_jit(b, e)
+
+    reach = np.maximum.accumulate(e)
+    first = np.empty(len(b), dtype=bool)
+    first[0] = True
+    first[1:] = b[1:] > reach[:-1]
+    return b[first], np.maximum.reduceat(e, np.flatnonzero(first))
+
+
+def in_intervals(t, starts, ends, backend=None) -> np.ndarray:
+    """True where t falls inside one of the sorted, disjoint intervals from interval_union."""
+    t = _as_i8(t)
+    if len(starts) == 0:
+        return np.zeros(len(t), dtype=bool)
+    starts, ends = _as_i8(starts), _as_i8(ends)
+    if _backend(backend) == "numba":
+        # outage series come sorted; the argsort is then a single pass
+        order = np.argsort(t, kind="stable")
+        return _in_intervals_jit(t, order, starts, ends)
+
+    i = np.searchsorted(starts, t, side="right") - 1
+    return (i >= 0) & (t <= ends[np.maximum(i, 0)])
+
+
+def first_stable_run(flags, lo, hi, k: int = 1, backend=None) -> np.ndarray:
+    """First index i in [lo, hi - k] with flags[i:i + k] all True, per (lo, hi) pair; -1 if none.
+
+    k=1 is the first True flag in [lo, hi).
+    """
+    flags = np.ascontiguousarray(flags, dtype=bool)
+    lo = np.ascontiguousarray(lo, dtype=np.int64)
+    hi = np.ascontiguousarray(hi, dtype=np.int64)
+    k = max(int(k), 1)
+    if _backend(backend) == "numba":
+        return _first_stable_run_jit(flags, lo, hi, k)
+
+    stable = np.flatnonzero(_run_lengths(flags) >= k)
+    if len(stable) == 0:
+        return np.full(len(lo), -1, dtype=np.int64)
+    m = np.searchsorted(stable, lo)
+    idx = stable[np.minimum(m, len(stable) - 1)]
+    return np.where((m < len(stable)) & (idx + k <= hi), idx, -1)